@@ -1,6 +1,6 @@
 import numpy
 
-from typing import List, Tuple, Dict, Union, Set
+from typing import List, Tuple, Dict, Optional, Union, Set, TYPE_CHECKING
 import logging
 from enum import IntEnum, IntFlag
 from collections import Counter
@@ -8,6 +8,10 @@ from collections import Counter
 from assigning.person import Person
 from assigning.hand import Hand
 from assigning.utils import AssignUtils
+from geometry.boxes import BoxGeometry
+
+if TYPE_CHECKING:
+    from tracking.frame_state import FrameState
 
 
 logger = logging.getLogger(__name__)
@@ -33,6 +37,7 @@ class AssignPersonHands:
     def __init__(self) -> None:
         self.curr_assignment = None
         self.prev_frame_assignment = None
+        self.prev_frame_assignment_snapshot = None
 
         self.persons_objs = None
         self.hands_objs = None
@@ -46,6 +51,36 @@ class AssignPersonHands:
         persons = interaction_objects.get(DetectionLabel.PERSON, None)
         hands = interaction_objects.get(DetectionLabel.HAND, None)
 
+        return self.assign_persons_hands(persons=persons, hands=hands)
+
+    def assign_from_frame_state(
+            self,
+            frame_state: 'FrameState'
+    ) -> List[Tuple[Hand, Person]]:
+        """
+        Same as assign_from_norfair_tracked_obj, using the bboxes columns of
+        the frame state for the containment check.
+        """
+        persons_group = frame_state.persons
+        hands_group = frame_state.hands
+
+        if persons_group is None or hands_group is None:
+            return self.assign_persons_hands(persons=None, hands=None)
+
+        return self.assign_persons_hands(
+            persons=persons_group.interactions,
+            hands=hands_group.interactions,
+            persons_bboxes=persons_group.bboxes_tracking,
+            hands_bboxes=hands_group.bboxes_tracking
+        )
+
+    def assign_persons_hands(
+            self,
+            persons: Optional[List[Person]],
+            hands: Optional[List[Hand]],
+            persons_bboxes: Optional[numpy.ndarray] = None,
+            hands_bboxes: Optional[numpy.ndarray] = None
+    ) -> List[Tuple[Hand, Person]]:
         if persons and hands:
             # There are persons and hands in the frame
 
@@ -57,7 +92,9 @@ class AssignPersonHands:
             potential_pure_assignments, intercepted_hands = (
                 self.check_each_hand_inside_each_person(
                     person_objs=persons,
-                    hand_objs=hands
+                    hand_objs=hands,
+                    persons_bboxes=persons_bboxes,
+                    hands_bboxes=hands_bboxes
                 )
             )
             intercepted_persons = self.get_persons_hands_w_hand_intrcptn(
@@ -89,6 +126,9 @@ class AssignPersonHands:
                 second_assignment = self.assign_intercepted_hands(
                     intercepted_hands=intercepted_hands,
                     prev_assignment=self.prev_frame_assignment,
+                    prev_assignment_snapshot=(
+                        self.prev_frame_assignment_snapshot
+                    ),
                     intercepted_persons=intercepted_persons
                 )
             else:
@@ -114,6 +154,36 @@ class AssignPersonHands:
 
     def save_curr_as_previous_assignment(self, current_assignment):
         self.prev_frame_assignment = current_assignment
+        # The hands and persons are updated in place on the next frames, so
+        # keep a copy of their current bboxes and ids
+        self.prev_frame_assignment_snapshot = self.snapshot_assignments(
+            assignments=current_assignment
+        )
+
+    @staticmethod
+    def snapshot_assignments(
+        assignments: Optional[List[Tuple[Hand, Person]]]
+    ) -> Optional[Tuple[numpy.ndarray, ...]]:
+        """
+        Copy the bboxes and track ids of the hands and persons of the
+        assignments, as (hands bboxes, persons bboxes, hands ids, persons
+        ids) arrays. Returns None if there are no assignments.
+        """
+        if not assignments:
+            return None
+
+        hands_bboxes = AssignUtils.stack_bboxes(
+            interactions=[hand for hand, _ in assignments]
+        )
+        persons_bboxes = AssignUtils.stack_bboxes(
+            interactions=[person for _, person in assignments]
+        )
+        hands_ids = numpy.array([hand.track_id for hand, _ in assignments])
+        persons_ids = numpy.array(
+            [person.track_id for _, person in assignments]
+        )
+
+        return hands_bboxes, persons_bboxes, hands_ids, persons_ids
 
     def get_assignment(self):
         return self.assignment
@@ -121,34 +191,45 @@ class AssignPersonHands:
     @staticmethod
     def check_each_hand_inside_each_person(
             person_objs: List[Person],
-            hand_objs: List[Hand]
+            hand_objs: List[Hand],
+            persons_bboxes: Optional[numpy.ndarray] = None,
+            hands_bboxes: Optional[numpy.ndarray] = None
     ) -> Tuple[List[Tuple[Hand, Person]], Set[Hand]]:
         intercepted_hands = set()
         assignments = []
 
+        if persons_bboxes is None:
+            persons_bboxes = AssignUtils.stack_bboxes(interactions=person_objs)
+        if hands_bboxes is None:
+            hands_bboxes = AssignUtils.stack_bboxes(interactions=hand_objs)
+
+        # We check every hand against every person at once, in a matrix
+        # with the hands as rows and the persons as columns
+        hands_inside_persons = BoxGeometry.containment(
+            bboxes1=hands_bboxes,
+            bboxes2=persons_bboxes,
+            alpha_x=AssignUtils.INSIDE_ALPHA_X,
+            alpha_y=AssignUtils.INSIDE_ALPHA_Y
+        )
+        n_persons_by_hand = hands_inside_persons.sum(axis=1)
+
         # For each hand that has been tracked and created as interaction
-        for hand in hand_objs:
-            # We go through each person that has also been tracked and created
-            for person in person_objs:
-
-                # We check if the hand is inside a person
-                is_hand_inside_person = AssignUtils.check_bbox1_inside_bbox2(
-                    bbox1=hand.bbox_tracking,
-                    bbox2=person.bbox_tracking
+        for hand_indx, hand in enumerate(hand_objs):
+            # The persons that contain the hand are potential assignments
+            # for the hand, in the same order as the persons list
+            for person_indx in numpy.flatnonzero(
+                hands_inside_persons[hand_indx]
+            ):
+                hand.add_potential_person_assignment(
+                    potential_person=person_objs[person_indx]
                 )
-                # If it is then we can add that person as a potential
-                # assignment for the hand
-                if is_hand_inside_person:
-                    hand.add_potential_person_assignment(
-                        potential_person=person
-                    )
 
             # Once we have gone through all the persons we check if the hand
             # is inside two people.
-            if (hand.n_potential_assignments > 1):
+            if (n_persons_by_hand[hand_indx] > 1):
                 # If it is then we add the hand to a set of intercepted hands
                 intercepted_hands.add(hand)
-            elif (hand.n_potential_assignments == 1):
+            elif (n_persons_by_hand[hand_indx] == 1):
                 # If it only has one potential assignment then we can save
                 # the assignment
                 assignments.append((hand, hand.potential_persons[0]))
@@ -163,6 +244,7 @@ class AssignPersonHands:
         intercepted_hands: Set[Hand],
         prev_assignment: List[Tuple[Hand, Person]],
         intercepted_persons: Set[Person],
+        prev_assignment_snapshot: Optional[Tuple[numpy.ndarray, ...]] = None
     ) -> List[Tuple[Hand, Person]]:
         
         # We get the intercepted hands and persons from the set
@@ -188,7 +270,8 @@ class AssignPersonHands:
                     prev_assignments=prev_assignment,
                     weight_hand=self.WEIGHT_HANDS,
                     weight_person=self.WEIGHT_PERSON,
-                    weight_same_id=self.WEIGHT_SAME_ID
+                    weight_same_id=self.WEIGHT_SAME_ID,
+                    prev_assignments_snapshot=prev_assignment_snapshot
                 )
             )
         else:
@@ -202,7 +285,10 @@ class AssignPersonHands:
                 self.compute_score_intercepted_hands_persons(
                     intercepted_hands=intercptd_hands_ordered,
                     intercepted_persons=intercptd_persons_ordered,
-                    prev_assignments=None
+                    prev_assignments=None,
+                    weight_hand=self.WEIGHT_HANDS,
+                    weight_person=self.WEIGHT_PERSON,
+                    weight_same_id=self.WEIGHT_SAME_ID
                 )
             )
 
@@ -234,91 +320,75 @@ class AssignPersonHands:
         prev_assignments: List[Tuple[Hand, Person]],
         weight_hand: float,
         weight_person: float,
-        weight_same_id: float
+        weight_same_id: float,
+        prev_assignments_snapshot: Optional[Tuple[numpy.ndarray, ...]] = None
     ) -> numpy.ndarray :
-        # We create the score matrix to return the cost of each combination
-        assignment_score_matrix = numpy.zeros(
-            (
-                len(intercepted_hands),
-                len(intercepted_persons)
-            )
+        hands_bboxes = AssignUtils.stack_bboxes(
+            interactions=intercepted_hands
+        )
+        persons_bboxes = AssignUtils.stack_bboxes(
+            interactions=intercepted_persons
         )
 
-        hand_row_score_counter = 0
-        person_column_score_counter = 0
-        for person in intercepted_persons:
-            for hand in intercepted_hands:
-                # Check if the person is inside the potential persons
-                
-                # For each hand and person prepare the list to save the wsum 
-                # of the iou for each hand with each person using the prev 
-                # assignment if exists or distance if not
-                hand_scores_for_a_person = []
-
-                if prev_assignments:
-
-                    for prev_assignment in prev_assignments:
-                        prev_assign_hand = prev_assignment[0]
-                        prev_assign_person = prev_assignment[1]
-
-                        # Compute the score of sharing tracking ID
-                        if (
-                            (hand.track_id == prev_assign_hand.track_id) and
-                            (person.track_id == prev_assign_person.track_id)
-                        ):
-                            curr_prev_track_ids = 1
-                        else:
-                            curr_prev_track_ids = 0
-
-                        # Compute IoU for the current and prev hand
-                        curr_prev_hands_iou = AssignUtils.compute_iou(
-                            bbox1=hand.bbox_tracking,
-                            bbox2=prev_assign_hand.bbox_tracking
-                        )
-                        # Compute IoU for the current and prev person
-                        curr_prev_persons_iou = AssignUtils.compute_iou(
-                            bbox1=person.bbox_tracking,
-                            bbox2=prev_assign_person.bbox_tracking
-                        )
-                        wsum_curr_prev_iou = (
-                            (weight_same_id * curr_prev_track_ids) +
-                            (weight_hand * curr_prev_hands_iou) +
-                            (weight_person * curr_prev_persons_iou)
-                        )
-                        hand_scores_for_a_person.append(wsum_curr_prev_iou)
-
-                else:
-                    # If there are not previous assignments then we need to
-                    # use a different score computation
-
-                    # Compute the euclidean distance between hand and
-                    # person, the result is the potential new score
-                    hand_person_dist = (
-                        AssignUtils.compute_euclidean_distance(
-                            point1=hand.center_location,
-                            point2=person.center_location
-                        )
+        if prev_assignments:
+            # Score of each hand (rows) and person (columns) with each
+            # previous assignment (third axis), the score matrix keeps the
+            # max over the previous assignments
+            if prev_assignments_snapshot is None:
+                prev_assignments_snapshot = (
+                    AssignPersonHands.snapshot_assignments(
+                        assignments=prev_assignments
                     )
-                    hand_scores_for_a_person.append(hand_person_dist)
-
-                # After going through all the previous assignment, use
-                # the max iou weighted sum as the score for the hand for
-                # the correspondent person
-                score_hand_person = max(hand_scores_for_a_person)
-
-                # Fill the score matrix for the hand (row) and person (column)
-                assignment_score_matrix[
-                    hand_row_score_counter,
-                    person_column_score_counter
-                ] = score_hand_person
-                # We will fill the next row the next iteration of hands
-                hand_row_score_counter += 1
-
-            # We finished all the hands for one person, then fill the next col
-            person_column_score_counter += 1
-            # Restart the rows counter
-            hand_row_score_counter = 0
-        
+                )
+            (
+                prev_hands_bboxes,
+                prev_persons_bboxes,
+                prev_hands_ids,
+                prev_persons_ids
+            ) = prev_assignments_snapshot
+
+            # IoU of the current and prev hands, and current and prev persons
+            curr_prev_hands_iou = BoxGeometry.pairwise_iou(
+                bboxes1=hands_bboxes,
+                bboxes2=prev_hands_bboxes
+            )
+            curr_prev_persons_iou = BoxGeometry.pairwise_iou(
+                bboxes1=persons_bboxes,
+                bboxes2=prev_persons_bboxes
+            )
+
+            # Score of sharing tracking ID, both the hand and the person of
+            # the previous assignment must share it
+            hands_same_ids = (
+                numpy.array([hand.track_id for hand in intercepted_hands])[
+                    :, None
+                ] ==
+                prev_hands_ids[None, :]
+            )
+            persons_same_ids = (
+                numpy.array(
+                    [person.track_id for person in intercepted_persons]
+                )[:, None] ==
+                prev_persons_ids[None, :]
+            )
+            curr_prev_track_ids = (
+                hands_same_ids[:, None, :] & persons_same_ids[None, :, :]
+            )
+
+            wsum_curr_prev_iou = (
+                (weight_same_id * curr_prev_track_ids) +
+                (weight_hand * curr_prev_hands_iou[:, None, :]) +
+                (weight_person * curr_prev_persons_iou[None, :, :])
+            )
+            assignment_score_matrix = wsum_curr_prev_iou.max(axis=2)
+        else:
+            # If there are not previous assignments then we use the
+            # euclidean distance between each hand and person as the score
+            assignment_score_matrix = BoxGeometry.pairwise_distances(
+                points1=BoxGeometry.centers(hands_bboxes),
+                points2=BoxGeometry.centers(persons_bboxes)
+            )
+
         return assignment_score_matrix
 
     @staticmethod
@@ -375,7 +445,7 @@ class AssignPersonHands:
         if n_hands > n_persons:
             missing_persons_cols = n_hands - n_persons
             intercepted_persons_to_ref = (
-                intercepted_persons_ordered + (missing_persons_cols * [None])
+                intercepted_persons_to_ref + (missing_persons_cols * [None])
             )
             intercepted_hands_to_ref = intercepted_hands_ordered
         elif n_hands < n_persons:
@@ -1,33 +1,101 @@
 import numpy
 
+from typing import List
+
 from assigning.interaction import Interaction
 from assigning.person import Person
 
 
 class Hand(Interaction):
+    # Optional fields are created the first time they are used
+    __slots__ = (
+        'person',
+        '_person_bbox',
+        '_person_bbox_prev',
+        '_potential_persons',
+        '_assignment_scores',
+    )
+
+    NO_POTENTIAL_PERSONS = ()
+
     def __init__(
             self,
             bbox_tracking,
             bbox_last_detection,
             class_name,
-            track_id
+            track_id,
+            center_location=None
     ) -> None:
         super().__init__(
             bbox_tracking,
             bbox_last_detection,
             class_name,
-            track_id
+            track_id,
+            center_location=center_location
         )
 
         self.person = None
-        self.person_bbox = numpy.array([])
-        self.person_bbox_prev = numpy.array([])
+        self._person_bbox = None
+        self._person_bbox_prev = None
+
+        self._potential_persons = None
+        self._assignment_scores = None
+
+    def update_tracking(
+            self,
+            bbox_tracking,
+            bbox_last_detection,
+            center_location=None
+    ):
+        super().update_tracking(
+            bbox_tracking,
+            bbox_last_detection,
+            center_location=center_location
+        )
+        # The potential persons are found again on every frame
+        self._potential_persons = None
+
+    @property
+    def person_bbox(self) -> numpy.ndarray:
+        if self._person_bbox is None:
+            self._person_bbox = numpy.array([])
+        return self._person_bbox
+
+    @person_bbox.setter
+    def person_bbox(self, person_bbox: numpy.ndarray):
+        self._person_bbox = person_bbox
+
+    @property
+    def person_bbox_prev(self) -> numpy.ndarray:
+        if self._person_bbox_prev is None:
+            self._person_bbox_prev = numpy.array([])
+        return self._person_bbox_prev
+
+    @person_bbox_prev.setter
+    def person_bbox_prev(self, person_bbox_prev: numpy.ndarray):
+        self._person_bbox_prev = person_bbox_prev
 
-        self.potential_persons = []
-        self.assignment_scores = []
+    @property
+    def potential_persons(self) -> List[Person]:
+        """
+        Persons that contain the hand, an empty tuple until the first one is
+        added with add_potential_person_assignment.
+        """
+        if self._potential_persons is None:
+            return self.NO_POTENTIAL_PERSONS
+        return self._potential_persons
+
+    @property
+    def assignment_scores(self) -> List[float]:
+        if self._assignment_scores is None:
+            self._assignment_scores = []
+        return self._assignment_scores
 
     def add_potential_person_assignment(self, potential_person: Person):
-        self.potential_persons.append(potential_person)
+        if self._potential_persons is None:
+            self._potential_persons = [potential_person]
+        else:
+            self._potential_persons.append(potential_person)
     
     @property
     def n_potential_assignments(self):
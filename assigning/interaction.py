@@ -2,21 +2,48 @@ import norfair
 import numpy
 
 from assigning.utils import AssignUtils
+from geometry.boxes import BoxGeometry
 
 
 class Interaction:
+    __slots__ = (
+        'bbox_tracking',
+        'bbox_last_detection',
+        'class_name',
+        'track_id',
+        'center_location',
+    )
+
     def __init__(
             self,
             bbox_tracking,
             bbox_last_detection,
             class_name,
             track_id,
+            center_location=None,
     ) -> None:
         self.bbox_tracking = bbox_tracking
         self.bbox_last_detection = bbox_last_detection
         self.class_name = class_name
         self.track_id = track_id
-        self.center_location = self.compute_center_location(self.bbox_tracking)
+        if center_location is None:
+            center_location = self.compute_center_location(self.bbox_tracking)
+        self.center_location = center_location
+
+    def update_tracking(
+            self,
+            bbox_tracking,
+            bbox_last_detection,
+            center_location=None
+    ):
+        """
+        Update the object of a track with the data of a new frame.
+        """
+        self.bbox_tracking = bbox_tracking
+        self.bbox_last_detection = bbox_last_detection
+        if center_location is None:
+            center_location = self.compute_center_location(self.bbox_tracking)
+        self.center_location = center_location
 
     @classmethod
     def create_from_norfair_tracked(
@@ -46,9 +73,7 @@ class Interaction:
     
     @staticmethod
     def compute_center_location(bbox: numpy.ndarray) -> numpy.ndarray:
-        center_x = int( ((bbox[2] - bbox[0]) / 2) + bbox[0])
-        center_y = int( ((bbox[3] - bbox[1]) / 2) + bbox[1])
-        center_location = numpy.array([center_x, center_y], dtype=numpy.int32)
+        center_location = BoxGeometry.centers(bboxes=bbox)
 
         return center_location
 
@@ -6,23 +6,67 @@ from assigning.interaction import Interaction
 
 
 class Person(Interaction):
+    # Optional fields are created the first time they are used
+    __slots__ = (
+        'hand_one',
+        'hand_two',
+        '_hands_bboxes',
+        '_hands_bboxes_prev',
+        '_color',
+    )
+
     def __init__(
             self,
             bbox_tracking,
             bbox_last_detection,
             class_name,
-            track_id
+            track_id,
+            center_location=None
     ) -> None:
         super().__init__(
             bbox_tracking,
             bbox_last_detection,
             class_name,
-            track_id
+            track_id,
+            center_location=center_location
         )
 
         self.hand_one = None
         self.hand_two = None
-        self.hands_bboxes = numpy.array([])
-        self.hands_bboxes_prev = numpy.array([])
+        self._hands_bboxes = None
+        self._hands_bboxes_prev = None
+
+        self._color = None
+
+    @property
+    def hands_bboxes(self) -> numpy.ndarray:
+        if self._hands_bboxes is None:
+            self._hands_bboxes = numpy.array([])
+        return self._hands_bboxes
+
+    @hands_bboxes.setter
+    def hands_bboxes(self, hands_bboxes: numpy.ndarray):
+        self._hands_bboxes = hands_bboxes
+
+    @property
+    def hands_bboxes_prev(self) -> numpy.ndarray:
+        if self._hands_bboxes_prev is None:
+            self._hands_bboxes_prev = numpy.array([])
+        return self._hands_bboxes_prev
+
+    @hands_bboxes_prev.setter
+    def hands_bboxes_prev(self, hands_bboxes_prev: numpy.ndarray):
+        self._hands_bboxes_prev = hands_bboxes_prev
+
+    @property
+    def color(self):
+        """
+        Random color to draw the person, chosen when it is first drawn.
+        """
+        if self._color is None:
+            self._color = tuple(random.choices(range(256), k=3))
+        return self._color
 
-        self.color = tuple(random.choices(range(256), k=3))
+    @color.setter
+    def color(self, color):
+        self._color = color
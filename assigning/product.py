@@ -5,6 +5,13 @@ from assigning.assign import DetectionLabel
 
 
 class Product(Interaction):
+    __slots__ = (
+        'top_view_location',
+        'color',
+        'name',
+        'code',
+    )
+
     TYPE_COLOR_LIST = {
         DetectionLabel.PRODUCT_A: {
             'color': (0, 0, 255),
@@ -30,12 +37,14 @@ class Product(Interaction):
             bbox_last_detection,
             class_name,
             track_id,
+            center_location=None
     ) -> None:
         super().__init__(
             bbox_tracking,
             bbox_last_detection,
             class_name,
-            track_id
+            track_id,
+            center_location=center_location
         )
 
         self.top_view_location = None
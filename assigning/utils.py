@@ -1,10 +1,11 @@
 import numpy
 from scipy.optimize import linear_sum_assignment as scipy_linsum_assignment
-from scipy.spatial import distance as scipy_distance
 
 from typing import Tuple, List
 import logging
 
+from geometry.boxes import BoxGeometry
+
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -22,6 +23,10 @@ logger.addHandler(c_handler)
 
 class AssignUtils:
 
+    # Expansion of the person bbox when checking if a hand is inside it
+    INSIDE_ALPHA_X = 35
+    INSIDE_ALPHA_Y = 35
+
     @staticmethod
     def norfair_points_to_standard_bbox(norfair_points: numpy.ndarray):
         standard_bbox_points = numpy.array(
@@ -38,8 +43,8 @@ class AssignUtils:
     def check_bbox1_inside_bbox2(
         bbox1: numpy.ndarray,
         bbox2: numpy.ndarray,
-        alpha_x=35,
-        alpha_y=35
+        alpha_x=INSIDE_ALPHA_X,
+        alpha_y=INSIDE_ALPHA_Y
     ) -> bool:
         """
         Method to check if a bbox 1 is inside bbox 2. Returns True if that is
@@ -51,43 +56,36 @@ class AssignUtils:
         - alpha_y: Value to increase bbox2 in the y direction. For example to
         make it larger so that the evaluation with bbox1 can cover more area.
         """
-        x1a_in_x2a = True if bbox1[0] >= (bbox2[0] - alpha_x) else False
-        y1a_in_y2a = True if bbox1[1] >= (bbox2[1] - alpha_y) else False
-
-        x1b_in_x2b = True if bbox1[2] <= (bbox2[2] + alpha_x) else False
-        y1b_in_y2b = True if bbox1[3] <= (bbox2[3] + alpha_y) else False
+        is_bbox1_inside_bbox2 = BoxGeometry.containment(
+            bboxes1=numpy.asarray(bbox1)[None, :],
+            bboxes2=numpy.asarray(bbox2)[None, :],
+            alpha_x=alpha_x,
+            alpha_y=alpha_y
+        )
 
-        if x1a_in_x2a and y1a_in_y2a and x1b_in_x2b and y1b_in_y2b:
-            return True
+        return bool(is_bbox1_inside_bbox2[0, 0])
 
-        return False
+    @staticmethod
+    def stack_bboxes(interactions: List) -> numpy.ndarray:
+        """
+        Stack the tracking bboxes of a list of interactions (persons, hands,
+        products) in a (N, 4) array.
+        """
+        return BoxGeometry.stack(
+            [interaction.bbox_tracking for interaction in interactions]
+        )
     
     @staticmethod
     def compute_iou(
         bbox1: numpy.ndarray,
         bbox2: numpy.ndarray,
     ) -> float :
-        # determine the (x, y)-coordinates of the intersection rectangle
-        xA = max(bbox1[0], bbox2[0])
-        yA = max(bbox1[1], bbox2[1])
-        xB = min(bbox1[2], bbox2[2])
-        yB = min(bbox1[3], bbox2[3])
-
-        # compute the area of intersection rectangle
-        interArea = max(0, xB - xA + 1) * max(0, yB - yA + 1)
-
-        # compute the area of both the prediction and ground-truth
-        # rectangles
-        bbox_oneArea = (bbox1[2] - bbox1[0] + 1) * (bbox1[3] - bbox1[1] + 1)
-        bbox_twoArea = (bbox2[2] - bbox2[0] + 1) * (bbox2[3] - bbox2[1] + 1)
-
-        # compute the intersection over union by taking the intersection
-        # area and dividing it by the sum of prediction + ground-truth
-        # areas - the interesection area
-        iou = interArea / float(bbox_oneArea + bbox_twoArea - interArea)
+        iou = BoxGeometry.pairwise_iou(
+            bboxes1=numpy.asarray(bbox1)[None, :],
+            bboxes2=numpy.asarray(bbox2)[None, :]
+        )
 
-        # return the intersection over union value
-        return iou
+        return float(iou[0, 0])
 
     @staticmethod
     def get_linear_sum_assignment_w_matrix(
@@ -112,8 +110,8 @@ class AssignUtils:
         point1: numpy.ndarray,
         point2: numpy.ndarray
     ):
-        dist_btwn_point1_point2 = scipy_distance.euclidean(
-            u=point1,
-            v=point2
-        )
+        dist_btwn_point1_point2 = BoxGeometry.pairwise_distances(
+            points1=[point1],
+            points2=[point2]
+        )[0, 0]
         return dist_btwn_point1_point2
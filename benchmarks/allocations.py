@@ -0,0 +1,344 @@
+import click
+import numpy
+
+from typing import Dict, List, Tuple, Type
+import gc
+import queue
+import random
+import sys
+import time
+import tracemalloc
+
+from assigning.assign import DetectionLabel
+from assigning.interaction import Interaction
+from assigning.person import Person
+from assigning.hand import Hand
+from assigning.product import Product
+from benchmarks.synthetic import SyntheticDetectionStream
+from costumer.costumer import Costumer
+from geometry.boxes import BoxGeometry
+
+
+class LegacyInteraction:
+    """
+    Interaction as it was before __slots__: every field lives in the
+    instance __dict__.
+    """
+
+    def __init__(
+            self,
+            bbox_tracking,
+            bbox_last_detection,
+            class_name,
+            track_id,
+            center_location=None,
+    ) -> None:
+        self.bbox_tracking = bbox_tracking
+        self.bbox_last_detection = bbox_last_detection
+        self.class_name = class_name
+        self.track_id = track_id
+        if center_location is None:
+            center_location = BoxGeometry.centers(bboxes=self.bbox_tracking)
+        self.center_location = center_location
+
+
+class LegacyPerson(LegacyInteraction):
+    """
+    Person as it was before the lazy fields.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.hand_one = None
+        self.hand_two = None
+        self.hands_bboxes = numpy.array([])
+        self.hands_bboxes_prev = numpy.array([])
+
+        self.color = tuple(random.choices(range(256), k=3))
+
+
+class LegacyHand(LegacyInteraction):
+    """
+    Hand as it was before the lazy fields.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.person = None
+        self.person_bbox = numpy.array([])
+        self.person_bbox_prev = numpy.array([])
+
+        self.potential_persons = []
+        self.assignment_scores = []
+
+    def add_potential_person_assignment(self, potential_person):
+        self.potential_persons.append(potential_person)
+
+
+class LegacyProduct(LegacyInteraction):
+    """
+    Product as it was before __slots__.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.top_view_location = None
+
+        product_info = Product.TYPE_COLOR_LIST[self.class_name]
+        self.color = product_info['color']
+        self.name = product_info['name']
+        self.code = Product.create_product_code(
+            product_id=self.track_id,
+            product_name=self.name
+        )
+
+
+class LegacyCostumer:
+    """
+    Costumer as it was before the lazy close products history.
+    """
+
+    MAX_FRAMES_CLOSE_HISTORY = 10
+
+    def __init__(self, person, hands) -> None:
+        self.person = person
+        self.person_id = person.track_id
+
+        self.hands = hands
+        self.first_hand = hands[0]
+        self.second_hand = None
+
+        self.products = []
+        self.close_products_history = queue.LifoQueue(
+            maxsize=self.MAX_FRAMES_CLOSE_HISTORY
+        )
+
+        self.active = True
+        self.n_frames_inactive = 0
+
+
+class AllocationsBenchmark:
+    """
+    Measures the memory and garbage collector cost of the objects that are
+    created for every tracked object on every frame (Person, Hand, Product
+    and Costumer), over a long synthetic recording.
+
+    The compact layout is the classes as they are (__slots__ and optional
+    fields created when first used). The dict layout is a copy of the
+    classes as they were: every field in the instance __dict__ and the
+    optional fields (empty arrays, lists and the LifoQueue of the costumer)
+    created in the constructor.
+
+    Each frame links its objects like the assignment does (the hands get
+    their person as potential person and assignment, and each pair of
+    person and hand makes a costumer). The objects of the last frames_alive
+    frames are kept, like the per frame history of a session, so the
+    containers that are created add up to collections of the garbage
+    collector.
+    """
+
+    LAYOUTS = {
+        'compact': {
+            Person: Person,
+            Hand: Hand,
+            Product: Product,
+            Costumer: Costumer,
+        },
+        'dict': {
+            Person: LegacyPerson,
+            Hand: LegacyHand,
+            Product: LegacyProduct,
+            Costumer: LegacyCostumer,
+        },
+    }
+
+    def __init__(
+            self,
+            n_frames: int = 10000,
+            frames_alive: int = 300,
+            n_persons: int = 4,
+            n_products: int = 16,
+            seed: int = 0
+    ) -> None:
+        self.n_frames = n_frames
+        # Frames whose objects are referenced at the same time
+        self.frames_alive = frames_alive
+        self.stream = SyntheticDetectionStream(
+            n_persons=n_persons,
+            n_products=n_products,
+            occlusion=0.0,
+            seed=seed
+        )
+        # Same detections for both layouts
+        self.frames_predictions = [
+            self.stream.next_predictions() for _ in range(n_frames)
+        ]
+
+    @classmethod
+    def get_layout_classes(cls, layout: str) -> Dict[Type, Type]:
+        if layout not in cls.LAYOUTS:
+            raise ValueError(f'Unknown layout {layout}')
+        return cls.LAYOUTS[layout]
+
+    @staticmethod
+    def get_instance_size(instance) -> int:
+        size = sys.getsizeof(instance)
+        instance_dict = getattr(instance, '__dict__', None)
+        if instance_dict is not None:
+            size += sys.getsizeof(instance_dict)
+        return size
+
+    @staticmethod
+    def create_frame_objects(
+        predictions: numpy.ndarray,
+        layout_classes: Dict[Type, Type]
+    ) -> Tuple[List[Interaction], List[Costumer]]:
+        """
+        Create the objects of one frame, like FrameState views, assign each
+        hand to a person and create one costumer for each pair.
+        """
+        frame_objects = []
+        persons = []
+        hands = []
+        for track_id, prediction in enumerate(predictions):
+            label = int(prediction[4])
+            bbox = prediction[:4]
+            if label == DetectionLabel.PERSON:
+                interaction_cls = layout_classes[Person]
+            elif label == DetectionLabel.HAND:
+                interaction_cls = layout_classes[Hand]
+            else:
+                interaction_cls = layout_classes[Product]
+            interaction = interaction_cls(bbox, bbox, label, track_id)
+            frame_objects.append(interaction)
+            if label == DetectionLabel.PERSON:
+                persons.append(interaction)
+            elif label == DetectionLabel.HAND:
+                hands.append(interaction)
+
+        costumers = []
+        for person, hand in zip(persons, hands):
+            hand.add_potential_person_assignment(potential_person=person)
+            hand.person = person
+            hand.person_bbox = person.bbox_tracking
+            costumers.append(
+                layout_classes[Costumer](person=person, hands=[hand])
+            )
+
+        return frame_objects, costumers
+
+    def run(self, layout: str) -> Dict:
+        layout_classes = self.get_layout_classes(layout=layout)
+
+        gc.collect()
+        gc_time = [0.0]
+        gc_start = [0.0]
+
+        def gc_callback(phase, info):
+            if phase == 'start':
+                gc_start[0] = time.perf_counter()
+            else:
+                gc_time[0] += time.perf_counter() - gc_start[0]
+
+        collections_start = [
+            generation['collections'] for generation in gc.get_stats()
+        ]
+        gc.callbacks.append(gc_callback)
+        tracemalloc.start()
+
+        alive_frames = []
+        n_objects = 0
+        start = time.perf_counter()
+        try:
+            for predictions in self.frames_predictions:
+                interactions, costumers = self.create_frame_objects(
+                    predictions=predictions,
+                    layout_classes=layout_classes
+                )
+                n_objects += len(interactions) + len(costumers)
+                alive_frames.append((interactions, costumers))
+                if len(alive_frames) > self.frames_alive:
+                    alive_frames.pop(0)
+            elapsed = time.perf_counter() - start
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            gc.callbacks.remove(gc_callback)
+
+        collections = [
+            generation['collections'] - collections_start[generation_idx]
+            for generation_idx, generation in enumerate(gc.get_stats())
+        ]
+        instances_sizes = {
+            base_cls.__name__: self.get_instance_size(instance)
+            for base_cls, instance in self.get_sample_instances(
+                layout_classes=layout_classes
+            ).items()
+        }
+
+        return {
+            'layout': layout,
+            'objects': n_objects,
+            'objects_per_s': round(n_objects / elapsed),
+            'peak_kb': round(peak_bytes / 1024, 1),
+            'gc_collections': collections,
+            'gc_time_ms': round(gc_time[0] * 1000, 2),
+            'instances_bytes': instances_sizes,
+        }
+
+    def get_sample_instances(
+        self,
+        layout_classes: Dict[Type, Type]
+    ) -> Dict[Type, object]:
+        bbox = numpy.array([0.0, 0.0, 10.0, 10.0])
+        person = layout_classes[Person](bbox, bbox, DetectionLabel.PERSON, 0)
+        hand = layout_classes[Hand](bbox, bbox, DetectionLabel.HAND, 1)
+        product = layout_classes[Product](
+            bbox, bbox, DetectionLabel.PRODUCT_A, 2
+        )
+        costumer = layout_classes[Costumer](person=person, hands=[hand])
+        return {
+            Person: person,
+            Hand: hand,
+            Product: product,
+            Costumer: costumer,
+        }
+
+
+@click.command()
+@click.option('--frames', default=10000, help='Frames of the recording')
+@click.option(
+    '--frames-alive',
+    default=300,
+    help='Frames whose objects are kept alive'
+)
+@click.option('--persons', default=4)
+@click.option('--products', default=16)
+@click.option('--seed', default=0)
+def main(frames, frames_alive, persons, products, seed):
+    benchmark = AllocationsBenchmark(
+        n_frames=frames,
+        frames_alive=frames_alive,
+        n_persons=persons,
+        n_products=products,
+        seed=seed
+    )
+    for layout in ['dict', 'compact']:
+        result = benchmark.run(layout=layout)
+        click.echo(
+            f'{result["layout"]:>8}: {result["objects"]} objects, '
+            f'{result["objects_per_s"]} objects/s, '
+            f'peak {result["peak_kb"]} KiB, '
+            f'gc collections (gen 0, 1, 2) {result["gc_collections"]}, '
+            f'gc time {result["gc_time_ms"]} ms'
+        )
+        click.echo(
+            f'{"":>8}  instance bytes: {result["instances_bytes"]}'
+        )
+
+
+if __name__ == '__main__':
+    main()
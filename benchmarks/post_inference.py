@@ -0,0 +1,259 @@
+import click
+import numpy
+
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import logging
+import time
+
+from benchmarks.synthetic import SyntheticDetectionStream
+from location.table import TableLocation
+from pipeline.post_inference import PostInferencePipeline
+from profiling.stage_timer import StageTimer
+from tracking.norfair_tracker import NorfairTracker
+
+
+class PostInferenceBenchmark:
+    """
+    Drives synthetic detection streams through the post-inference stages
+    (NorfairTracker, AssignPersonHands, Products, Purchase and Store) and
+    reports the latency of each stage and the frames per second.
+    """
+
+    STAGES = [
+        'tracking',
+        'separate_interactions',
+        'assignment',
+        'products',
+        'costumers',
+        'store',
+    ]
+
+    def __init__(
+            self,
+            table_prsp_matrix: numpy.ndarray,
+            n_frames: int = 500,
+            warmup_frames: int = 50,
+            skip_frames: int = 2,
+            tracker_params: Optional[Dict] = None
+    ) -> None:
+        self.table_prsp_matrix = table_prsp_matrix
+        self.n_frames = n_frames
+        self.warmup_frames = warmup_frames
+        self.skip_frames = skip_frames
+        self.tracker_params = tracker_params or {}
+
+    @classmethod
+    def create_from_prsp_matrix_name(
+        cls,
+        prsp_matrix_name: str = 'table_persp_mtx_v1',
+        **benchmark_params
+    ):
+        table_prsp_matrix = TableLocation.load_perspective_matrix(
+            prsp_matrix_path=str(
+                TableLocation.TRANSFORMS_FOLDER / (prsp_matrix_name + '.npy')
+            )
+        )
+        return cls(table_prsp_matrix=table_prsp_matrix, **benchmark_params)
+
+    def run(self, stream: SyntheticDetectionStream) -> Dict:
+        """
+        Run the stream through a new pipeline. The first warmup_frames frames
+        let the tracker initialize the objects and are not timed.
+        """
+        pipeline = PostInferencePipeline(
+            table_prsp_matrix=self.table_prsp_matrix,
+            tracker=NorfairTracker(**self.tracker_params)
+        )
+        stage_timer = StageTimer(enabled=True)
+
+        n_detections = 0
+        n_detection_frames = 0
+        timed_start = None
+        frames = stream.iter_frames(
+            n_frames=self.warmup_frames + self.n_frames,
+            skip_frames=self.skip_frames
+        )
+        for frame_number, predictions in frames:
+            if frame_number == self.warmup_frames:
+                pipeline.stage_timer = stage_timer
+                timed_start = time.perf_counter()
+
+            if timed_start is not None:
+                stage_timer.start_frame(frame_number=frame_number)
+            pipeline.process_frame(
+                frame_number=frame_number,
+                predictions=predictions,
+                period=self.skip_frames
+            )
+            if timed_start is not None:
+                stage_timer.end_frame()
+
+            if timed_start is not None and predictions is not None:
+                n_detections += len(predictions)
+                n_detection_frames += 1
+
+        elapsed = time.perf_counter() - timed_start
+        stages_summary = stage_timer.get_summary()
+
+        return {
+            'persons': stream.n_persons,
+            'hands_per_person': stream.hands_per_person,
+            'products': stream.n_products,
+            'detections_per_frame': round(
+                n_detections / max(n_detection_frames, 1), 1
+            ),
+            'fps': round(self.n_frames / elapsed, 1),
+            'stages': {
+                stage: stages_summary[stage]
+                for stage in self.STAGES + [StageTimer.FRAME_STAGE]
+                if stage in stages_summary
+            },
+        }
+
+    def run_scaling(
+        self,
+        persons_counts: List[int],
+        products_counts: List[int],
+        **stream_params
+    ) -> List[Dict]:
+        """
+        Run one benchmark for each combination of persons and products
+        counts, to get the scaling curves of the stages.
+        """
+        results = []
+        for n_persons in persons_counts:
+            for n_products in products_counts:
+                stream = SyntheticDetectionStream(
+                    n_persons=n_persons,
+                    n_products=n_products,
+                    **stream_params
+                )
+                results.append(self.run(stream=stream))
+
+        return results
+
+    @staticmethod
+    def format_results(results: List[Dict]) -> str:
+        header_stages = PostInferenceBenchmark.STAGES + [
+            StageTimer.FRAME_STAGE
+        ]
+        header = (
+            f'{"persons":>7} {"products":>8} {"dets":>6} {"fps":>8} ' +
+            ' '.join(f'{stage[:12]:>12}' for stage in header_stages)
+        )
+        lines = [
+            header,
+            '(stage columns: mean / p95 latency in ms)',
+        ]
+        for result in results:
+            stages_columns = []
+            for stage in header_stages:
+                summary = result['stages'].get(stage)
+                if summary is None:
+                    stages_columns.append(f'{"-":>12}')
+                else:
+                    stages_columns.append(
+                        f'{summary["mean_ms"]:>5.3f}/{summary["p95_ms"]:<6.3f}'
+                    )
+            lines.append(
+                f'{result["persons"]:>7} {result["products"]:>8} '
+                f'{result["detections_per_frame"]:>6} '
+                f'{result["fps"]:>8} ' +
+                ' '.join(stages_columns)
+            )
+
+        return '\n'.join(lines)
+
+
+def parse_counts(ctx, param, value: str) -> List[int]:
+    try:
+        return [int(count) for count in value.split(',') if count]
+    except ValueError:
+        raise click.BadParameter('expected comma separated integers')
+
+
+@click.command()
+@click.option('--frames', default=500, help='Timed frames per run')
+@click.option('--warmup-frames', default=50, help='Untimed frames per run')
+@click.option('--skip-frames', default=2, help='Frames between detections')
+@click.option(
+    '--persons',
+    default='1,2,4,8',
+    callback=parse_counts,
+    help='Comma separated persons counts'
+)
+@click.option(
+    '--products',
+    default='4,16,64',
+    callback=parse_counts,
+    help='Comma separated products counts'
+)
+@click.option('--hands-per-person', default=2)
+@click.option('--motion', default=4.0, help='Random walk step in pixels')
+@click.option('--occlusion', default=0.05, help='Missed detection rate')
+@click.option(
+    '--hand-overlap',
+    default=0.1,
+    help='Rate of hands inside two persons'
+)
+@click.option('--seed', default=0)
+@click.option(
+    '--per-class-tracking',
+    is_flag=True,
+    default=False,
+    help='One tracker for each group of labels'
+)
+@click.option(
+    '--json-output',
+    default=None,
+    type=click.Path(dir_okay=False),
+    help='Save the results as JSON'
+)
+@click.option('--verbose', is_flag=True, default=False)
+def main(
+    frames,
+    warmup_frames,
+    skip_frames,
+    persons,
+    products,
+    hands_per_person,
+    motion,
+    occlusion,
+    hand_overlap,
+    seed,
+    per_class_tracking,
+    json_output,
+    verbose
+):
+    if not verbose:
+        # The pipeline modules log every frame
+        logging.disable(logging.INFO)
+
+    benchmark = PostInferenceBenchmark.create_from_prsp_matrix_name(
+        n_frames=frames,
+        warmup_frames=warmup_frames,
+        skip_frames=skip_frames,
+        tracker_params={
+            'per_class': per_class_tracking,
+        }
+    )
+    results = benchmark.run_scaling(
+        persons_counts=persons,
+        products_counts=products,
+        hands_per_person=hands_per_person,
+        motion=motion,
+        occlusion=occlusion,
+        hand_overlap=hand_overlap,
+        seed=seed
+    )
+
+    click.echo(PostInferenceBenchmark.format_results(results))
+
+    if json_output is not None:
+        Path(json_output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+import numpy
+
+from typing import Iterator, Optional, Tuple
+
+from assigning.assign import DetectionLabel
+
+
+class SyntheticDetectionStream:
+    """
+    Deterministic stream of detections that looks like the output of
+    DetectionsModel.get_image_predictions (N x [x1, y1, x2, y2, class,
+    score]) for a camera looking at the store table, without a model or a
+    video.
+
+    - Persons stand side by side in front of the table and move with a
+    random walk of motion pixels per frame. Adjacent persons overlap by
+    person_overlap of their width.
+    - Each person has hands_per_person hands moving inside its box. With
+    probability hand_overlap a hand is placed in the strip shared with the
+    next person, so it is inside both persons (intercepted hand).
+    - Products are static on the table polygon. Each frame a product is
+    taken with probability take_rate and a taken product is put back with
+    probability restock_rate.
+    - Each detection is missed with probability occlusion.
+    """
+
+    FRAME_SHAPE = (1080, 1920)
+    # Table corners in the camera frame (location/table_points.py)
+    TABLE_CORNERS = numpy.array(
+        [[384, 840], [1348, 538], [1524, 746], [450, 1084]],
+        dtype=numpy.float64
+    )
+    PERSON_SIZE = (220, 620)
+    HAND_SIZE = (60, 60)
+    PRODUCT_SIZE = (40, 60)
+    PRODUCT_LABELS = [
+        DetectionLabel.PRODUCT_A,
+        DetectionLabel.PRODUCT_B,
+        DetectionLabel.PRODUCT_C,
+        DetectionLabel.PRODUCT_D,
+    ]
+
+    def __init__(
+            self,
+            n_persons: int = 2,
+            hands_per_person: int = 2,
+            n_products: int = 8,
+            motion: float = 4.0,
+            occlusion: float = 0.05,
+            hand_overlap: float = 0.1,
+            person_overlap: float = 0.2,
+            take_rate: float = 0.01,
+            restock_rate: float = 0.01,
+            seed: int = 0
+    ) -> None:
+        self.n_persons = n_persons
+        self.hands_per_person = hands_per_person
+        self.n_products = n_products
+        self.motion = motion
+        self.occlusion = occlusion
+        self.hand_overlap = hand_overlap
+        self.person_overlap = person_overlap
+        self.take_rate = take_rate
+        self.restock_rate = restock_rate
+        self.seed = seed
+
+        self.rng = numpy.random.default_rng(seed)
+        self.frame_number = 0
+
+        self.persons_centers = self.init_persons_centers()
+        self.persons_home = self.persons_centers.copy()
+        # Hands offsets relative to the person center
+        self.hands_offsets = self.rng.uniform(
+            low=[-0.3, 0.0],
+            high=[0.3, 0.3],
+            size=(n_persons, hands_per_person, 2)
+        ) * numpy.array(self.PERSON_SIZE)
+
+        self.products_centers = self.init_products_centers()
+        self.products_labels = self.rng.choice(
+            self.PRODUCT_LABELS,
+            size=n_products
+        ).astype(numpy.float64)
+        self.products_present = numpy.ones(n_products, dtype=bool)
+
+    def init_persons_centers(self) -> numpy.ndarray:
+        person_width, person_height = self.PERSON_SIZE
+        spacing = person_width * (1 - self.person_overlap)
+        row_width = spacing * (self.n_persons - 1)
+        first_x = (self.FRAME_SHAPE[1] - row_width) / 2
+        centers_x = first_x + spacing * numpy.arange(self.n_persons)
+        centers_y = numpy.full(self.n_persons, 60 + person_height / 2)
+        return numpy.stack([centers_x, centers_y], axis=1)
+
+    def init_products_centers(self) -> numpy.ndarray:
+        """
+        Sample the products centers inside the table polygon with a bilinear
+        interpolation of its corners.
+        """
+        u, v = self.rng.uniform(0.1, 0.9, size=(2, self.n_products, 1))
+        up_left, up_right, down_right, down_left = self.TABLE_CORNERS
+        top = up_left + (up_right - up_left) * u
+        bottom = down_left + (down_right - down_left) * u
+        return top + (bottom - top) * v
+
+    @staticmethod
+    def centers_to_bboxes(
+        centers: numpy.ndarray,
+        size: Tuple[int, int]
+    ) -> numpy.ndarray:
+        half_size = numpy.array(size, dtype=numpy.float64) / 2
+        return numpy.concatenate(
+            [centers - half_size, centers + half_size],
+            axis=-1
+        )
+
+    def step(self):
+        """
+        Move the persons and hands, and take or restock products.
+        """
+        rng = self.rng
+        person_width = self.PERSON_SIZE[0]
+
+        # Persons wander around their place in front of the table
+        self.persons_centers += rng.normal(
+            0, self.motion, size=self.persons_centers.shape
+        )
+        max_drift = person_width * 0.25
+        self.persons_centers = numpy.clip(
+            self.persons_centers,
+            self.persons_home - max_drift,
+            self.persons_home + max_drift
+        )
+
+        self.hands_offsets += rng.normal(
+            0, self.motion * 2, size=self.hands_offsets.shape
+        )
+        max_offset = (
+            numpy.array(self.PERSON_SIZE) / 2 -
+            numpy.array(self.HAND_SIZE) / 2
+        )
+        self.hands_offsets = numpy.clip(
+            self.hands_offsets,
+            -max_offset,
+            max_offset
+        )
+
+        taken = self.products_present & (
+            rng.random(self.n_products) < self.take_rate
+        )
+        restocked = ~self.products_present & (
+            rng.random(self.n_products) < self.restock_rate
+        )
+        self.products_present = (self.products_present & ~taken) | restocked
+
+    def get_hands_centers(self) -> numpy.ndarray:
+        hands_centers = (
+            self.persons_centers[:, None, :] + self.hands_offsets
+        )
+        if self.n_persons > 1 and self.hand_overlap > 0:
+            # Move some hands of each person (but the last) to the strip it
+            # shares with the next person
+            overlapping = self.rng.random(hands_centers.shape[:2]) < (
+                self.hand_overlap
+            )
+            overlapping[-1, :] = False
+            person_width = self.PERSON_SIZE[0]
+            strip_x = (
+                (self.persons_centers[:-1, 0] + person_width / 2) +
+                (self.persons_centers[1:, 0] - person_width / 2)
+            ) / 2
+            strip_x = numpy.concatenate([strip_x, [0.0]])
+            hands_x = numpy.broadcast_to(
+                strip_x[:, None],
+                overlapping.shape
+            )
+            hands_centers[..., 0] = numpy.where(
+                overlapping,
+                hands_x,
+                hands_centers[..., 0]
+            )
+
+        return hands_centers.reshape(-1, 2)
+
+    def next_predictions(self) -> numpy.ndarray:
+        """
+        Return the predictions of the next frame as a (N, 6) array.
+        """
+        self.step()
+
+        persons_bboxes = self.centers_to_bboxes(
+            self.persons_centers,
+            self.PERSON_SIZE
+        )
+        hands_bboxes = self.centers_to_bboxes(
+            self.get_hands_centers(),
+            self.HAND_SIZE
+        )
+        products_bboxes = self.centers_to_bboxes(
+            self.products_centers[self.products_present],
+            self.PRODUCT_SIZE
+        )
+
+        bboxes = numpy.concatenate(
+            [persons_bboxes, hands_bboxes, products_bboxes],
+            axis=0
+        )
+        labels = numpy.concatenate(
+            [
+                numpy.full(len(persons_bboxes), DetectionLabel.PERSON),
+                numpy.full(len(hands_bboxes), DetectionLabel.HAND),
+                self.products_labels[self.products_present],
+            ]
+        )
+        scores = self.rng.uniform(0.5, 1.0, size=len(bboxes))
+
+        visible = self.rng.random(len(bboxes)) >= self.occlusion
+        predictions = numpy.concatenate(
+            [
+                bboxes.round(),
+                labels[:, None],
+                scores[:, None],
+            ],
+            axis=1
+        )[visible]
+
+        self.frame_number += 1
+
+        return predictions
+
+    def iter_frames(
+        self,
+        n_frames: int,
+        skip_frames: int = 1
+    ) -> Iterator[Tuple[int, Optional[numpy.ndarray]]]:
+        """
+        Yield (frame number, predictions) for n_frames, with predictions only
+        every skip_frames frames and None in between, like main.py.
+        """
+        for frame_number in range(n_frames):
+            if skip_frames == 0 or frame_number % skip_frames == 0:
+                predictions = self.next_predictions()
+            else:
+                self.step()
+                self.frame_number += 1
+                predictions = None
+            yield frame_number, predictions
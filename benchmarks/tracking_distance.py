@@ -0,0 +1,153 @@
+import click
+import norfair
+from norfair.distances import get_distance_by_name
+
+from typing import Dict
+import logging
+import time
+
+from benchmarks.synthetic import SyntheticDetectionStream
+from tracking.distances import VectorizedIoUDistance
+from tracking.norfair_tracker import NorfairTracker
+
+
+class TrackingDistanceBenchmark:
+    """
+    Times norfair's 'iou' distance and VectorizedIoUDistance on the same
+    synthetic detections: get_distances on the detections of each frame
+    against the tracked objects of the reference tracker, and the updates
+    of two trackers, one with each distance. tests/test_distances.py checks
+    that both give the same distances and tracks.
+    """
+
+    def __init__(
+            self,
+            n_frames: int = 500,
+            n_persons: int = 4,
+            n_products: int = 32,
+            skip_frames: int = 2,
+            seed: int = 0
+    ) -> None:
+        stream = SyntheticDetectionStream(
+            n_persons=n_persons,
+            n_products=n_products,
+            seed=seed
+        )
+        self.frames = list(
+            stream.iter_frames(n_frames=n_frames, skip_frames=skip_frames)
+        )
+        self.skip_frames = skip_frames
+
+    @staticmethod
+    def create_tracker(vectorized_iou: bool) -> norfair.Tracker:
+        return NorfairTracker.create_tracker(
+            initialization_delay=5,
+            distance_threshold=2,
+            hit_counter_max=10,
+            vectorized_iou=vectorized_iou
+        )
+
+    def run(self) -> Dict:
+        builtin_distance = get_distance_by_name('iou')
+        vectorized_distance = VectorizedIoUDistance()
+
+        builtin_tracker = self.create_tracker(vectorized_iou=False)
+        vectorized_tracker = self.create_tracker(vectorized_iou=True)
+
+        builtin_distance_time = 0.0
+        vectorized_distance_time = 0.0
+        builtin_update_time = 0.0
+        vectorized_update_time = 0.0
+        n_distance_matrices = 0
+        n_distance_pairs = 0
+
+        for _, predictions in self.frames:
+            if predictions is not None:
+                detections = NorfairTracker.convert_predictions_to_norfair(
+                    predictions=predictions
+                )
+                objects = builtin_tracker.tracked_objects
+                if objects and detections:
+                    start = time.perf_counter()
+                    builtin_distance.get_distances(objects, detections)
+                    builtin_distance_time += time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    vectorized_distance.get_distances(objects, detections)
+                    vectorized_distance_time += time.perf_counter() - start
+
+                    n_distance_matrices += 1
+                    n_distance_pairs += len(objects) * len(detections)
+
+            start = time.perf_counter()
+            NorfairTracker.update_tracker(
+                tracker=builtin_tracker,
+                predictions=predictions,
+                period=self.skip_frames
+            )
+            builtin_update_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            NorfairTracker.update_tracker(
+                tracker=vectorized_tracker,
+                predictions=predictions,
+                period=self.skip_frames
+            )
+            vectorized_update_time += time.perf_counter() - start
+
+        return {
+            'frames': len(self.frames),
+            'distance_matrices': n_distance_matrices,
+            'mean_pairs': round(
+                n_distance_pairs / max(n_distance_matrices, 1)
+            ),
+            'builtin_distance_ms': round(
+                builtin_distance_time * 1000 / max(n_distance_matrices, 1), 4
+            ),
+            'vectorized_distance_ms': round(
+                vectorized_distance_time * 1000 / max(n_distance_matrices, 1),
+                4
+            ),
+            'builtin_update_ms': round(
+                builtin_update_time * 1000 / len(self.frames), 4
+            ),
+            'vectorized_update_ms': round(
+                vectorized_update_time * 1000 / len(self.frames), 4
+            ),
+        }
+
+
+@click.command()
+@click.option('--frames', default=500)
+@click.option('--persons', default=4)
+@click.option('--products', default=32)
+@click.option('--skip-frames', default=2)
+@click.option('--seed', default=0)
+def main(frames, persons, products, skip_frames, seed):
+    # norfair warns about every bbox with zero area
+    logging.disable(logging.WARNING)
+
+    result = TrackingDistanceBenchmark(
+        n_frames=frames,
+        n_persons=persons,
+        n_products=products,
+        skip_frames=skip_frames,
+        seed=seed
+    ).run()
+
+    click.echo(
+        f'{result["distance_matrices"]} distance matrices of '
+        f'{result["mean_pairs"]} pairs on average'
+    )
+    click.echo(
+        f'get_distances: norfair iou {result["builtin_distance_ms"]} ms, '
+        f'vectorized iou {result["vectorized_distance_ms"]} ms'
+    )
+    click.echo(
+        f'tracker.update: norfair iou {result["builtin_update_ms"]} ms, '
+        f'vectorized iou {result["vectorized_update_ms"]} ms'
+    )
+
+
+if __name__ == '__main__':
+    main()
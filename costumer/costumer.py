@@ -5,6 +5,18 @@ from assigning.person import Person
 from assigning.hand import Hand
 
 class Costumer:
+    # The close products history is created the first time it is used
+    __slots__ = (
+        'person',
+        'person_id',
+        'hands',
+        'first_hand',
+        'second_hand',
+        'products',
+        '_close_products_history',
+        'active',
+        'n_frames_inactive',
+    )
 
     MAX_FRAMES_CLOSE_HISTORY = 10
 
@@ -17,13 +29,19 @@ class Costumer:
         self.second_hand = None
 
         self.products = []
-        self.close_products_history = queue.LifoQueue(
-            maxsize=self.MAX_FRAMES_CLOSE_HISTORY
-        )
+        self._close_products_history = None
 
         self.active = True
         self.n_frames_inactive = 0
 
+    @property
+    def close_products_history(self) -> queue.LifoQueue:
+        if self._close_products_history is None:
+            self._close_products_history = queue.LifoQueue(
+                maxsize=self.MAX_FRAMES_CLOSE_HISTORY
+            )
+        return self._close_products_history
+
     @classmethod
     def create_from_person_hand_assignment(
         cls,
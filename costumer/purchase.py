@@ -25,6 +25,16 @@ class Purchase:
         self.active_costumers = active_costumers
         self.on_hold_costumers = on_hold_costumers
 
+        # Costumers by person id, kept along the lists
+        self.active_costumers_person_ids = {
+            costumer.person_id: costumer
+            for costumer in self.active_costumers
+        }
+        self.on_hold_costumers_person_ids = {
+            costumer.person_id: costumer
+            for costumer in self.on_hold_costumers
+        }
+
     def manage_costumers(
             self,
             person_hand_assignments: List[Tuple[Person, Hand]]
@@ -35,29 +45,28 @@ class Purchase:
             - Update hands of active costumers
             - Forget (Delete) costumers that have not been active
         """
-        active_costumers_person_ids = {
-            costumer.person_id: costumer
-            for costumer in self.active_costumers
-        }
-        on_hold_costumers_person_ids = {
-            costumer.person_id: costumer
-            for costumer in self.on_hold_costumers
-        }
-
         created_updated_costumers = self.get_managing_costumers_data(
-            active_costumers_person_ids=active_costumers_person_ids,
-            on_hold_costumers_person_ids=on_hold_costumers_person_ids,
+            active_costumers_person_ids=self.active_costumers_person_ids,
+            on_hold_costumers_person_ids=self.on_hold_costumers_person_ids,
             person_hand_assignments=person_hand_assignments
         )
 
-        updated_costumers_person_ids_set = set(created_updated_costumers)
+        created_updated_person_ids = {
+            costumer.person_id: costumer
+            for costumer in created_updated_costumers
+        }
 
-        new_on_hold_costumers = set(self.active_costumers).difference(
-            updated_costumers_person_ids_set
-        )
+        # The active costumers that were not updated go on hold
+        new_on_hold_person_ids = {
+            person_id: costumer
+            for person_id, costumer in self.active_costumers_person_ids.items()
+            if person_id not in created_updated_person_ids
+        }
 
         self.active_costumers = created_updated_costumers
-        self.on_hold_costumers = list(new_on_hold_costumers)
+        self.active_costumers_person_ids = created_updated_person_ids
+        self.on_hold_costumers = list(new_on_hold_person_ids.values())
+        self.on_hold_costumers_person_ids = new_on_hold_person_ids
 
     @staticmethod
     def get_managing_costumers_data(
@@ -158,8 +158,10 @@ class Store:
         active_hands_location_top, active_costumers_location = (
             self.transform_filter_costumers_location()
         )
-        products_location_top = products_location_top
-        products_location_top = numpy.array(products_location_top)
+        products_location_top = numpy.array(
+            products_location_top,
+            dtype=numpy.float64
+        ).reshape(-1, 2)
 
         if active_hands_location_top.size > 0:
             hands_products_distances = (
@@ -1,7 +1,6 @@
 import numpy
-from sklearn.metrics.pairwise import (
-    euclidean_distances as sklearn_pairwise_distances
-)
+
+from geometry.boxes import BoxGeometry
 
 
 class CostumerUtils:
@@ -24,8 +23,8 @@ class CostumerUtils:
             between element X0 and Y0, will be in position (0, 0) in this
             array of distances. 
         """
-        coords_distances_narray = sklearn_pairwise_distances(
-            coords_vec_one,
-            coords_vec_two
+        coords_distances_narray = BoxGeometry.pairwise_distances(
+            points1=coords_vec_one,
+            points2=coords_vec_two
         )
         return coords_distances_narray
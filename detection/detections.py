@@ -1,10 +1,15 @@
 import numpy
 
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 import logging
+import time
 
 from detection.utils import DetectionUtils
 from detection.onnx_model import ONNXModel
+from detection.session_config import SessionConfig
+from detection.motion_gate import MotionGate
+from profiling.stage_timer import StageTimer
 
 
 logger = logging.getLogger(__name__)
@@ -16,44 +21,205 @@ logger.addHandler(c_handler)
 class DetectionsModel:
     MODELS_FOLDER = Path.cwd() / 'models'
 
-    def __init__(self, model_name) -> None:
+    def __init__(
+            self,
+            model_name,
+            session_config: Optional[SessionConfig] = None,
+            stage_timer: Optional[StageTimer] = None,
+            motion_gate: Optional[MotionGate] = None,
+            roi_polygon: Optional[numpy.ndarray] = None,
+            roi_margin: int = 0
+    ) -> None:
         model_full_path = self.MODELS_FOLDER / model_name
         self.model_path = model_full_path
+        self.session_config = session_config
 
         self.model_type = self.get_model_type(model_path=self.model_path)
         if self.model_type == '.onnx':
-            model = self.model_from_onnx(model_path=self.model_path)
+            model = self.model_from_onnx(
+                model_path=self.model_path,
+                session_config=self.session_config
+            )
 
         self.model = model
 
+        self.stage_timer = stage_timer or StageTimer()
+        self.model.stage_timer = self.stage_timer
+
+        # Frames without motion reuse the predictions of the last inference
+        self.motion_gate = motion_gate
+        self.last_predictions = None
+
+        # The model only sees the crop around the roi polygon (e.g. the
+        # table), the crop of each frame shape is computed once
+        self.roi_polygon = roi_polygon
+        self.roi_margin = roi_margin
+        self.crop_rects: Dict[tuple, Optional[Tuple[int, int, int, int]]] = {}
+
     def model_from_onnx(
             self,
             model_path: Path,
-            providers=['CPUExecutionProvider']
+            providers=['CPUExecutionProvider'],
+            session_config: Optional[SessionConfig] = None
     ):
         model = ONNXModel.create_model(
             model_path=str(model_path),
-            providers=providers
+            providers=providers,
+            session_config=session_config
         )
         return model
 
+    def get_crop_rect(
+            self,
+            image_shape: tuple
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Crop (X1, Y1, X2, Y2) of the frames with image_shape, or None to use
+        the whole frame.
+        """
+        image_shape = tuple(image_shape[:2])
+        if image_shape not in self.crop_rects:
+            crop_rect = DetectionUtils.compute_crop_rect(
+                polygon=self.roi_polygon,
+                image_shape=image_shape,
+                margin=self.roi_margin
+            )
+            if crop_rect is None:
+                logger.info(
+                    f'Region of interest is outside of the {image_shape[1]}'
+                    f'x{image_shape[0]} frame, using the whole frame'
+                )
+            else:
+                logger.info(
+                    f'Region of interest crop {crop_rect} of the '
+                    f'{image_shape[1]}x{image_shape[0]} frame'
+                )
+            self.crop_rects[image_shape] = crop_rect
+        return self.crop_rects[image_shape]
+
+    def crop_image(
+            self,
+            raw_image: numpy.ndarray
+    ) -> Tuple[numpy.ndarray, Tuple[int, int]]:
+        """
+        Return the part of the image passed to the model and its offset
+        (X, Y) in the frame.
+        """
+        if self.roi_polygon is None:
+            return raw_image, (0, 0)
+        crop_rect = self.get_crop_rect(image_shape=raw_image.shape)
+        if crop_rect is None:
+            return raw_image, (0, 0)
+        x1, y1, x2, y2 = crop_rect
+        return raw_image[y1:y2, x1:x2], (x1, y1)
+
     def get_image_predictions(
             self,
             raw_image: numpy.array,
             resize=False
     ) -> numpy.ndarray:
-        predictions = self.model.inference(raw_image=raw_image)
-        if self.model_type == '.onnx':
-            if resize and predictions.size > 0:
-                predictions = self.model.predictions_from_onnx_to_standard(
-                    predictions=predictions
-                )
-                predictions = DetectionUtils.resize_preds_w_scale_and_padds(
+        if self.motion_gate is not None:
+            with self.stage_timer.stage('motion_gate'):
+                motion = self.motion_gate.has_motion(image=raw_image)
+            if not motion and self.last_predictions is not None:
+                return self.last_predictions.copy()
+            inference_start = time.perf_counter()
+
+        # Without resize the boxes stay in the model input of the crop
+        model_image, crop_offset = self.crop_image(raw_image=raw_image)
+        predictions = self.model.inference(raw_image=model_image)
+        if self.model_type == '.onnx' and resize:
+            with self.stage_timer.stage('postprocess'):
+                predictions = self.resize_standard_predictions(
                     predictions=predictions,
                     scale_ratio=self.model.scale_ratio,
-                    diff_padds=self.model.diff_padds
+                    diff_padds=self.model.diff_padds,
+                    offset=crop_offset
                 )
 
+        if self.motion_gate is not None:
+            self.motion_gate.record_inference(
+                elapsed_s=time.perf_counter() - inference_start
+            )
+            self.last_predictions = predictions.copy()
+
+        return predictions
+
+    def get_batch_predictions(
+            self,
+            frames: List[numpy.ndarray],
+            resize=True
+    ) -> List[numpy.ndarray]:
+        """
+        Run the detection model once over a batch of frames. Returns a list
+        with the predictions of each frame, in the same order as frames.
+        """
+        if not frames:
+            return []
+
+        crops = [self.crop_image(raw_image=frame) for frame in frames]
+        predictions, scale_ratios, diff_padds = self.model.inference_batch(
+            raw_images=[model_image for model_image, _ in crops]
+        )
+        frames_predictions = self.model.split_predictions_by_batch_index(
+            predictions=predictions,
+            n_images=len(frames)
+        )
+
+        if self.model_type == '.onnx' and resize:
+            with self.stage_timer.stage('postprocess'):
+                frames_predictions = self.resize_frames_predictions(
+                    frames_predictions=frames_predictions,
+                    scale_ratios=scale_ratios,
+                    diff_padds=diff_padds,
+                    offsets=[crop_offset for _, crop_offset in crops]
+                )
+
+        return frames_predictions
+
+    def resize_frames_predictions(
+            self,
+            frames_predictions: List[numpy.ndarray],
+            scale_ratios: List[float],
+            diff_padds: List[Tuple[float, float]],
+            offsets: Optional[List[Tuple[int, int]]] = None
+    ) -> List[numpy.ndarray]:
+        if offsets is None:
+            offsets = [(0, 0)] * len(frames_predictions)
+        frames_predictions = [
+            self.resize_standard_predictions(
+                predictions=frame_predictions,
+                scale_ratio=scale_ratio,
+                diff_padds=diff_pads,
+                offset=offset
+            )
+            for frame_predictions, scale_ratio, diff_pads, offset in zip(
+                frames_predictions,
+                scale_ratios,
+                diff_padds,
+                offsets
+            )
+        ]
+
+        return frames_predictions
+
+    def resize_standard_predictions(
+            self,
+            predictions: numpy.ndarray,
+            scale_ratio: float,
+            diff_padds: Tuple[float, float],
+            offset: Tuple[int, int] = (0, 0)
+    ) -> numpy.ndarray:
+        if predictions.size > 0:
+            predictions = self.model.predictions_from_onnx_to_standard(
+                predictions=predictions
+            )
+            predictions = DetectionUtils.resize_preds_w_scale_and_padds(
+                predictions=predictions,
+                scale_ratio=scale_ratio,
+                diff_padds=diff_padds,
+                offset=offset
+            )
         return predictions
 
     @staticmethod
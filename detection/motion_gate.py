@@ -0,0 +1,200 @@
+import cv2
+import numpy
+
+from typing import Dict, Optional
+import logging
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+# create handler
+c_handler = logging.StreamHandler()
+# create formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+# add formatter to ch
+c_handler.setFormatter(formatter)
+# Add handler to logger
+logger.addHandler(c_handler)
+
+
+class MotionGate:
+    """
+    Cheap check, before the detection model, of whether a frame changed.
+    Frames are reduced to a small blurred grayscale copy and compared with
+    a running background (cv2.accumulateWeighted). The frame has motion
+    when the fraction of changed pixels is above the threshold:
+
+    - width: width of the gray copy, the height keeps the aspect ratio.
+    - background_alpha: weight of each frame in the running background.
+    - pixel_threshold: gray levels a pixel has to differ from the
+    background to count as changed.
+    - motion_threshold: fraction (0 to 1) of changed pixels for motion.
+    - roi_polygon: optional polygon (N x [x, y], in frame pixels) where the
+    motion is measured, e.g. the table corners. If it is outside of the
+    frame, the whole frame is used.
+    - roi_margin: pixels around the polygon added to the region.
+    - max_reused_frames: gated frames in a row after which the model runs
+    anyway, so slow changes absorbed by the background are detected.
+    """
+
+    def __init__(
+            self,
+            width: int = 160,
+            background_alpha: float = 0.05,
+            pixel_threshold: int = 15,
+            motion_threshold: float = 0.005,
+            roi_polygon: Optional[numpy.ndarray] = None,
+            roi_margin: int = 40,
+            max_reused_frames: int = 30
+    ) -> None:
+        self.width = width
+        self.background_alpha = background_alpha
+        self.pixel_threshold = pixel_threshold
+        self.motion_threshold = motion_threshold
+        self.roi_polygon = roi_polygon
+        self.roi_margin = roi_margin
+        self.max_reused_frames = max_reused_frames
+
+        self.background = None
+        self.frame_shape = None
+        self.roi_mask = None
+        self.roi_pixels = 0
+        self.reused_frames = 0
+
+        self.checks = 0
+        self.hits = 0
+        self.gate_s = 0.0
+        # Mean inference time, updated with each inference that runs
+        self.inference_ms = None
+
+    def compute_gray_image(self, image: numpy.ndarray) -> numpy.ndarray:
+        height, width = image.shape[:2]
+        gray_size = (
+            self.width,
+            max(1, round(height * self.width / width))
+        )
+        gray_image = cv2.cvtColor(
+            cv2.resize(image, gray_size, interpolation=cv2.INTER_AREA),
+            cv2.COLOR_BGR2GRAY
+        )
+        return cv2.GaussianBlur(gray_image, (5, 5), 0)
+
+    def create_roi_mask(
+            self,
+            frame_shape: tuple,
+            gray_shape: tuple
+    ) -> Optional[numpy.ndarray]:
+        """
+        Mask of the region of interest in the gray copy, or None to use the
+        whole frame.
+        """
+        if self.roi_polygon is None:
+            return None
+
+        scale = gray_shape[1] / frame_shape[1]
+        polygon = numpy.round(
+            numpy.asarray(self.roi_polygon, dtype=numpy.float32) * scale
+        ).astype(numpy.int32)
+        roi_mask = numpy.zeros(gray_shape[:2], dtype=numpy.uint8)
+        cv2.fillPoly(roi_mask, [polygon], 255)
+        margin = max(1, round(self.roi_margin * scale))
+        roi_mask = cv2.dilate(
+            roi_mask,
+            cv2.getStructuringElement(
+                cv2.MORPH_ELLIPSE,
+                (2 * margin + 1, 2 * margin + 1)
+            )
+        )
+
+        if not numpy.any(roi_mask):
+            logger.info(
+                f'Motion gate region is outside of the {frame_shape[1]}x'
+                f'{frame_shape[0]} frame, using the whole frame'
+            )
+            return None
+        return roi_mask
+
+    def reset(self, gray_image: numpy.ndarray, frame_shape: tuple):
+        self.background = gray_image.astype(numpy.float32)
+        self.frame_shape = frame_shape
+        self.roi_mask = self.create_roi_mask(
+            frame_shape=frame_shape,
+            gray_shape=gray_image.shape
+        )
+        if self.roi_mask is None:
+            self.roi_pixels = gray_image.size
+        else:
+            self.roi_pixels = int(numpy.count_nonzero(self.roi_mask))
+
+    def compute_motion_fraction(self, gray_image: numpy.ndarray) -> float:
+        """
+        Fraction of pixels of the region that differ from the background.
+        The background is updated with the frame afterwards.
+        """
+        changed = cv2.absdiff(
+            gray_image,
+            cv2.convertScaleAbs(self.background)
+        ) > self.pixel_threshold
+        if self.roi_mask is not None:
+            changed &= self.roi_mask > 0
+        cv2.accumulateWeighted(
+            gray_image,
+            self.background,
+            self.background_alpha
+        )
+        return numpy.count_nonzero(changed) / max(self.roi_pixels, 1)
+
+    def has_motion(self, image: numpy.ndarray) -> bool:
+        """
+        Whether the detection model has to run in the frame. False means the
+        previous predictions can be reused.
+        """
+        start = cv2.getTickCount()
+        gray_image = self.compute_gray_image(image=image)
+        if self.background is None or image.shape != self.frame_shape:
+            self.reset(gray_image=gray_image, frame_shape=image.shape)
+            motion = True
+        else:
+            motion_fraction = self.compute_motion_fraction(
+                gray_image=gray_image
+            )
+            motion = (
+                motion_fraction > self.motion_threshold or
+                self.reused_frames >= self.max_reused_frames
+            )
+
+        if motion:
+            self.reused_frames = 0
+        else:
+            self.reused_frames += 1
+            self.hits += 1
+        self.checks += 1
+        self.gate_s += (
+            (cv2.getTickCount() - start) / cv2.getTickFrequency()
+        )
+        return motion
+
+    def record_inference(self, elapsed_s: float):
+        """
+        Measured time of an inference that the gate let run, used to
+        estimate the time saved by the reused frames.
+        """
+        elapsed_ms = elapsed_s * 1000
+        if self.inference_ms is None:
+            self.inference_ms = elapsed_ms
+        else:
+            self.inference_ms = 0.9 * self.inference_ms + 0.1 * elapsed_ms
+
+    def get_stats(self) -> Dict:
+        gate_ms = self.gate_s * 1000
+        saved_ms = self.hits * (self.inference_ms or 0.0) - gate_ms
+        return {
+            'checks': self.checks,
+            'hits': self.hits,
+            'hit_rate': round(self.hits / max(self.checks, 1), 3),
+            'mean_gate_ms': round(gate_ms / max(self.checks, 1), 3),
+            'mean_inference_ms': round(self.inference_ms or 0.0, 3),
+            'cpu_saved_ms': round(saved_ms, 1),
+        }
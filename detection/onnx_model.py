@@ -1,9 +1,12 @@
 import onnxruntime
 import numpy
 
+from typing import List, Optional, Tuple
 import logging
 
 from source.utils import ImageUtils
+from detection.session_config import SessionConfig
+from profiling.stage_timer import StageTimer
 
 
 logger = logging.getLogger(__name__)
@@ -21,6 +24,15 @@ logger.addHandler(c_handler)
 
 
 class ONNXModel:
+    DEFAULT_INPUT_SHAPE = (640, 640)
+    ONNX_NUMPY_TYPES = {
+        'tensor(float)': numpy.float32,
+        'tensor(float16)': numpy.float16,
+        'tensor(double)': numpy.float64,
+        'tensor(int64)': numpy.int64,
+        'tensor(int32)': numpy.int32,
+    }
+
     def __init__(
             self,
             model_path: str,
@@ -31,32 +43,112 @@ class ONNXModel:
         self.scale_ratio = None
         self.diff_padds = None
 
+        # Resolve the I/O metadata once, the session does not change
+        self.input_names = self.get_session_names_from('inputs')
+        self.output_names = self.get_session_names_from('outputs')
+        self.input_shape = self.get_session_input_shape()
+        self.input_batch_size = self.get_session_input_batch_size()
+
+        # Input buffers and their OrtValue by batch size, and the resize
+        # buffers by the shape of the incoming frames
+        self.input_buffers = {}
+        self.input_ort_values = {}
+        self.bound_batch_size = None
+        self.resize_buffers = {}
+
+        self.io_binding = self.session.io_binding()
+        self.output_buffers = self.bind_session_outputs()
+
+        self.stage_timer = StageTimer()
+
     @classmethod
-    def create_model(cls, model_path, providers=['CPUExecutionProvider']):
+    def create_model(
+        cls,
+        model_path,
+        providers=['CPUExecutionProvider'],
+        session_config: Optional[SessionConfig] = None
+    ):
         model_path = str(model_path)
+        if session_config is not None:
+            session_model_path, session_options = (
+                session_config.build_session_options(model_path=model_path)
+            )
+            providers = session_config.providers
+        else:
+            session_model_path, session_options = model_path, None
+
         session = onnxruntime.InferenceSession(
-            model_path,
+            session_model_path,
+            sess_options=session_options,
             providers=providers
         )
+        if session_config is not None:
+            session_config.save_optimized_model_key(model_path=model_path)
         return cls(model_path, session)
 
-    @staticmethod
-    def preprocess_input(raw_image: numpy.ndarray):
-        preprocessed_img = ImageUtils.convert_image_channels(
-            image_array=raw_image
+    def preprocess_input(
+        self,
+        raw_image: numpy.ndarray,
+        input_buffer: Optional[numpy.ndarray] = None
+    ):
+        """
+        Letterbox, swap channels, transpose and normalize the raw image in a
+        single pass into the reusable input buffer of the model, or into
+        input_buffer if given (e.g. one image of a batch). Returns the input
+        buffer, the scale ratio and the difference padding.
+        """
+        if input_buffer is None:
+            input_buffer = self.get_input_buffer()
+        scale_ratio, diff_pads = ImageUtils.letterbox_normalize_into(
+            image_array=raw_image,
+            output_buffer=input_buffer,
+            resize_buffer=self.get_resize_buffer(image_shape=raw_image.shape)
         )
-        preprocessed_img, scale_ratio, diff_pads = (
-            ImageUtils.resize_image_get_scale_padds(
-                image_array=preprocessed_img
+        return input_buffer, scale_ratio, diff_pads
+
+    def get_input_buffer(self, batch_size: int = 1) -> numpy.ndarray:
+        """
+        Return the preallocated input buffer for batch_size images, binding
+        it to the session if another batch size was bound before. Buffers are
+        created the first time, then the preprocessing writes into the same
+        memory for every frame.
+        """
+        if batch_size not in self.input_buffers:
+            input_buffer = numpy.empty(
+                (batch_size, 3, *self.input_shape),
+                dtype=numpy.float32
             )
-        )
-        preprocessed_img = ImageUtils.reshape_img_dims(
-            image_array=preprocessed_img
-        )
-        preprocessed_img = ImageUtils.normalize_image(
-            image_array=preprocessed_img
-        )
-        return preprocessed_img, scale_ratio, diff_pads
+            self.input_buffers[batch_size] = input_buffer
+            self.input_ort_values[batch_size] = (
+                onnxruntime.OrtValue.ortvalue_from_numpy(input_buffer)
+            )
+
+        if self.bound_batch_size != batch_size:
+            self.io_binding.bind_ortvalue_input(
+                self.input_names[0],
+                self.input_ort_values[batch_size]
+            )
+            self.bound_batch_size = batch_size
+
+        return self.input_buffers[batch_size]
+
+    def get_resize_buffer(self, image_shape) -> numpy.ndarray:
+        """
+        Keep an uint8 buffer with the size of the resized image for each
+        incoming frame shape, so that the next frames with the same shape are
+        resized without allocations.
+        """
+        image_shape = tuple(image_shape[:2])
+        if image_shape not in self.resize_buffers:
+            _, resized_shape, *_ = ImageUtils.compute_letterbox_geometry(
+                image_shape=image_shape,
+                output_shape=self.input_shape
+            )
+            self.resize_buffers[image_shape] = numpy.empty(
+                (*resized_shape, 3),
+                dtype=numpy.uint8
+            )
+        return self.resize_buffers[image_shape]
 
     def get_session_names_from(self, from_where: str):
         if from_where == 'outputs':
@@ -66,27 +158,164 @@ class ONNXModel:
 
         return names
 
+    def get_session_input_shape(self) -> Tuple[int, int]:
+        """
+        Return the (height, width) declared by the model input. Models
+        exported with dynamic spatial dimensions fall back to the default
+        input shape.
+        """
+        declared_shape = self.session.get_inputs()[0].shape
+        input_shape = tuple(declared_shape[2:4])
+        if len(input_shape) != 2 or not all(
+            isinstance(dim, int) and dim > 0 for dim in input_shape
+        ):
+            logger.info(
+                f'Model input shape {declared_shape} is not static, using '
+                f'{self.DEFAULT_INPUT_SHAPE}'
+            )
+            input_shape = self.DEFAULT_INPUT_SHAPE
+
+        return input_shape
+
+    def get_session_input_batch_size(self) -> Optional[int]:
+        """
+        Return the batch size declared by the model input, or None if the
+        model was exported with a dynamic batch dimension.
+        """
+        batch_dim = self.session.get_inputs()[0].shape[0]
+        if isinstance(batch_dim, int) and batch_dim > 0:
+            return batch_dim
+        return None
+
+    def bind_session_outputs(self) -> List[Optional[numpy.ndarray]]:
+        """
+        Bind every session output. Outputs with a static shape get a
+        preallocated buffer that is reused by every inference, outputs with
+        dynamic dimensions (e.g. the number of NMS detections) are allocated
+        by onnxruntime on CPU.
+        """
+        output_buffers = []
+        for output in self.session.get_outputs():
+            is_static = all(
+                isinstance(dim, int) and dim > 0 for dim in output.shape
+            )
+            if is_static:
+                output_buffer = numpy.empty(
+                    output.shape,
+                    dtype=self.ONNX_NUMPY_TYPES.get(output.type, numpy.float32)
+                )
+                self.io_binding.bind_ortvalue_output(
+                    output.name,
+                    onnxruntime.OrtValue.ortvalue_from_numpy(output_buffer)
+                )
+            else:
+                output_buffer = None
+                self.io_binding.bind_output(output.name, 'cpu')
+            output_buffers.append(output_buffer)
+
+        return output_buffers
+
+    def get_first_output(self) -> numpy.ndarray:
+        output_buffer = self.output_buffers[0]
+        if output_buffer is None:
+            output_buffer = self.io_binding.get_outputs()[0].numpy()
+        return output_buffer
+
     def inference(self, raw_image):
         """
         Use the ONNX model session to perform inference on a raw image. This
         method preprocess the raw image and passes it to the model. The output
         is a numpy array of shape (N x [0, x1, y1, x2, y2, score, class])
+
+        The preprocessed image is written in the bound input buffer, so the
+        session runs through the IOBinding without any extra allocation.
+        Static outputs are returned in their reused buffer, which is
+        overwritten by the next inference.
         """
-        image, *resize_original = self.preprocess_input(raw_image=raw_image)
+        with self.stage_timer.stage('preprocess'):
+            _, *resize_original = self.preprocess_input(raw_image=raw_image)
         self.scale_ratio = resize_original[0]
         self.diff_padds = resize_original[1]
 
-        session_inputs_names = self.get_session_names_from('inputs')
-        session_outputs_names = self.get_session_names_from('outputs')
+        with self.stage_timer.stage('inference'):
+            self.session.run_with_iobinding(self.io_binding)
+            inference_outputs = self.get_first_output()
 
-        session_input = {session_inputs_names[0]: image}
+        return inference_outputs
 
-        inference_outputs = self.session.run(
-            output_names=session_outputs_names,
-            input_feed=session_input
-        )[0]
+    def inference_batch(
+        self,
+        raw_images: List[numpy.ndarray]
+    ) -> Tuple[numpy.ndarray, List[float], List[Tuple[float, float]]]:
+        """
+        Perform inference on several raw images stacked as one NCHW tensor.
+        Returns the outputs of all the images with the index of the image in
+        column 0, as (N x [i, x1, y1, x2, y2, class, score]), together with
+        the scale ratio and the difference padding of each image.
 
-        return inference_outputs
+        Dynamic batch models run all the images in one session call. Models
+        exported with a static batch size run the images in chunks of that
+        size, the last chunk is filled by repeating its last image and the
+        predictions of the repeated images are dropped.
+        """
+        n_images = len(raw_images)
+        chunk_size = self.input_batch_size or n_images
+
+        scale_ratios = []
+        diff_padds = []
+        chunks_outputs = []
+        for chunk_start in range(0, n_images, chunk_size):
+            chunk_images = raw_images[chunk_start:chunk_start + chunk_size]
+            n_chunk_images = len(chunk_images)
+
+            input_buffer = self.get_input_buffer(batch_size=chunk_size)
+            with self.stage_timer.stage('preprocess'):
+                for image_idx, raw_image in enumerate(chunk_images):
+                    _, scale_ratio, diff_pads = self.preprocess_input(
+                        raw_image=raw_image,
+                        input_buffer=input_buffer[image_idx]
+                    )
+                    scale_ratios.append(scale_ratio)
+                    diff_padds.append(diff_pads)
+                input_buffer[n_chunk_images:] = (
+                    input_buffer[n_chunk_images - 1]
+                )
+
+            with self.stage_timer.stage('inference'):
+                self.session.run_with_iobinding(self.io_binding)
+                chunk_outputs = self.get_first_output()
+
+            chunk_outputs = chunk_outputs[chunk_outputs[:, 0] < n_chunk_images]
+            chunk_outputs = chunk_outputs.copy()
+            chunk_outputs[:, 0] += chunk_start
+            chunks_outputs.append(chunk_outputs)
+
+        inference_outputs = numpy.concatenate(chunks_outputs, axis=0)
+
+        return inference_outputs, scale_ratios, diff_padds
+
+    @staticmethod
+    def split_predictions_by_batch_index(
+        predictions: numpy.ndarray,
+        n_images: int
+    ) -> List[numpy.ndarray]:
+        """
+        Split the predictions of a batch into one array per image, using the
+        batch index in column 0. Images without predictions get an empty
+        array.
+        """
+        batch_indxs = predictions[:, 0].astype(numpy.int64)
+        sorted_indxs = numpy.argsort(batch_indxs, kind='stable')
+        split_points = numpy.searchsorted(
+            batch_indxs[sorted_indxs],
+            numpy.arange(1, n_images)
+        )
+        images_predictions = numpy.split(
+            predictions[sorted_indxs],
+            split_points
+        )
+
+        return images_predictions
 
     @staticmethod
     def predictions_from_onnx_to_standard(
@@ -0,0 +1,317 @@
+import onnxruntime
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import json
+import logging
+import os
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+# create handler
+c_handler = logging.StreamHandler()
+# create formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+# add formatter to ch
+c_handler.setFormatter(formatter)
+# Add handler to logger
+logger.addHandler(c_handler)
+
+
+class SessionConfig:
+    """
+    Settings used to build the onnxruntime SessionOptions of a model.
+
+    The settings are resolved in order: a named preset, then a JSON config
+    file and last the explicit overrides (e.g. CLI options). Any setting left
+    as None keeps the onnxruntime default.
+    """
+
+    CPU_COUNT = os.cpu_count() or 1
+
+    GRAPH_OPTIMIZATION_LEVELS = {
+        'disable': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    EXECUTION_MODES = {
+        'sequential': onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+        'parallel': onnxruntime.ExecutionMode.ORT_PARALLEL,
+    }
+
+    DEFAULT_SETTINGS = {
+        'providers': ['CPUExecutionProvider'],
+        'intra_op_num_threads': None,
+        'inter_op_num_threads': None,
+        'graph_optimization_level': None,
+        'execution_mode': None,
+        'enable_cpu_mem_arena': None,
+        'enable_mem_pattern': None,
+        'allow_spinning': None,
+        'optimized_model_path': None,
+    }
+
+    PRESETS = {
+        # Keep the onnxruntime defaults
+        'default': {},
+        # One stream: use all the cores but one for the model, leaving a core
+        # for decoding, tracking and assignment. Spinning threads lower the
+        # latency of every session call.
+        'low-latency': {
+            'intra_op_num_threads': max(1, CPU_COUNT - 1),
+            'inter_op_num_threads': 1,
+            'graph_optimization_level': 'all',
+            'execution_mode': 'sequential',
+            'enable_cpu_mem_arena': True,
+            'enable_mem_pattern': True,
+            'allow_spinning': True,
+        },
+        # Several streams or pipelined stages: half of the cores for the
+        # model and no spinning, so idle model threads do not steal CPU from
+        # the Python stages running at the same time.
+        'throughput': {
+            'intra_op_num_threads': max(1, CPU_COUNT // 2),
+            'inter_op_num_threads': 1,
+            'graph_optimization_level': 'all',
+            'execution_mode': 'sequential',
+            'enable_cpu_mem_arena': True,
+            'enable_mem_pattern': True,
+            'allow_spinning': False,
+        },
+        # Edge boxes where the model shares a few cores with everything else
+        'shared-cores': {
+            'intra_op_num_threads': 2,
+            'inter_op_num_threads': 1,
+            'graph_optimization_level': 'all',
+            'execution_mode': 'sequential',
+            'enable_cpu_mem_arena': False,
+            'enable_mem_pattern': True,
+            'allow_spinning': False,
+        },
+    }
+
+    def __init__(self, **settings) -> None:
+        unknown_settings = set(settings).difference(self.DEFAULT_SETTINGS)
+        if unknown_settings:
+            raise ValueError(
+                f'Unknown session settings: {sorted(unknown_settings)}'
+            )
+
+        self.settings = dict(self.DEFAULT_SETTINGS)
+        self.settings.update(settings)
+
+    @classmethod
+    def from_preset(cls, preset_name: str = 'default'):
+        if preset_name not in cls.PRESETS:
+            raise ValueError(
+                f'Unknown session preset {preset_name}, expecting one of '
+                f'{list(cls.PRESETS)}'
+            )
+        return cls(**cls.PRESETS[preset_name])
+
+    @classmethod
+    def from_options(
+        cls,
+        preset_name: Optional[str] = None,
+        config_path: Optional[str] = None,
+        **overrides
+    ):
+        """
+        Create the config from a preset, a JSON config file and explicit
+        overrides. The config file can also name a preset with the 'preset'
+        key, the preset_name argument has priority over it. Overrides equal to
+        None are ignored.
+        """
+        file_settings = {}
+        if config_path is not None:
+            file_settings = cls.load_config_file(config_path=config_path)
+
+        file_preset_name = file_settings.pop('preset', None)
+        preset_name = preset_name or file_preset_name or 'default'
+
+        settings = dict(cls.from_preset(preset_name).settings)
+        settings.update(file_settings)
+        settings.update(
+            {key: value for key, value in overrides.items()
+             if value is not None}
+        )
+
+        return cls(**settings)
+
+    @staticmethod
+    def load_config_file(config_path: str) -> Dict:
+        try:
+            with open(config_path, 'r') as f:
+                file_settings = json.load(f)
+        except Exception as e:
+            logger.error(f'Session config file {config_path} failed to load')
+            raise e
+        return file_settings
+
+    @property
+    def providers(self) -> List[str]:
+        return self.settings['providers']
+
+    def build_session_options(
+        self,
+        model_path: str
+    ) -> Tuple[str, onnxruntime.SessionOptions]:
+        """
+        Build the SessionOptions for the model in model_path. Returns the path
+        of the model the session should load together with its options.
+
+        If an optimized_model_path is configured and the saved graph is newer
+        than the original model and was optimized with the same settings
+        (see get_optimized_model_key), the saved graph is loaded with the
+        graph optimizations disabled, so the startup skips the optimization.
+        Otherwise the session saves the optimized graph in that path, call
+        save_optimized_model_key once the session is created.
+        """
+        session_options = onnxruntime.SessionOptions()
+        settings = self.settings
+
+        if settings['intra_op_num_threads'] is not None:
+            session_options.intra_op_num_threads = int(
+                settings['intra_op_num_threads']
+            )
+        if settings['inter_op_num_threads'] is not None:
+            session_options.inter_op_num_threads = int(
+                settings['inter_op_num_threads']
+            )
+        if settings['graph_optimization_level'] is not None:
+            session_options.graph_optimization_level = (
+                self.GRAPH_OPTIMIZATION_LEVELS[
+                    settings['graph_optimization_level']
+                ]
+            )
+        if settings['execution_mode'] is not None:
+            session_options.execution_mode = self.EXECUTION_MODES[
+                settings['execution_mode']
+            ]
+        if settings['enable_cpu_mem_arena'] is not None:
+            session_options.enable_cpu_mem_arena = bool(
+                settings['enable_cpu_mem_arena']
+            )
+        if settings['enable_mem_pattern'] is not None:
+            session_options.enable_mem_pattern = bool(
+                settings['enable_mem_pattern']
+            )
+        if settings['allow_spinning'] is not None:
+            allow_spinning = '1' if settings['allow_spinning'] else '0'
+            session_options.add_session_config_entry(
+                'session.intra_op.allow_spinning',
+                allow_spinning
+            )
+            session_options.add_session_config_entry(
+                'session.inter_op.allow_spinning',
+                allow_spinning
+            )
+
+        session_model_path = str(model_path)
+        optimized_model_path = settings['optimized_model_path']
+        if optimized_model_path is not None:
+            if self.is_optimized_model_current(
+                model_path=model_path,
+                optimized_model_path=optimized_model_path,
+                optimized_model_key=self.get_optimized_model_key(
+                    model_path=model_path
+                )
+            ):
+                logger.info(
+                    f'Loading the optimized model from {optimized_model_path}'
+                )
+                session_model_path = str(optimized_model_path)
+                session_options.graph_optimization_level = (
+                    self.GRAPH_OPTIMIZATION_LEVELS['disable']
+                )
+            else:
+                logger.info(
+                    f'Saving the optimized model to {optimized_model_path}'
+                )
+                # The graph is about to be replaced, a failed session must
+                # not leave the old key next to it
+                self.get_optimized_model_key_path(
+                    optimized_model_path=optimized_model_path
+                ).unlink(missing_ok=True)
+                session_options.optimized_model_filepath = str(
+                    optimized_model_path
+                )
+
+        return session_model_path, session_options
+
+    def get_optimized_model_key(self, model_path: str) -> Dict:
+        """
+        Settings that change the optimized graph: the source model, the
+        optimization level, the onnxruntime version and the providers.
+        """
+        return {
+            'model_path': str(Path(model_path).resolve()),
+            'graph_optimization_level': self.settings[
+                'graph_optimization_level'
+            ],
+            'onnxruntime_version': onnxruntime.__version__,
+            'providers': list(self.providers),
+        }
+
+    @staticmethod
+    def get_optimized_model_key_path(optimized_model_path: str) -> Path:
+        optimized_model_path = Path(optimized_model_path)
+        return optimized_model_path.with_name(
+            optimized_model_path.name + '.json'
+        )
+
+    def save_optimized_model_key(self, model_path: str):
+        """
+        Write the key of the optimized graph next to it, once the session
+        saved the graph.
+        """
+        optimized_model_path = self.settings['optimized_model_path']
+        if (
+            optimized_model_path is None or
+            not Path(optimized_model_path).is_file()
+        ):
+            return
+        key_path = self.get_optimized_model_key_path(
+            optimized_model_path=optimized_model_path
+        )
+        with open(key_path, 'w') as f:
+            json.dump(self.get_optimized_model_key(model_path=model_path), f)
+
+    @classmethod
+    def is_optimized_model_current(
+        cls,
+        model_path: str,
+        optimized_model_path: str,
+        optimized_model_key: Dict
+    ) -> bool:
+        optimized_model_path = Path(optimized_model_path)
+        if not optimized_model_path.is_file():
+            return False
+        if (
+            optimized_model_path.stat().st_mtime <
+            Path(model_path).stat().st_mtime
+        ):
+            return False
+
+        key_path = cls.get_optimized_model_key_path(
+            optimized_model_path=optimized_model_path
+        )
+        try:
+            with open(key_path, 'r') as f:
+                saved_key = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if saved_key != optimized_model_key:
+            logger.info(
+                f'The optimized model in {optimized_model_path} was saved '
+                'with other settings'
+            )
+            return False
+        return True
+
+    def __repr__(self) -> str:
+        return f'SessionConfig({self.settings})'
@@ -1,6 +1,6 @@
 import numpy
 
-from typing import Tuple
+from typing import Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,11 +25,39 @@ class DetectionUtils:
     def resize_preds_w_scale_and_padds(
         predictions: numpy.array,
         scale_ratio: float,
-        diff_padds: Tuple[int, int]
+        diff_padds: Tuple[int, int],
+        offset: Tuple[int, int] = (0, 0)
     ):
+        """
+        Map the boxes from the letterboxed model input back to the image.
+        offset (X, Y) is the top left corner of the crop that was passed to
+        the model, if any, so the boxes end up in full frame coordinates.
+        """
         bboxes_resized = (
             predictions[:, 0:4] - numpy.array(diff_padds * 2)
-        ) / scale_ratio
+        ) / scale_ratio + numpy.array(tuple(offset) * 2)
         predictions[:, 0:4] = bboxes_resized.round().astype(numpy.int32)
 
         return predictions
+
+    @staticmethod
+    def compute_crop_rect(
+        polygon: numpy.ndarray,
+        image_shape: Tuple[int, int],
+        margin: int = 0
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Bounding rectangle (X1, Y1, X2, Y2) of the polygon (N x [x, y]) with
+        margin pixels around it, clipped to the image. Returns None if the
+        rectangle is outside of the image.
+        """
+        height, width = image_shape[:2]
+        polygon = numpy.asarray(polygon, dtype=numpy.float32)
+        x1, y1 = numpy.floor(polygon.min(axis=0) - margin).astype(int)
+        x2, y2 = numpy.ceil(polygon.max(axis=0) + margin).astype(int)
+        x1, x2 = max(int(x1), 0), min(int(x2), width)
+        y1, y2 = max(int(y1), 0), min(int(y2), height)
+        if x2 <= x1 or y2 <= y1:
+            return None
+
+        return x1, y1, x2, y2
@@ -0,0 +1,128 @@
+import numpy
+
+from typing import List
+
+
+class BoxGeometry:
+    """
+    Batched geometry of bounding boxes in the standard format
+    [x1, y1, x2, y2]. The methods take (N, 4) arrays (or a single (4,) bbox
+    where noted) and return one value per bbox or one matrix per pair of
+    arrays, so a frame is processed with a few numpy operations instead of
+    one call per object or pair of objects.
+
+    Areas and IoU count the border pixels (+1 convention) by default, like
+    the scalar AssignUtils.compute_iou the project started with. With
+    pixels_border=0 they are the continuous areas (the norfair convention).
+    """
+
+    @staticmethod
+    def stack(bboxes: List[numpy.ndarray]) -> numpy.ndarray:
+        """
+        Stack a list of bboxes in a (N, 4) array, (0, 4) if the list is
+        empty.
+        """
+        if len(bboxes) == 0:
+            return numpy.empty((0, 4), dtype=numpy.float64)
+        return numpy.stack(bboxes)
+
+    @staticmethod
+    def areas(
+        bboxes: numpy.ndarray,
+        pixels_border: int = 1
+    ) -> numpy.ndarray:
+        """
+        Area of each bbox, counting the border pixels. Accepts (..., 4).
+        """
+        return (
+            (bboxes[..., 2] - bboxes[..., 0] + pixels_border) *
+            (bboxes[..., 3] - bboxes[..., 1] + pixels_border)
+        )
+
+    @staticmethod
+    def centers(bboxes: numpy.ndarray) -> numpy.ndarray:
+        """
+        Integer center of each bbox, truncated like int(). Accepts (..., 4)
+        and returns (..., 2) as int32.
+        """
+        centers = numpy.empty(bboxes.shape[:-1] + (2,), dtype=numpy.int32)
+        centers[..., 0] = (
+            (bboxes[..., 2] - bboxes[..., 0]) / 2 + bboxes[..., 0]
+        )
+        centers[..., 1] = (
+            (bboxes[..., 3] - bboxes[..., 1]) / 2 + bboxes[..., 1]
+        )
+        return centers
+
+    @staticmethod
+    def pairwise_iou(
+        bboxes1: numpy.ndarray,
+        bboxes2: numpy.ndarray,
+        pixels_border: int = 1
+    ) -> numpy.ndarray:
+        """
+        Returns a (N1, N2) matrix with the IoU of each bbox of bboxes1 with
+        each bbox of bboxes2.
+        """
+        bboxes1 = bboxes1[:, None, :]
+        bboxes2 = bboxes2[None, :, :]
+
+        inter_width = (
+            numpy.minimum(bboxes1[..., 2], bboxes2[..., 2]) -
+            numpy.maximum(bboxes1[..., 0], bboxes2[..., 0]) + pixels_border
+        )
+        inter_height = (
+            numpy.minimum(bboxes1[..., 3], bboxes2[..., 3]) -
+            numpy.maximum(bboxes1[..., 1], bboxes2[..., 1]) + pixels_border
+        )
+        inter_area = (
+            numpy.maximum(0, inter_width) * numpy.maximum(0, inter_height)
+        )
+
+        union_area = (
+            BoxGeometry.areas(bboxes1, pixels_border=pixels_border) +
+            BoxGeometry.areas(bboxes2, pixels_border=pixels_border) -
+            inter_area
+        )
+
+        return inter_area / union_area
+
+    @staticmethod
+    def containment(
+        bboxes1: numpy.ndarray,
+        bboxes2: numpy.ndarray,
+        alpha_x: float = 0,
+        alpha_y: float = 0
+    ) -> numpy.ndarray:
+        """
+        Returns a (N1, N2) boolean matrix, True where the bbox of bboxes1 is
+        inside the bbox of bboxes2 expanded by alpha_x and alpha_y on each
+        side.
+        """
+        bboxes1 = bboxes1[:, None, :]
+        bboxes2 = bboxes2[None, :, :]
+
+        return (
+            (bboxes1[..., 0] >= (bboxes2[..., 0] - alpha_x)) &
+            (bboxes1[..., 1] >= (bboxes2[..., 1] - alpha_y)) &
+            (bboxes1[..., 2] <= (bboxes2[..., 2] + alpha_x)) &
+            (bboxes1[..., 3] <= (bboxes2[..., 3] + alpha_y))
+        )
+
+    @staticmethod
+    def pairwise_distances(
+        points1: numpy.ndarray,
+        points2: numpy.ndarray
+    ) -> numpy.ndarray:
+        """
+        Returns a (N1, N2) matrix with the euclidean distance between each
+        point of points1 (N1, D) and each point of points2 (N2, D).
+        """
+        points1 = numpy.asarray(points1, dtype=numpy.float64)
+        points2 = numpy.asarray(points2, dtype=numpy.float64)
+
+        differences = points1[:, None, :] - points2[None, :, :]
+
+        return numpy.sqrt(
+            numpy.einsum('ijk,ijk->ij', differences, differences)
+        )
@@ -1,11 +1,14 @@
 import numpy
 
-from typing import List, Set, Tuple, Union
+from typing import List, Optional, Set, Tuple, Union, TYPE_CHECKING
 import logging
 
 from assigning.product import Product
 from location.utils import LocationUtils as location_utils
 
+if TYPE_CHECKING:
+    from tracking.frame_state import FrameState
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 # create handler
@@ -43,35 +46,61 @@ class Products:
     
     def assign_top_location_current_products(
             self,
-            current_products: List[Product]
+            current_products: List[Product],
+            products_centers: Optional[numpy.ndarray] = None
     ) -> List[numpy.ndarray]:
         if current_products:
-            for product in current_products:
-                try:
-                    # FIX -- INSTEAD OF DOING THIS ONCE FOR EACH PRODUCT
-                    # GATHER ALL THE DATA AND DO ONE OPENCV TRANSFORMATION
-
-                    # MISSING FILTERING ONLY POSITIVES COORDS FOR PRODUCTS
-                    product_top_location = (
-                        location_utils.transform_pnt_with_perspective(
-                            point=product.center_location,
-                            perspective_matrix=self.table_prsp_matrix
-                        )
+            if products_centers is None:
+                products_centers = numpy.stack(
+                    [product.center_location for product in current_products]
+                )
+            try:
+                # One perspective transformation for the centers of all the
+                # products
+                # MISSING FILTERING ONLY POSITIVES COORDS FOR PRODUCTS
+                products_top_location = (
+                    location_utils.transform_pnts_with_perspective(
+                        points_narray=products_centers,
+                        perspective_matrix=self.table_prsp_matrix
                     )
-                    product.top_view_location = product_top_location
-                    self.curr_product_top_loc.append(product_top_location)
-                except Exception as e:
-                    logger.error('Perspective Transformation Failed')
-                    raise e
+                )
+            except Exception as e:
+                logger.error('Perspective Transformation Failed')
+                raise e
+
+            for product, product_top_location in zip(
+                current_products,
+                products_top_location
+            ):
+                product.top_view_location = product_top_location
+                self.curr_product_top_loc.append(product_top_location)
         else:
             logger.info("No current products to assign")
 
     def get_products_top_location(self) -> List[numpy.ndarray]:
         return self.curr_product_top_loc
     
+    def compute_products_top_location_from_frame_state(
+            self,
+            frame_state: 'FrameState'
+    ) -> List[numpy.ndarray]:
+        """
+        Same as compute_products_top_location_narrays, transforming the
+        centers column of the frame state products.
+        """
+        products_group = frame_state.products
+        if products_group is None:
+            return self.compute_products_top_location_narrays(products=None)
+
+        return self.compute_products_top_location_narrays(
+            products=products_group.interactions,
+            products_centers=products_group.centers
+        )
+
     def compute_products_top_location_narrays(
             self,
-            products: List[Product]
+            products: List[Product],
+            products_centers: Optional[numpy.ndarray] = None
     ) -> List[numpy.ndarray]:
 
         self.prev_frame_products = self.current_products
@@ -79,7 +108,8 @@ class Products:
         self.update_current_products(products=products)
 
         self.assign_top_location_current_products(
-            current_products=self.current_products
+            current_products=self.current_products,
+            products_centers=products_centers
         )
 
         if self.current_products:
@@ -3,10 +3,23 @@ import numpy
 
 from pathlib import Path
 
+from location.utils import LocationUtils
+
 class TableLocation:
     
     TRANSFORMS_FOLDER = Path.cwd() / 'location' / 'transforms'
     LOCATION_RESOURCES_FOLDER = Path.cwd() / 'location' / 'resources'
+    # Corners of the table in the table top image, as X, Y (the perspective
+    # points of location/table_points.py)
+    TABLE_TOP_CORNERS = numpy.array(
+        [
+            [20, 10],
+            [380, 10],
+            [380, 190],
+            [20, 130],
+        ],
+        dtype=numpy.float32
+    )
     
     def __init__(self, prsp_matrix_path: str, table_top_image_path: str) -> None:
         self.perspective_matrix = self.load_perspective_matrix(
@@ -16,6 +29,16 @@ class TableLocation:
         table_top_image = cv2.imread(table_top_image_path)
         self.table_top_img_narray = table_top_image
     
+    def compute_table_polygon_in_frame(self) -> numpy.ndarray:
+        """
+        Corners of the table in the camera frame, from the table top corners
+        and the inverse of the perspective matrix.
+        """
+        return LocationUtils.transform_pnts_with_perspective(
+            points_narray=self.TABLE_TOP_CORNERS,
+            perspective_matrix=numpy.linalg.inv(self.perspective_matrix)
+        )
+
     @staticmethod
     def load_perspective_matrix(prsp_matrix_path: str):
         try:
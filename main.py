@@ -1,19 +1,24 @@
 import click
 
+import functools
 import logging
+import time
 
 from source.source import Source
 from source.read_video import VideoSource
 from source.read_image import ImageSource
+from source.shared_frames import SharedFrameReader
 from source.utils import ImageUtils
 
 from detection.detections import DetectionsModel
-from tracking.norfair_tracker import NorfairTracker
-from assigning.assign import AssignPersonHands, DetectionLabel
+from detection.session_config import SessionConfig
+from detection.motion_gate import MotionGate
 from location.table import TableLocation
-from location.products import Products
-from costumer.purchase import Purchase
-from costumer.store import Store
+from tracking.norfair_tracker import NorfairTracker
+from pipeline.post_inference import PostInferencePipeline
+from pipeline.staged import StagedPipeline
+from pipeline.detection_scheduler import AdaptiveDetectionScheduler
+from profiling.stage_timer import StageTimer
 
 from utils import Utils as main_utils
 
@@ -87,6 +92,159 @@ logger.addHandler(file_out_handler)
     default='nice_table.jpg',
     help="Name of the image upon which to project the perspective products"
 )
+@click.option(
+    '--session-preset',
+    default=None,
+    type=click.Choice(list(SessionConfig.PRESETS)),
+    help="Named onnxruntime session preset for the detection model"
+)
+@click.option(
+    '--session-config',
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON file with onnxruntime session settings (can name a preset)"
+)
+@click.option(
+    '--intra-op-threads',
+    default=None,
+    type=int,
+    help="Threads used by onnxruntime inside each operator"
+)
+@click.option(
+    '--inter-op-threads',
+    default=None,
+    type=int,
+    help="Threads used by onnxruntime to run operators in parallel"
+)
+@click.option(
+    '--optimized-model-path',
+    default=None,
+    type=click.Path(dir_okay=False),
+    help="Path where the optimized graph is saved and reloaded from"
+)
+@click.option(
+    '--track-min-score',
+    default=0.0,
+    type=click.FloatRange(min=0.0, max=1.0),
+    help="Detections with a lower score are not passed to the tracker"
+)
+@click.option(
+    '--per-class-tracking',
+    is_flag=True,
+    default=False,
+    help="Track persons, hands and products with separate trackers"
+)
+@click.option(
+    '--prefetch-depth',
+    default=0,
+    type=click.IntRange(min=0),
+    help="Frames decoded ahead in a background thread (0 disables it)"
+)
+@click.option(
+    '--adaptive-detection',
+    is_flag=True,
+    default=False,
+    help="Decide in each frame if the detection model runs, from the "
+         "tracks, the hands near products and the motion, instead of "
+         "--skip-frames (not in the pipeline mode)"
+)
+@click.option(
+    '--max-detection-period',
+    default=8,
+    type=click.IntRange(min=1),
+    help="Adaptive detection: frames without detections in a quiet scene"
+)
+@click.option(
+    '--detection-budget-ms',
+    default=0.0,
+    type=click.FloatRange(min=0.0),
+    help="Adaptive detection: mean detection time allowed per frame (0 "
+         "does not limit it)"
+)
+@click.option(
+    '--motion-gate',
+    is_flag=True,
+    default=False,
+    help="Reuse the previous predictions instead of running the detection "
+         "model when the frame did not change"
+)
+@click.option(
+    '--motion-gate-table-roi',
+    is_flag=True,
+    default=False,
+    help="Motion gate: only measure the motion around the table"
+)
+@click.option(
+    '--motion-gate-threshold',
+    default=0.005,
+    type=click.FloatRange(min=0.0, max=1.0),
+    help="Motion gate: fraction of changed pixels that counts as motion"
+)
+@click.option(
+    '--roi-crop',
+    is_flag=True,
+    default=False,
+    help="Run the detection model on a crop around the table instead of "
+         "the whole frame"
+)
+@click.option(
+    '--roi-margin',
+    default=200,
+    type=click.IntRange(min=0),
+    help="ROI crop: pixels around the table kept in the crop, enough for "
+         "the people in front of it"
+)
+@click.option(
+    '--decode-process',
+    is_flag=True,
+    default=False,
+    help="Decode the frames in a separate process, passed through shared "
+         "memory slots (--prefetch-depth slots, 4 by default)"
+)
+@click.option(
+    '--pipeline',
+    is_flag=True,
+    default=False,
+    help="Run decode, inference and post-inference in separate threads "
+         "connected by bounded queues"
+)
+@click.option(
+    '--pipeline-queue-size',
+    default=4,
+    type=click.IntRange(min=1),
+    help="Frames that can wait between two stages of the pipeline mode"
+)
+@click.option(
+    '--headless',
+    is_flag=True,
+    default=False,
+    help="Run without any window, drawing or video output"
+)
+@click.option(
+    '--render-every',
+    default=None,
+    type=click.IntRange(min=0),
+    help="Draw and write one of every N frames (default: every frame, or "
+         "none with --headless)"
+)
+@click.option(
+    '--profile',
+    is_flag=True,
+    default=False,
+    help="Time each pipeline stage and log latency percentiles and FPS"
+)
+@click.option(
+    '--profile-every',
+    default=300,
+    type=click.IntRange(min=0),
+    help="Frames between profiling summaries (0 only reports at exit)"
+)
+@click.option(
+    '--trace-file',
+    default=None,
+    type=click.Path(dir_okay=False),
+    help="Write the stage timings as a Chrome trace-event JSON file"
+)
 def main(
     skip_frames,
     source_name,
@@ -95,216 +253,345 @@ def main(
     stop_frame,
     initial_frame,
     perspective_matrix_name,
-    table_top_image
+    table_top_image,
+    session_preset,
+    session_config,
+    intra_op_threads,
+    inter_op_threads,
+    optimized_model_path,
+    track_min_score,
+    per_class_tracking,
+    prefetch_depth,
+    adaptive_detection,
+    max_detection_period,
+    detection_budget_ms,
+    motion_gate,
+    motion_gate_table_roi,
+    motion_gate_threshold,
+    roi_crop,
+    roi_margin,
+    decode_process,
+    pipeline,
+    pipeline_queue_size,
+    headless,
+    render_every,
+    profile,
+    profile_every,
+    trace_file
 ):
+    if render_every is None:
+        render_every = 0 if headless else 1
 
     main_source = Source(
         source_name=source_name,
         source_folder=source_folder
     )
 
-    detection_model = DetectionsModel(model_name=detection_model)
-    tracker = NorfairTracker()
-
-    assign_personhands = AssignPersonHands()
-
+    detection_session_config = SessionConfig.from_options(
+        preset_name=session_preset,
+        config_path=session_config,
+        intra_op_num_threads=intra_op_threads,
+        inter_op_num_threads=inter_op_threads,
+        optimized_model_path=optimized_model_path
+    )
+    logger.info(f'Detection model session: {detection_session_config}')
+    stage_timer = StageTimer(
+        enabled=profile,
+        report_every=profile_every,
+        trace_path=trace_file
+    )
     table = TableLocation.create_from_prsp_matrix_name(
         prsp_matrix_name=perspective_matrix_name,
         table_top_image_name=table_top_image
     )
-    products = Products(
-        table_prsp_matrix=table.perspective_matrix
-    )
-    purchase_costumers = Purchase()
 
-    store = Store(
-        products=products,
-        costumers=purchase_costumers
+    table_polygon = table.compute_table_polygon_in_frame()
+
+    detection_motion_gate = None
+    if motion_gate:
+        detection_motion_gate = MotionGate(
+            motion_threshold=motion_gate_threshold,
+            roi_polygon=table_polygon if motion_gate_table_roi else None
+        )
+    detection_model = DetectionsModel(
+        model_name=detection_model,
+        session_config=detection_session_config,
+        stage_timer=stage_timer,
+        motion_gate=detection_motion_gate,
+        roi_polygon=table_polygon if roi_crop else None,
+        roi_margin=roi_margin
+    )
+    # Tracking, assignment, products, costumers and store stages
+    post_inference = PostInferencePipeline(
+        table_prsp_matrix=table.perspective_matrix,
+        stage_timer=stage_timer,
+        tracker=NorfairTracker(
+            min_score=track_min_score,
+            per_class=per_class_tracking
+        )
     )
 
     if isinstance(main_source.source, VideoSource):
         video_source = main_source.source
         cap = video_source.get_ocv_video_capture()
 
-        cap_writer = video_source.create_ocv_video_output(
-            ocv_video_capture=cap
-        )
-
-        frame_count = 0
+        if render_every > 0:
+            cap_writer = video_source.create_ocv_video_output(
+                ocv_video_capture=cap
+            )
+        else:
+            cap_writer = None
 
-        while cap.isOpened():
-            success, image = cap.read()
+        # Seek to the initial frame instead of decoding the frames before it
+        frame_count = video_source.seek_to_frame(
+            ocv_video_capture=cap,
+            frame_number=initial_frame
+        )
 
-            if not success:
-                print("Ignoring empty camera frame.")
-                # If loading a video, use 'break' instead of 'continue'.
-                if video_source.source_path != 0:
-                    break
-                else:
-                    continue
-            
-            if initial_frame > 0 and frame_count < initial_frame:
-                frame_count += 1
-                continue
+        detection_scheduler = None
+        if adaptive_detection and pipeline:
+            logger.info(
+                'Adaptive detection needs the result of the previous frame, '
+                'the pipeline mode uses --skip-frames'
+            )
+        elif adaptive_detection:
+            detection_scheduler = AdaptiveDetectionScheduler(
+                max_period=max_detection_period,
+                budget_ms=detection_budget_ms
+            )
 
-            logger.info(f'Frame number: {frame_count}')
+        # Frames that are not detected nor rendered are only grabbed, the
+        # adaptive detection looks at every frame
+        frame_needs_image = functools.partial(
+            main_utils.is_image_frame,
+            initial_frame=initial_frame,
+            skip_frames=1 if detection_scheduler else skip_frames,
+            render_every=render_every
+        )
 
-            if skip_frames == 0 or frame_count % skip_frames == 0:
-                # Perform detection
-                predictions = detection_model.get_image_predictions(
-                    raw_image=image,
-                    resize=True
+        def log_frame_result(frame_result):
+            if frame_result.active_costumers:
+                logger.info(
+                    'Products gone between previous and current frame: '
+                    f'{frame_result.products_gone_codes}, '
+                    f'N#:{len(frame_result.products_gone_codes)}'
                 )
-
-                # Get tracked objects
-                norfair_tracked_obj = tracker.update_from_predictions(
-                    predictions=predictions,
-                    period=skip_frames
+                logger.info(
+                    'Products added between previous and current frame: '
+                    f'current frame: {frame_result.products_added_codes}, '
+                    f'N#:{len(frame_result.products_added_codes)}'
                 )
 
-            else:
-                # Get tracked objects without detections
-                norfair_tracked_obj = tracker.update_from_predictions(
-                    period=skip_frames
-                )
+                # Manage the products that are gone with the costumers
+                # - return summary
 
-            # Separate tracked objects by label
-            interaction_objs_by_label = (
-                tracker.separate_interactions_from_norfair_tracked_objs(
-                    norfair_tracked_objects=norfair_tracked_obj
-                )
-            )
+                # Manage the products that are added with the costumers
+                # - return summary
 
-            # Draw all the persons in the frame
-            persons_it_objs = interaction_objs_by_label.get(
-                DetectionLabel.PERSON,
-                None
-            )
-            image = main_utils.draw_interaction_bboxes_in_frame(
-                interaction_objs=persons_it_objs,
-                original_frame=image
-            )
+                # Return a compilation of all the transactions in this frame
 
-            # Assign hands to the persons objects
-            person_hand_assignments = (
-                assign_personhands.assign_from_norfair_tracked_obj(
-                    interaction_objects=interaction_objs_by_label
+        def render_frame_result(frame_result, image):
+            exit_key = None
+            with stage_timer.stage('render'):
+                # Draw all the persons in the frame
+                image = main_utils.draw_interaction_bboxes_in_frame(
+                    interaction_objs=frame_result.persons,
+                    original_frame=image
+                )
+                image_assignments = main_utils.draw_assignment_frame(
+                    assignments=frame_result.person_hand_assignments,
+                    original_frame=image
+                )
+                # Draw all the products in the frame
+                image_products = main_utils.draw_interaction_bboxes_in_frame(
+                    interaction_objs=frame_result.products,
+                    original_frame=image_assignments,
+                    bbox_color=(125, 255, 50)
                 )
-            )
-
-            image_assignments = main_utils.draw_assignment_frame(
-                assignments=person_hand_assignments,
-                original_frame=image
-            )
 
-            # Draw all the products in the frame
-            products_it_objs = interaction_objs_by_label.get(
-                DetectionLabel.PRODUCTS,
-                None
-            )
-            # if products_it_objs:
-            #     logger.info(f'Products in the frame: {len(products_it_objs)}')
+                cap_writer.write(image_products)
 
-            image_products = main_utils.draw_interaction_bboxes_in_frame(
-                interaction_objs=products_it_objs,
-                original_frame=image_assignments,
-                bbox_color=(125, 255, 50)
+                if not headless:
+                    # Draw the products top location in the table top image
+                    products_top_table_img = (
+                        main_utils.draw_product_top_narray_xy_pnts_over_image(
+                            top_narrays=frame_result.products_top_location,
+                            top_img=table.table_top_img_narray,
+                            products=frame_result.products
+                        )
+                    )
+                    ImageUtils.show_image_waitkey(
+                        window_name='Table top',
+                        image_array=products_top_table_img,
+                        resize_value=None
+                    )
+                    # Show the images, prepare the exit key flag
+                    exit_key = ImageUtils.show_image_waitkey(
+                        window_name='Detection and Hands',
+                        image_array=image_products,
+                        waitkey=stop_frame
+                    )
+            return exit_key
+
+        if pipeline:
+            # The decode stage reads ahead, it replaces the prefetch reader
+            staged_pipeline = StagedPipeline(
+                video_source=video_source,
+                ocv_video_capture=cap,
+                detection_model=detection_model,
+                post_inference=post_inference,
+                is_detection_frame=lambda frame_number: (
+                    main_utils.is_detection_frame(
+                        frame_number=frame_number,
+                        skip_frames=skip_frames
+                    )
+                ),
+                is_render_frame=lambda frame_number: (
+                    main_utils.is_render_frame(
+                        frame_number=frame_number,
+                        render_every=render_every
+                    )
+                ),
+                start_frame=frame_count,
+                period=skip_frames,
+                queue_size=pipeline_queue_size,
+                stage_timer=stage_timer
             )
-
-            # Update the products in the products instance and compute the
-            # top location of their centers (table top perspective)
-            products_top_location_narray = (
-                products.compute_products_top_location_narrays(
-                    products=products_it_objs
+            for stage_item in staged_pipeline.iter_frames():
+                logger.info(f'Frame number: {stage_item.frame_number}')
+                log_frame_result(frame_result=stage_item.frame_result)
+
+                if stage_item.is_render_frame:
+                    exit_key = render_frame_result(
+                        frame_result=stage_item.frame_result,
+                        image=stage_item.image
+                    )
+                    if exit_key:
+                        break
+            staged_pipeline.report()
+
+        else:
+            if decode_process:
+                # Decode the next frames in another process, into shared
+                # memory that the model reads without copies
+                cap = SharedFrameReader(
+                    video_source=video_source,
+                    ocv_video_capture=cap,
+                    n_slots=prefetch_depth or 4,
+                    start_frame=frame_count,
+                    retrieve_filter=frame_needs_image
                 )
-            )
-
-            # Inspect the current and previous products
-            # logger.info(f'Current Products: {products.current_products}')
-            # logger.info(f'Previous Products: {products.prev_frame_products}')
-
-            # Draw the products top location in the table top image
-            products_top_table_img = (
-                main_utils.draw_product_top_narray_xy_pnts_over_image(
-                    top_narrays=products_top_location_narray,
-                    top_img=table.table_top_img_narray,
-                    products=products_it_objs
+            elif prefetch_depth > 0:
+                # Decode the next frames while the current one is processed
+                cap = video_source.get_prefetch_reader(
+                    ocv_video_capture=cap,
+                    depth=prefetch_depth,
+                    start_frame=frame_count,
+                    retrieve_filter=frame_needs_image
                 )
-            )
-            
-            # Show the images, prepare the exit key flag
-            exit_key = ImageUtils.show_image_waitkey(
-                window_name='Table top',
-                image_array=products_top_table_img,
-                resize_value=None
-            )
 
-            # Managing costumers (creating and updating from assignments)
-            # -- not handling on hold costumer yet
-            purchase_costumers.manage_costumers(
-                person_hand_assignments=person_hand_assignments
-            )
+            while cap.isOpened():
+                stage_timer.start_frame(frame_number=frame_count)
+                with stage_timer.stage('decode'):
+                    success, image = video_source.read_frame(
+                        ocv_video_capture=cap,
+                        retrieve=frame_needs_image(frame_count)
+                    )
 
-            # Get active costumers from the management of assignments
-            active_costumers = purchase_costumers.get_active_costumers()
-            # logger.info(f'Active costumers list: {active_costumers}')
+                if (prefetch_depth > 0 or decode_process) and success:
+                    # Live cameras can drop frames, follow the reader numbering
+                    frame_count = cap.last_frame_number
+
+                if not success:
+                    print("Ignoring empty camera frame.")
+                    # If loading a video, use 'break' instead of 'continue'.
+                    if video_source.source_path != 0:
+                        break
+                    else:
+                        continue
+            
+                if initial_frame > 0 and frame_count < initial_frame:
+                    frame_count += 1
+                    continue
 
-            if active_costumers:
-                # If there are active costumers, start assigning products
+                logger.info(f'Frame number: {frame_count}')
 
-                # Determine the closest one
-                hands_products_distances, costumer_products_close = (
-                    store.determine_close_hands_products(
-                        products_location_top=products_top_location_narray
+                if detection_scheduler is not None:
+                    detection_decision = detection_scheduler.decide(
+                        image=image,
+                        tracker=post_inference.tracker
                     )
+                    run_detection = detection_decision.run_detection
+                    period = detection_decision.period
+                else:
+                    run_detection = main_utils.is_detection_frame(
+                        frame_number=frame_count,
+                        skip_frames=skip_frames
+                    )
+                    period = skip_frames
+
+                if run_detection:
+                    # Perform detection
+                    detection_start = time.perf_counter()
+                    predictions = detection_model.get_image_predictions(
+                        raw_image=image,
+                        resize=True
+                    )
+                    if detection_scheduler is not None:
+                        detection_scheduler.record_detection(
+                            elapsed_s=time.perf_counter() - detection_start
+                        )
+                else:
+                    # The tracker estimates the objects without detections
+                    predictions = None
+
+                frame_result = post_inference.process_frame(
+                    frame_number=frame_count,
+                    predictions=predictions,
+                    period=period
                 )
-                # logger.info(
-                #     f'Hands Products Distances: {hands_products_distances}'
-                # )
-                # logger.info(
-                #     f'Costumer Products Close: {costumer_products_close}'
-                # )
-
-                # Get the difference between previous and current products
-                # In quantity, and sets with names and ids
-                diff_products_added_codes, diff_products_gone_codes = (
-                    products.get_products_codes_difference_prev_curr()
-                )
-                logger.info(
-                    'Products gone between previous and current frame: '
-                    f'{diff_products_gone_codes}, '
-                    f'N#:{len(diff_products_gone_codes)}'
-                )
-                logger.info(
-                    'Products added between previous and current frame: '
-                    f'current frame: {diff_products_added_codes}, '
-                    f'N#:{len(diff_products_added_codes)}'
-                )
+                if detection_scheduler is not None:
+                    detection_scheduler.update_frame_result(
+                        frame_result=frame_result
+                    )
 
-                # Manage the products that are gone with the costumers
-                # - return summary
+                log_frame_result(frame_result=frame_result)
 
-                # Manage the products that are added with the costumers
-                # - return summary
+                exit_key = None
+                if main_utils.is_render_frame(
+                    frame_number=frame_count,
+                    render_every=render_every
+                ):
+                    exit_key = render_frame_result(
+                        frame_result=frame_result,
+                        image=image
+                    )
 
-                # Return a compilation of all the transactions in this frame
+                stage_timer.end_frame()
+
+                frame_count += 1
+                if exit_key:
+                    break
 
-            cap_writer.write(image_products)
+            if detection_scheduler is not None:
+                logger.info(
+                    'Adaptive detection: '
+                    f'{detection_scheduler.get_stats()}'
+                )
 
-            exit_key = ImageUtils.show_image_waitkey(
-                window_name='Detection and Hands',
-                image_array=image_products,
-                waitkey=stop_frame
+        if detection_motion_gate is not None:
+            logger.info(
+                f'Motion gate: {detection_motion_gate.get_stats()}'
             )
-
-            frame_count += 1
-            if exit_key:
-                break
         
-        cap_writer.release()
-        ImageUtils.destroy_ocv_all_windows()
+        stage_timer.close()
+        cap.release()
+        if cap_writer is not None:
+            cap_writer.release()
+        if not headless:
+            ImageUtils.destroy_ocv_all_windows()
     
-    elif isinstance(main_source.source, ImageSource):
+    elif isinstance(main_source.source, ImageSource) and not headless:
         # Just show one image result
 
         ImageUtils.show_image_waitkey(
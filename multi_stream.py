@@ -0,0 +1,195 @@
+import click
+
+import functools
+import json
+import logging
+
+from detection.detections import DetectionsModel
+from detection.session_config import SessionConfig
+from tracking.norfair_tracker import NorfairTracker
+from pipeline.multi_stream import MultiStreamRunner, StreamConfig
+from profiling.stage_timer import StageTimer
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+# create handler
+c_handler = logging.StreamHandler()
+# create formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+# add formatter to logger handler
+c_handler.setFormatter(formatter)
+# Add handler to logger
+logger.addHandler(c_handler)
+
+
+@click.command()
+@click.option(
+    '--stream',
+    '-s',
+    'streams',
+    multiple=True,
+    required=True,
+    help="Stream as SOURCE_NAME[,PERSPECTIVE_MATRIX_NAME[,TABLE_TOP_IMAGE]], "
+         "repeat it for each camera"
+)
+@click.option(
+    '--source-folder',
+    default=None,
+    type=click.Path(),
+    help='Path of the folder where the sources are stored'
+)
+@click.option(
+    '--skip-frames',
+    '-sf',
+    default=2,
+    help='Number of frame to skip detections'
+)
+@click.option(
+    '--detection-model',
+    '-dmodel',
+    default='best_tiny_elvis_peoplehands_032023.onnx',
+    type=str,
+    help='Name the folder where the detection model is stored'
+)
+@click.option(
+    '--session-preset',
+    default=None,
+    type=click.Choice(list(SessionConfig.PRESETS)),
+    help="Named onnxruntime session preset for the detection model"
+)
+@click.option(
+    '--session-config',
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON file with onnxruntime session settings (can name a preset)"
+)
+@click.option(
+    '--intra-op-threads',
+    default=None,
+    type=int,
+    help="Threads used by onnxruntime inside each operator"
+)
+@click.option(
+    '--inter-op-threads',
+    default=None,
+    type=int,
+    help="Threads used by onnxruntime to run operators in parallel"
+)
+@click.option(
+    '--max-batch-size',
+    default=None,
+    type=click.IntRange(min=1),
+    help="Frames of every stream batched in one inference (default: the "
+         "number of streams)"
+)
+@click.option(
+    '--max-batch-wait-ms',
+    default=5.0,
+    type=click.FloatRange(min=0.0),
+    help="Time the inference worker waits for a batch to fill"
+)
+@click.option(
+    '--max-in-flight',
+    default=2,
+    type=click.IntRange(min=1),
+    help="Frames each stream reads ahead of the frame it processes"
+)
+@click.option(
+    '--track-min-score',
+    default=0.0,
+    type=click.FloatRange(min=0.0, max=1.0),
+    help="Detections with a lower score are not passed to the tracker"
+)
+@click.option(
+    '--per-class-tracking',
+    is_flag=True,
+    default=False,
+    help="Track persons, hands and products with separate trackers"
+)
+@click.option(
+    '--render-every',
+    default=0,
+    type=click.IntRange(min=0),
+    help="Write one of every N annotated frames to output_<stream>.avi "
+         "(0 turns it off)"
+)
+@click.option(
+    '--report-every',
+    default=10.0,
+    type=click.FloatRange(min=0.0),
+    help="Seconds between the streams FPS and queue depth reports (0 only "
+         "reports at exit)"
+)
+@click.option(
+    '--stats-output',
+    default=None,
+    type=click.Path(dir_okay=False),
+    help="Write the final streams and inference stats as a JSON file"
+)
+def main(
+    streams,
+    source_folder,
+    skip_frames,
+    detection_model,
+    session_preset,
+    session_config,
+    intra_op_threads,
+    inter_op_threads,
+    max_batch_size,
+    max_batch_wait_ms,
+    max_in_flight,
+    track_min_score,
+    per_class_tracking,
+    render_every,
+    report_every,
+    stats_output
+):
+    streams_configs = [
+        StreamConfig.create_from_option(
+            option_value=stream,
+            stream_idx=stream_idx,
+            source_folder=source_folder
+        )
+        for stream_idx, stream in enumerate(streams)
+    ]
+
+    detection_session_config = SessionConfig.from_options(
+        preset_name=session_preset,
+        config_path=session_config,
+        intra_op_num_threads=intra_op_threads,
+        inter_op_num_threads=inter_op_threads
+    )
+    logger.info(f'Detection model session: {detection_session_config}')
+    # One session for every stream
+    detection_model = DetectionsModel(
+        model_name=detection_model,
+        session_config=detection_session_config,
+        stage_timer=StageTimer()
+    )
+
+    runner = MultiStreamRunner(
+        streams_configs=streams_configs,
+        detection_model=detection_model,
+        skip_frames=skip_frames,
+        max_batch_size=max_batch_size,
+        max_batch_wait_s=max_batch_wait_ms / 1000,
+        max_in_flight=max_in_flight,
+        render_every=render_every,
+        tracker_factory=functools.partial(
+            NorfairTracker,
+            min_score=track_min_score,
+            per_class=per_class_tracking
+        )
+    )
+    stats = runner.run(report_every_s=report_every)
+
+    if stats_output is not None:
+        with open(stats_output, 'w') as f:
+            json.dump(stats, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+import cv2
+import numpy
+
+from typing import Dict, Optional
+import collections
+import logging
+
+from tracking.norfair_tracker import NorfairTracker
+from costumer.store import Store
+from pipeline.post_inference import FrameResult
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+# create handler
+c_handler = logging.StreamHandler()
+# create formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+# add formatter to ch
+c_handler.setFormatter(formatter)
+# Add handler to logger
+logger.addHandler(c_handler)
+
+
+class DetectionDecision:
+    """
+    Whether the detection model runs in a frame, why, and the period to
+    pass to the tracker (frames since the previous detection).
+    """
+
+    __slots__ = ('run_detection', 'reason', 'period')
+
+    def __init__(self, run_detection: bool, reason: str, period: int) -> None:
+        self.run_detection = run_detection
+        self.reason = reason
+        self.period = period
+
+    def __repr__(self) -> str:
+        return (
+            f'DetectionDecision(run_detection={self.run_detection}, '
+            f'reason={self.reason}, period={self.period})'
+        )
+
+
+class AdaptiveDetectionScheduler:
+    """
+    Decides in each frame if the detection model runs, instead of the fixed
+    skip frames period. The scene needs a detection when (in this order):
+
+    - grab: a hand of a costumer is near a product in the table top (the
+    hands to products distances of the previous frame).
+    - expiring / initializing: the tracker drops tracks that are not hit
+    within a few frames, and confirms new ones only with detections.
+    - uncertainty: the position of a track may have drifted too far from
+    its estimate.
+    - motion: the frame differs from the previous one (mean absolute
+    difference of small grayscale copies).
+
+    Otherwise the tracker estimates the objects (idle), with a detection at
+    least every max_period frames (keepalive) and at most one every
+    min_period frames.
+
+    budget_ms limits the mean detection time per frame: every frame adds
+    budget_ms to a bucket of at most budget_burst_frames frames, a
+    detection runs if the bucket holds its expected time and takes its
+    measured time. A quiet scene fills the bucket, so a grab can use every
+    frame for a while. Keepalive detections do not wait for the budget.
+    budget_ms 0 does not limit the detections.
+    """
+
+    GRAB = 'grab'
+    EXPIRING = 'expiring'
+    INITIALIZING = 'initializing'
+    UNCERTAINTY = 'uncertainty'
+    MOTION = 'motion'
+    KEEPALIVE = 'keepalive'
+    FIRST = 'first'
+    IDLE = 'idle'
+    MIN_PERIOD = 'min_period'
+    BUDGET = 'budget'
+
+    def __init__(
+            self,
+            min_period: int = 1,
+            max_period: int = 8,
+            expiry_margin: int = 2,
+            max_uncertainty_px: float = 8.0,
+            near_product_distance: float = 2 * Store.CLOSE_DISTANCE_THRESHOLD,
+            motion_threshold: float = 0.02,
+            motion_width: int = 80,
+            budget_ms: float = 0.0,
+            budget_burst_frames: int = 30
+    ) -> None:
+        if not 1 <= min_period <= max_period:
+            raise ValueError(
+                f'Expecting 1 <= min period <= max period, got {min_period} '
+                f'and {max_period}'
+            )
+        self.min_period = min_period
+        self.max_period = max_period
+        self.expiry_margin = expiry_margin
+        self.max_uncertainty_px = max_uncertainty_px
+        self.near_product_distance = near_product_distance
+        self.motion_threshold = motion_threshold
+        self.motion_width = motion_width
+        self.budget_ms = budget_ms
+        self.budget_capacity_ms = budget_ms * budget_burst_frames
+
+        self.frames_since_detection = None
+        self.prev_motion_image = None
+        self.hands_near_products = False
+        self.budget_available_ms = self.budget_capacity_ms
+        # Mean detection time, updated with each measured detection
+        self.detection_ms = None
+
+        self.frames = 0
+        self.detections = 0
+        self.reasons = collections.Counter()
+
+    def compute_motion_score(self, image: Optional[numpy.ndarray]) -> float:
+        """
+        Mean absolute difference (0 to 1) between small grayscale copies of
+        the frame and the previous frame.
+        """
+        if image is None:
+            return 0.0
+        height, width = image.shape[:2]
+        motion_size = (
+            self.motion_width,
+            max(1, round(height * self.motion_width / width))
+        )
+        motion_image = cv2.cvtColor(
+            cv2.resize(image, motion_size, interpolation=cv2.INTER_AREA),
+            cv2.COLOR_BGR2GRAY
+        )
+        prev_motion_image = self.prev_motion_image
+        self.prev_motion_image = motion_image
+        if prev_motion_image is None:
+            return 1.0
+
+        return float(
+            cv2.absdiff(motion_image, prev_motion_image).mean() / 255
+        )
+
+    def get_scene_reason(
+        self,
+        tracker: NorfairTracker,
+        motion_score: float
+    ) -> Optional[str]:
+        if self.hands_near_products:
+            return self.GRAB
+
+        tracks_health = tracker.get_tracks_health(
+            frames_since_detection=self.frames_since_detection,
+            expiry_margin=self.expiry_margin
+        )
+        if tracks_health['expiring']:
+            return self.EXPIRING
+        if tracks_health['initializing']:
+            return self.INITIALIZING
+        if tracks_health['max_uncertainty_px'] > self.max_uncertainty_px:
+            return self.UNCERTAINTY
+        if motion_score > self.motion_threshold:
+            return self.MOTION
+        return None
+
+    def has_budget(self) -> bool:
+        if self.budget_ms <= 0 or self.detection_ms is None:
+            return True
+        return self.budget_available_ms >= self.detection_ms
+
+    def decide(
+        self,
+        image: Optional[numpy.ndarray],
+        tracker: NorfairTracker
+    ) -> DetectionDecision:
+        """
+        Decide for the next frame, with its image and the tracker before
+        its update.
+        """
+        self.frames += 1
+        if self.budget_ms > 0:
+            self.budget_available_ms = min(
+                self.budget_available_ms + self.budget_ms,
+                self.budget_capacity_ms
+            )
+        # The motion score follows every frame, even if it is not used
+        motion_score = self.compute_motion_score(image=image)
+
+        if self.frames_since_detection is None:
+            run_detection, reason = True, self.FIRST
+            period = 1
+        else:
+            self.frames_since_detection += 1
+            period = self.frames_since_detection
+            if period >= self.max_period:
+                run_detection, reason = True, self.KEEPALIVE
+            elif period < self.min_period:
+                run_detection, reason = False, self.MIN_PERIOD
+            else:
+                reason = self.get_scene_reason(
+                    tracker=tracker,
+                    motion_score=motion_score
+                )
+                if reason is None:
+                    run_detection, reason = False, self.IDLE
+                elif self.has_budget():
+                    run_detection = True
+                else:
+                    run_detection, reason = False, self.BUDGET
+
+        if run_detection:
+            self.frames_since_detection = 0
+            self.detections += 1
+        self.reasons[reason] += 1
+
+        return DetectionDecision(
+            run_detection=run_detection,
+            reason=reason,
+            period=period
+        )
+
+    def record_detection(self, elapsed_s: float):
+        """
+        Take the measured time of a detection from the budget.
+        """
+        elapsed_ms = elapsed_s * 1000
+        if self.detection_ms is None:
+            self.detection_ms = elapsed_ms
+        else:
+            self.detection_ms = 0.9 * self.detection_ms + 0.1 * elapsed_ms
+        if self.budget_ms > 0:
+            self.budget_available_ms -= elapsed_ms
+
+    def update_frame_result(self, frame_result: FrameResult):
+        """
+        Keep the scene state of the processed frame for the next decision.
+        """
+        hands_products_distances = frame_result.hands_products_distances
+        self.hands_near_products = bool(
+            hands_products_distances is not None and
+            numpy.size(hands_products_distances) > 0 and
+            numpy.min(hands_products_distances) < self.near_product_distance
+        )
+
+    def get_stats(self) -> Dict:
+        return {
+            'frames': self.frames,
+            'detections': self.detections,
+            'detection_rate': round(self.detections / max(self.frames, 1), 3),
+            'mean_detection_ms': round(self.detection_ms or 0.0, 3),
+            'reasons': dict(self.reasons.most_common()),
+        }
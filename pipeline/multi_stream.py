@@ -0,0 +1,624 @@
+import cv2
+import numpy
+
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import collections
+import logging
+import queue
+import threading
+import time
+
+from source.read_video import VideoSource
+from source.source import Source
+from detection.detections import DetectionsModel
+from location.table import TableLocation
+from tracking.norfair_tracker import NorfairTracker
+from pipeline.post_inference import FrameResult, PostInferencePipeline
+from profiling.stage_timer import StageTimer
+
+from utils import Utils as main_utils
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+# create handler
+c_handler = logging.StreamHandler()
+# create formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+# add formatter to ch
+c_handler.setFormatter(formatter)
+# Add handler to logger
+logger.addHandler(c_handler)
+
+
+class StreamConfig:
+    """
+    Source and table of one camera of the multi-stream runner.
+    """
+
+    DEFAULT_PERSPECTIVE_MATRIX_NAME = 'table_persp_mtx_v1'
+    DEFAULT_TABLE_TOP_IMAGE = 'nice_table.jpg'
+
+    def __init__(
+            self,
+            stream_name: str,
+            source_name: str,
+            source_folder: Optional[str] = None,
+            perspective_matrix_name: str = DEFAULT_PERSPECTIVE_MATRIX_NAME,
+            table_top_image: str = DEFAULT_TABLE_TOP_IMAGE
+    ) -> None:
+        self.stream_name = stream_name
+        self.source_name = source_name
+        self.source_folder = source_folder
+        self.perspective_matrix_name = perspective_matrix_name
+        self.table_top_image = table_top_image
+
+    @classmethod
+    def create_from_option(
+        cls,
+        option_value: str,
+        stream_idx: int,
+        source_folder: Optional[str] = None
+    ):
+        """
+        Parse a command line stream as
+        SOURCE_NAME[,PERSPECTIVE_MATRIX_NAME[,TABLE_TOP_IMAGE]]. The stream
+        is named after its index and its source, so the same source can be
+        given twice.
+        """
+        option_parts = [part.strip() for part in option_value.split(',')]
+        if not option_parts[0] or len(option_parts) > 3:
+            raise ValueError(
+                f'Stream {option_value} is not SOURCE_NAME'
+                '[,PERSPECTIVE_MATRIX_NAME[,TABLE_TOP_IMAGE]]'
+            )
+        source_name = option_parts[0]
+        perspective_matrix_name = (
+            option_parts[1] if len(option_parts) > 1 and option_parts[1]
+            else cls.DEFAULT_PERSPECTIVE_MATRIX_NAME
+        )
+        table_top_image = (
+            option_parts[2] if len(option_parts) > 2 and option_parts[2]
+            else cls.DEFAULT_TABLE_TOP_IMAGE
+        )
+
+        return cls(
+            stream_name=f'{stream_idx}-{Path(source_name).stem}',
+            source_name=source_name,
+            source_folder=source_folder,
+            perspective_matrix_name=perspective_matrix_name,
+            table_top_image=table_top_image
+        )
+
+
+class BatchInferenceWorker:
+    """
+    Owns the detection model and runs it in a background thread for every
+    stream. The frames submitted by the streams wait in one queue, the
+    worker takes up to max_batch_size of them (waiting at most
+    max_wait_s for the batch to fill once it has a frame) and runs them as
+    one batch through DetectionsModel.get_batch_predictions.
+
+    submit returns a Future with the standard predictions of the frame.
+    """
+
+    def __init__(
+            self,
+            detection_model: DetectionsModel,
+            max_batch_size: int = 4,
+            max_wait_s: float = 0.005
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError(
+                f'Batch size must be positive, got {max_batch_size}'
+            )
+        self.detection_model = detection_model
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_s
+
+        # Requests as (stream name, image, future), None stops the worker
+        self.requests = queue.Queue()
+        self.thread = None
+
+        self.lock = threading.Lock()
+        self.pending_by_stream = collections.Counter()
+        self.batches = 0
+        self.frames = 0
+        self.batch_sizes = collections.Counter()
+        self.inference_time = 0.0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.run_batches,
+                name='BatchInferenceWorker',
+                daemon=True
+            )
+            self.thread.start()
+
+    def submit(self, stream_name: str, image: numpy.ndarray) -> Future:
+        self.start()
+        future = Future()
+        with self.lock:
+            self.pending_by_stream[stream_name] += 1
+        self.requests.put((stream_name, image, future))
+        return future
+
+    def get_pending(self, stream_name: str) -> int:
+        """
+        Frames of the stream waiting for the model (queued or running).
+        """
+        with self.lock:
+            return self.pending_by_stream[stream_name]
+
+    def collect_batch(
+        self
+    ) -> Optional[List[Tuple[str, numpy.ndarray, Future]]]:
+        """
+        Wait for a first request, then for more requests until the batch is
+        full or max_wait_s has passed. Returns None when the worker is
+        stopped and every request before the stop is done.
+        """
+        request = self.requests.get()
+        if request is None:
+            return None
+        batch = [request]
+
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout > 0:
+                    request = self.requests.get(timeout=timeout)
+                else:
+                    request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # Stop after this batch
+                self.requests.put(None)
+                break
+            batch.append(request)
+
+        return batch
+
+    def run_batches(self):
+        while True:
+            batch = self.collect_batch()
+            if batch is None:
+                break
+
+            start = time.perf_counter()
+            frames_predictions = None
+            batch_exception = None
+            try:
+                frames_predictions = (
+                    self.detection_model.get_batch_predictions(
+                        frames=[image for _, image, _ in batch],
+                        resize=True
+                    )
+                )
+            except Exception as e:
+                logger.exception('Batch inference failed')
+                batch_exception = e
+            elapsed = time.perf_counter() - start
+
+            with self.lock:
+                self.batches += 1
+                self.frames += len(batch)
+                self.batch_sizes[len(batch)] += 1
+                self.inference_time += elapsed
+                for stream_name, _, _ in batch:
+                    self.pending_by_stream[stream_name] -= 1
+
+            for batch_idx, (_, _, future) in enumerate(batch):
+                if frames_predictions is None:
+                    future.set_exception(batch_exception)
+                else:
+                    future.set_result(frames_predictions[batch_idx])
+
+    def stop(self):
+        if self.thread is not None:
+            self.requests.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def get_stats(self) -> Dict[str, float]:
+        with self.lock:
+            batches = max(self.batches, 1)
+            return {
+                'batches': self.batches,
+                'frames': self.frames,
+                'mean_batch_size': round(self.frames / batches, 2),
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+                'mean_batch_ms': round(
+                    self.inference_time * 1000 / batches, 2
+                ),
+            }
+
+
+class StreamRunner:
+    """
+    Runs one stream in its own thread: reads the frames, sends the
+    detection frames to the shared BatchInferenceWorker and runs its own
+    PostInferencePipeline (tracker, assignment, products and store state)
+    on the predictions, in the order of the frames.
+
+    Up to max_in_flight frames are read ahead of the frame being processed,
+    so the stream keeps frames in the worker queue while it runs the
+    post-inference stages. The queue depth of the stream is the number of
+    those frames.
+    """
+
+    def __init__(
+            self,
+            stream_config: StreamConfig,
+            inference_worker: BatchInferenceWorker,
+            post_inference: PostInferencePipeline,
+            skip_frames: int = 2,
+            max_in_flight: int = 2,
+            render_every: int = 0,
+            on_frame_result: Optional[
+                Callable[[str, FrameResult], None]
+            ] = None
+    ) -> None:
+        self.stream_config = stream_config
+        self.stream_name = stream_config.stream_name
+        self.inference_worker = inference_worker
+        self.post_inference = post_inference
+        self.skip_frames = skip_frames
+        self.max_in_flight = max(max_in_flight, 1)
+        self.render_every = render_every
+        self.on_frame_result = on_frame_result or self.log_frame_result
+
+        self.video_source = None
+        self.thread = None
+        self.exception = None
+
+        self.lock = threading.Lock()
+        self.frames_read = 0
+        self.frames_processed = 0
+        self.frames_detected = 0
+        self.queue_depth = 0
+        self.queue_depth_sum = 0
+        self.max_queue_depth = 0
+        self.start_time = None
+        self.end_time = None
+
+    @classmethod
+    def create_from_config(
+        cls,
+        stream_config: StreamConfig,
+        inference_worker: BatchInferenceWorker,
+        tracker: Optional[NorfairTracker] = None,
+        stage_timer: Optional[StageTimer] = None,
+        **kwargs
+    ):
+        table = TableLocation.create_from_prsp_matrix_name(
+            prsp_matrix_name=stream_config.perspective_matrix_name,
+            table_top_image_name=stream_config.table_top_image
+        )
+        post_inference = PostInferencePipeline(
+            table_prsp_matrix=table.perspective_matrix,
+            stage_timer=stage_timer,
+            tracker=tracker
+        )
+        return cls(
+            stream_config=stream_config,
+            inference_worker=inference_worker,
+            post_inference=post_inference,
+            **kwargs
+        )
+
+    @staticmethod
+    def log_frame_result(stream_name: str, frame_result: FrameResult):
+        if frame_result.active_costumers:
+            logger.info(
+                f'[{stream_name}] Frame {frame_result.frame_number}: '
+                'Products gone between previous and current frame: '
+                f'{frame_result.products_gone_codes}, '
+                f'N#:{len(frame_result.products_gone_codes)}'
+            )
+            logger.info(
+                f'[{stream_name}] Frame {frame_result.frame_number}: '
+                'Products added between previous and current frame: '
+                f'current frame: {frame_result.products_added_codes}, '
+                f'N#:{len(frame_result.products_added_codes)}'
+            )
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.run,
+                name=f'StreamRunner-{self.stream_name}',
+                daemon=True
+            )
+            self.thread.start()
+
+    def join(self, timeout: Optional[float] = None):
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+
+    def is_alive(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def run(self):
+        try:
+            self.process_stream()
+        except Exception as e:
+            logger.exception(f'Stream {self.stream_name} failed')
+            self.exception = e
+        finally:
+            self.end_time = time.perf_counter()
+
+    def process_stream(self):
+        main_source = Source(
+            source_name=self.stream_config.source_name,
+            source_folder=self.stream_config.source_folder
+        )
+        if not isinstance(main_source.source, VideoSource):
+            raise ValueError(
+                f'Stream {self.stream_name} source '
+                f'{self.stream_config.source_name} is not a video'
+            )
+        self.video_source = main_source.source
+        cap = self.video_source.get_ocv_video_capture()
+
+        cap_writer = None
+        if self.render_every > 0:
+            cap_writer = self.video_source.create_ocv_video_output(
+                ocv_video_capture=cap,
+                output_prefix=f'output_{self.stream_name}'
+            )
+
+        # Frames read and not processed yet as
+        # (frame number, image or None, predictions future or None)
+        in_flight = collections.deque()
+        frame_count = 0
+        self.start_time = time.perf_counter()
+
+        try:
+            while cap.isOpened():
+                is_detection_frame = main_utils.is_detection_frame(
+                    frame_number=frame_count,
+                    skip_frames=self.skip_frames
+                )
+                is_render_frame = main_utils.is_render_frame(
+                    frame_number=frame_count,
+                    render_every=self.render_every
+                )
+                success, image = VideoSource.read_frame(
+                    ocv_video_capture=cap,
+                    retrieve=is_detection_frame or is_render_frame
+                )
+                if not success:
+                    # If loading a video, stop, a live camera keeps reading
+                    if self.video_source.source_path != 0:
+                        break
+                    continue
+
+                predictions_future = None
+                if is_detection_frame:
+                    predictions_future = self.inference_worker.submit(
+                        stream_name=self.stream_name,
+                        image=image
+                    )
+                in_flight.append((
+                    frame_count,
+                    image if is_render_frame else None,
+                    predictions_future
+                ))
+                self.update_queue_depth(
+                    queue_depth=len(in_flight),
+                    frames_read=1
+                )
+
+                if len(in_flight) >= self.max_in_flight:
+                    self.process_in_flight_frame(
+                        in_flight=in_flight,
+                        cap_writer=cap_writer
+                    )
+
+                frame_count += 1
+
+            while in_flight:
+                self.process_in_flight_frame(
+                    in_flight=in_flight,
+                    cap_writer=cap_writer
+                )
+        finally:
+            # Do not leave frames of this stream in the worker
+            for _, _, predictions_future in in_flight:
+                if predictions_future is not None:
+                    predictions_future.exception()
+            cap.release()
+            if cap_writer is not None:
+                cap_writer.release()
+
+    def process_in_flight_frame(
+            self,
+            in_flight: collections.deque,
+            cap_writer: Optional[cv2.VideoWriter] = None
+    ) -> FrameResult:
+        frame_number, image, predictions_future = in_flight.popleft()
+        predictions = None
+        if predictions_future is not None:
+            predictions = predictions_future.result()
+
+        frame_result = self.post_inference.process_frame(
+            frame_number=frame_number,
+            predictions=predictions,
+            period=self.skip_frames
+        )
+        self.on_frame_result(self.stream_name, frame_result)
+
+        if image is not None and cap_writer is not None:
+            self.render_frame_result(
+                frame_result=frame_result,
+                image=image,
+                cap_writer=cap_writer
+            )
+
+        with self.lock:
+            self.frames_processed += 1
+            if predictions_future is not None:
+                self.frames_detected += 1
+            self.queue_depth = len(in_flight)
+
+        return frame_result
+
+    @staticmethod
+    def render_frame_result(
+            frame_result: FrameResult,
+            image: numpy.ndarray,
+            cap_writer: cv2.VideoWriter
+    ):
+        image = main_utils.draw_interaction_bboxes_in_frame(
+            interaction_objs=frame_result.persons,
+            original_frame=image
+        )
+        image_assignments = main_utils.draw_assignment_frame(
+            assignments=frame_result.person_hand_assignments,
+            original_frame=image
+        )
+        image_products = main_utils.draw_interaction_bboxes_in_frame(
+            interaction_objs=frame_result.products,
+            original_frame=image_assignments,
+            bbox_color=(125, 255, 50)
+        )
+        cap_writer.write(image_products)
+
+    def update_queue_depth(self, queue_depth: int, frames_read: int = 0):
+        with self.lock:
+            self.frames_read += frames_read
+            self.queue_depth = queue_depth
+            self.queue_depth_sum += queue_depth
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+
+    def get_stats(self) -> Dict[str, float]:
+        with self.lock:
+            if self.start_time is None:
+                elapsed = 0.0
+            else:
+                elapsed = (
+                    (self.end_time or time.perf_counter()) - self.start_time
+                )
+            return {
+                'frames_read': self.frames_read,
+                'frames_processed': self.frames_processed,
+                'frames_detected': self.frames_detected,
+                'fps': round(self.frames_processed / elapsed, 2)
+                if elapsed > 0 else 0.0,
+                'queue_depth': self.queue_depth,
+                'mean_queue_depth': round(
+                    self.queue_depth_sum / max(self.frames_read, 1), 2
+                ),
+                'max_queue_depth': self.max_queue_depth,
+                'inference_pending': self.inference_worker.get_pending(
+                    stream_name=self.stream_name
+                ),
+            }
+
+
+class MultiStreamRunner:
+    """
+    Processes several cameras in one process: one StreamRunner thread per
+    stream, with its own tracker, assignment and store state, and one
+    BatchInferenceWorker with the only detection model session, that
+    batches the detection frames of all the streams.
+    """
+
+    def __init__(
+            self,
+            streams_configs: List[StreamConfig],
+            detection_model: DetectionsModel,
+            skip_frames: int = 2,
+            max_batch_size: Optional[int] = None,
+            max_batch_wait_s: float = 0.005,
+            max_in_flight: int = 2,
+            render_every: int = 0,
+            tracker_factory: Optional[Callable[[], NorfairTracker]] = None,
+            on_frame_result: Optional[
+                Callable[[str, FrameResult], None]
+            ] = None
+    ) -> None:
+        stream_names = [
+            stream_config.stream_name for stream_config in streams_configs
+        ]
+        if len(set(stream_names)) != len(stream_names):
+            raise ValueError(f'Stream names are not unique: {stream_names}')
+
+        self.inference_worker = BatchInferenceWorker(
+            detection_model=detection_model,
+            max_batch_size=max_batch_size or len(streams_configs),
+            max_wait_s=max_batch_wait_s
+        )
+        tracker_factory = tracker_factory or NorfairTracker
+        self.streams = [
+            StreamRunner.create_from_config(
+                stream_config=stream_config,
+                inference_worker=self.inference_worker,
+                tracker=tracker_factory(),
+                skip_frames=skip_frames,
+                max_in_flight=max_in_flight,
+                render_every=render_every,
+                on_frame_result=on_frame_result
+            )
+            for stream_config in streams_configs
+        ]
+
+    def run(self, report_every_s: float = 0.0) -> Dict[str, Dict]:
+        """
+        Process every stream until all of them end. Logs the stats of the
+        streams every report_every_s seconds (0 only logs them at the end)
+        and returns them.
+        """
+        self.inference_worker.start()
+        for stream in self.streams:
+            stream.start()
+
+        next_report = time.perf_counter() + report_every_s
+        try:
+            for stream in self.streams:
+                while stream.is_alive():
+                    stream.join(timeout=min(report_every_s, 1.0) or None)
+                    if (
+                        report_every_s > 0 and
+                        time.perf_counter() >= next_report
+                    ):
+                        self.report()
+                        next_report += report_every_s
+        finally:
+            self.inference_worker.stop()
+
+        self.report()
+        for stream in self.streams:
+            if stream.exception is not None:
+                raise stream.exception
+        return self.get_stats()
+
+    def get_stats(self) -> Dict[str, Dict]:
+        return {
+            'streams': {
+                stream.stream_name: stream.get_stats()
+                for stream in self.streams
+            },
+            'inference': self.inference_worker.get_stats(),
+        }
+
+    def report(self):
+        stats = self.get_stats()
+        for stream_name, stream_stats in stats['streams'].items():
+            logger.info(
+                f'[{stream_name}] {stream_stats["frames_processed"]} frames, '
+                f'{stream_stats["fps"]} FPS, queue depth '
+                f'{stream_stats["queue_depth"]} (mean '
+                f'{stream_stats["mean_queue_depth"]}, max '
+                f'{stream_stats["max_queue_depth"]}), inference pending '
+                f'{stream_stats["inference_pending"]}'
+            )
+        logger.info(f'Shared inference: {stats["inference"]}')
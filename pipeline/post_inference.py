@@ -0,0 +1,199 @@
+import numpy
+
+from typing import Dict, List, Optional, Set, Tuple, Union
+import logging
+
+from tracking.norfair_tracker import NorfairTracker
+from tracking.frame_state import FrameState
+from assigning.assign import AssignPersonHands, DetectionLabel
+from assigning.person import Person
+from assigning.hand import Hand
+from assigning.product import Product
+from location.products import Products
+from costumer.costumer import Costumer
+from costumer.purchase import Purchase
+from costumer.store import Store
+from profiling.stage_timer import StageTimer
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+# create handler
+c_handler = logging.StreamHandler()
+# create formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+# add formatter to ch
+c_handler.setFormatter(formatter)
+# Add handler to logger
+logger.addHandler(c_handler)
+
+
+class FrameResult:
+    """
+    Output of the post-inference stages for one frame.
+    """
+
+    def __init__(
+            self,
+            frame_number: int,
+            frame_state: FrameState,
+            person_hand_assignments: Optional[List[Tuple[Hand, Person]]],
+            products_top_location: List[numpy.ndarray],
+            active_costumers: List[Costumer],
+            hands_products_distances: Optional[numpy.ndarray] = None,
+            costumer_products_close: Optional[
+                List[Tuple[Costumer, Product]]
+            ] = None,
+            products_added_codes: Optional[Set[str]] = None,
+            products_gone_codes: Optional[Set[str]] = None,
+    ) -> None:
+        self.frame_number = frame_number
+        self.frame_state = frame_state
+        self.person_hand_assignments = person_hand_assignments
+        self.products_top_location = products_top_location
+        self.active_costumers = active_costumers
+        self.hands_products_distances = hands_products_distances
+        self.costumer_products_close = costumer_products_close or []
+        self.products_added_codes = products_added_codes
+        self.products_gone_codes = products_gone_codes
+
+    @property
+    def interaction_objs_by_label(
+        self
+    ) -> Dict[int, List[Union[Person, Hand, Product]]]:
+        return self.frame_state.interaction_objs_by_label
+
+    @property
+    def persons(self) -> Optional[List[Person]]:
+        return self.get_interactions(group_key=DetectionLabel.PERSON)
+
+    @property
+    def hands(self) -> Optional[List[Hand]]:
+        return self.get_interactions(group_key=DetectionLabel.HAND)
+
+    @property
+    def products(self) -> Optional[List[Product]]:
+        return self.get_interactions(group_key=DetectionLabel.PRODUCTS)
+
+    def get_interactions(
+        self,
+        group_key: int
+    ) -> Optional[List[Union[Person, Hand, Product]]]:
+        group = self.frame_state.get(group_key)
+        if group is None:
+            return None
+        return group.interactions
+
+
+class PostInferencePipeline:
+    """
+    The stages that run after the detection model for one video stream:
+    tracking, hand to person assignment, products top location, costumers
+    management and the store hands to products closeness.
+
+    Each stream keeps its own instance, as all the stages keep state from
+    the previous frames.
+    """
+
+    def __init__(
+            self,
+            table_prsp_matrix: numpy.ndarray,
+            stage_timer: Optional[StageTimer] = None,
+            tracker: Optional[NorfairTracker] = None
+    ) -> None:
+        self.stage_timer = stage_timer or StageTimer()
+
+        self.tracker = tracker or NorfairTracker()
+        self.assign_personhands = AssignPersonHands()
+        self.products = Products(table_prsp_matrix=table_prsp_matrix)
+        self.purchase_costumers = Purchase()
+        self.store = Store(
+            products=self.products,
+            costumers=self.purchase_costumers
+        )
+
+    def process_frame(
+            self,
+            frame_number: int,
+            predictions: Optional[numpy.ndarray] = None,
+            period: int = 1
+    ) -> FrameResult:
+        """
+        Run every stage for one frame. Frames without predictions (None) only
+        update the tracker estimates.
+        """
+        stage_timer = self.stage_timer
+
+        # Get tracked objects, with or without detections
+        with stage_timer.stage('tracking'):
+            norfair_tracked_obj = self.tracker.update_from_predictions(
+                predictions=predictions,
+                period=period
+            )
+
+        # Separate tracked objects by label, in columns
+        with stage_timer.stage('separate_interactions'):
+            frame_state = self.tracker.update_frame_state(
+                norfair_tracked_objects=norfair_tracked_obj
+            )
+
+        # Assign hands to the persons objects
+        with stage_timer.stage('assignment'):
+            person_hand_assignments = (
+                self.assign_personhands.assign_from_frame_state(
+                    frame_state=frame_state
+                )
+            )
+
+        # Update the products in the products instance and compute the
+        # top location of their centers (table top perspective)
+        with stage_timer.stage('products'):
+            products_top_location_narray = (
+                self.products.compute_products_top_location_from_frame_state(
+                    frame_state=frame_state
+                )
+            )
+
+        # Managing costumers (creating and updating from assignments)
+        # -- not handling on hold costumer yet
+        with stage_timer.stage('costumers'):
+            self.purchase_costumers.manage_costumers(
+                person_hand_assignments=person_hand_assignments
+            )
+
+        # Get active costumers from the management of assignments
+        active_costumers = self.purchase_costumers.get_active_costumers()
+
+        frame_result = FrameResult(
+            frame_number=frame_number,
+            frame_state=frame_state,
+            person_hand_assignments=person_hand_assignments,
+            products_top_location=products_top_location_narray,
+            active_costumers=active_costumers
+        )
+
+        if active_costumers:
+            # If there are active costumers, start assigning products
+
+            # Determine the closest one
+            with stage_timer.stage('store'):
+                hands_products_distances, costumer_products_close = (
+                    self.store.determine_close_hands_products(
+                        products_location_top=products_top_location_narray
+                    )
+                )
+
+            # Get the difference between previous and current products
+            # In quantity, and sets with names and ids
+            products_added_codes, products_gone_codes = (
+                self.products.get_products_codes_difference_prev_curr()
+            )
+
+            frame_result.hands_products_distances = hands_products_distances
+            frame_result.costumer_products_close = costumer_products_close
+            frame_result.products_added_codes = products_added_codes
+            frame_result.products_gone_codes = products_gone_codes
+
+        return frame_result
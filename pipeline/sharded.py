@@ -0,0 +1,557 @@
+import cv2
+import numpy
+from scipy.optimize import linear_sum_assignment
+
+from typing import Dict, Iterator, List, Optional, Tuple
+import concurrent.futures
+import logging
+import math
+import time
+
+from source.read_video import VideoSource
+from source.source import Source
+from detection.detections import DetectionsModel
+from detection.session_config import SessionConfig
+from location.table import TableLocation
+from tracking.norfair_tracker import NorfairTracker
+from assigning.assign import DetectionLabel
+from geometry.boxes import BoxGeometry
+from pipeline.post_inference import FrameResult, PostInferencePipeline
+
+from utils import Utils as main_utils
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+# create handler
+c_handler = logging.StreamHandler()
+# create formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+# add formatter to ch
+c_handler.setFormatter(formatter)
+# Add handler to logger
+logger.addHandler(c_handler)
+
+
+class VideoShard:
+    """
+    Frames [start_frame, end_frame) of a video, end_frame None is the end
+    of the video. The shard is processed from warmup_start so the tracker,
+    the assignment and the costumers have the state of the previous frames
+    at start_frame, the events of the warm-up frames are not kept.
+    """
+
+    def __init__(
+            self,
+            shard_idx: int,
+            start_frame: int,
+            end_frame: Optional[int],
+            warmup_start: int
+    ) -> None:
+        self.shard_idx = shard_idx
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.warmup_start = warmup_start
+
+    @classmethod
+    def plan_shards(
+        cls,
+        n_frames: int,
+        n_shards: int,
+        overlap_frames: int
+    ) -> List['VideoShard']:
+        """
+        Split n_frames in up to n_shards consecutive shards of the same
+        length, each one warmed up with the overlap_frames before it. The
+        frame count of many containers is an estimate, so the last shard
+        runs to the end of the video. Without a frame count the whole video
+        is one shard.
+        """
+        if n_frames <= 0:
+            logger.warning(
+                'The video has no frame count, processing it in one shard'
+            )
+            return [
+                cls(shard_idx=0, start_frame=0, end_frame=None, warmup_start=0)
+            ]
+
+        n_shards = max(1, min(n_shards, n_frames))
+        shard_length = math.ceil(n_frames / n_shards)
+        shards = []
+        for shard_idx in range(n_shards):
+            start_frame = shard_idx * shard_length
+            if start_frame >= n_frames:
+                break
+            end_frame = start_frame + shard_length
+            shards.append(cls(
+                shard_idx=shard_idx,
+                start_frame=start_frame,
+                end_frame=None if end_frame >= n_frames else end_frame,
+                warmup_start=max(0, start_frame - overlap_frames)
+            ))
+        return shards
+
+    def __repr__(self) -> str:
+        return (
+            f'Shard {self.shard_idx}: frames [{self.start_frame}, '
+            f'{self.end_frame}) warmed up from {self.warmup_start}'
+        )
+
+
+class ShardConfig:
+    """
+    Everything a worker process needs to build its own source, detection
+    model and post-inference stages.
+    """
+
+    def __init__(
+            self,
+            source_name: str,
+            source_folder: Optional[str],
+            detection_model_name: str,
+            session_config: Optional[SessionConfig] = None,
+            perspective_matrix_name: str = 'table_persp_mtx_v1',
+            table_top_image: str = 'nice_table.jpg',
+            skip_frames: int = 2,
+            track_min_score: float = 0.0,
+            per_class_tracking: bool = False,
+            match_frames: int = 10
+    ) -> None:
+        self.source_name = source_name
+        self.source_folder = source_folder
+        self.detection_model_name = detection_model_name
+        self.session_config = session_config
+        self.perspective_matrix_name = perspective_matrix_name
+        self.table_top_image = table_top_image
+        self.skip_frames = skip_frames
+        self.track_min_score = track_min_score
+        self.per_class_tracking = per_class_tracking
+        self.match_frames = match_frames
+
+
+class ShardResult:
+    """
+    Output of one shard, with the tracking ids of the shard tracker:
+
+    - events: the frames of [start_frame, end_frame) with active costumers
+    as {'frame_number', 'products_gone', 'products_added', 'costumers'}.
+    - head_tracks / tail_tracks: tracks of the last match_frames frames
+    before start_frame (warm-up) and before end_frame, as
+    {frame number: {group key: (track ids, tracking bboxes)}}, to match
+    the tracks of consecutive shards.
+    - track_ids: every track id of the shard by group key.
+    """
+
+    def __init__(self, shard: VideoShard) -> None:
+        self.shard = shard
+        self.events: List[Dict] = []
+        self.head_tracks: Dict[int, Dict] = {}
+        self.tail_tracks: Dict[int, Dict] = {}
+        self.track_ids: Dict[int, set] = {}
+        self.frames_processed = 0
+        self.last_frame = None
+        self.elapsed_s = 0.0
+
+
+class ShardedVideoProcessor:
+    """
+    Offline processing of a recorded video split in overlapping shards,
+    each one in a worker process with its own DetectionsModel, tracker and
+    Purchase. The events of the shards are merged in one event log ordered
+    by frame, with the tracking ids of the shards mapped to global ids:
+    the tracks of a shard are matched by IoU with the tracks of the
+    previous shard on the last frames they both process, and the tracks
+    without a match get new ids.
+    """
+
+    def __init__(
+            self,
+            shard_config: ShardConfig,
+            n_shards: int,
+            n_workers: Optional[int] = None,
+            overlap_frames: int = 60,
+            min_match_iou: float = 0.5
+    ) -> None:
+        self.shard_config = shard_config
+        self.n_shards = n_shards
+        self.n_workers = n_workers or n_shards
+        self.overlap_frames = overlap_frames
+        self.min_match_iou = min_match_iou
+
+    @staticmethod
+    def create_video_source(shard_config: ShardConfig) -> VideoSource:
+        main_source = Source(
+            source_name=shard_config.source_name,
+            source_folder=shard_config.source_folder
+        )
+        if not isinstance(main_source.source, VideoSource):
+            raise ValueError(
+                f'Source {shard_config.source_name} is not a video'
+            )
+        if main_source.source.source_path == 0:
+            raise ValueError('Live cameras can not be processed in shards')
+        return main_source.source
+
+    @classmethod
+    def count_frames(cls, shard_config: ShardConfig) -> int:
+        video_source = cls.create_video_source(shard_config=shard_config)
+        cap = video_source.get_ocv_video_capture()
+        if not cap.isOpened():
+            raise ValueError(
+                f'The video {video_source.source_path} can not be opened'
+            )
+        n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        return n_frames
+
+    @staticmethod
+    def get_frame_tracks(
+        frame_result: FrameResult
+    ) -> Dict[int, Tuple[List[int], numpy.ndarray]]:
+        return {
+            group_key: (
+                group.track_ids.tolist(),
+                group.bboxes_tracking.copy()
+            )
+            for group_key, group in frame_result.frame_state.groups.items()
+        }
+
+    @staticmethod
+    def get_frame_event(frame_result: FrameResult) -> Dict:
+        return {
+            'frame_number': frame_result.frame_number,
+            'products_gone': sorted(frame_result.products_gone_codes),
+            'products_added': sorted(frame_result.products_added_codes),
+            'costumers': sorted(
+                costumer.person_id
+                for costumer in frame_result.active_costumers
+            ),
+        }
+
+    @classmethod
+    def process_shard(
+        cls,
+        shard: VideoShard,
+        shard_config: ShardConfig
+    ) -> ShardResult:
+        """
+        Run in a worker process: process the frames of the shard from its
+        warm-up start and keep its events and boundary tracks.
+        """
+        start = time.perf_counter()
+        shard_result = ShardResult(shard=shard)
+
+        video_source = cls.create_video_source(shard_config=shard_config)
+        detection_model = DetectionsModel(
+            model_name=shard_config.detection_model_name,
+            session_config=shard_config.session_config
+        )
+        table = TableLocation.create_from_prsp_matrix_name(
+            prsp_matrix_name=shard_config.perspective_matrix_name,
+            table_top_image_name=shard_config.table_top_image
+        )
+        post_inference = PostInferencePipeline(
+            table_prsp_matrix=table.perspective_matrix,
+            tracker=NorfairTracker(
+                min_score=shard_config.track_min_score,
+                per_class=shard_config.per_class_tracking
+            )
+        )
+
+        cap = video_source.get_ocv_video_capture()
+        frame_count = video_source.seek_to_frame(
+            ocv_video_capture=cap,
+            frame_number=shard.warmup_start
+        )
+        head_start = shard.start_frame - shard_config.match_frames
+        tail_start = None
+        if shard.end_frame is not None:
+            tail_start = shard.end_frame - shard_config.match_frames
+
+        try:
+            while cap.isOpened() and (
+                shard.end_frame is None or frame_count < shard.end_frame
+            ):
+                is_detection_frame = main_utils.is_detection_frame(
+                    frame_number=frame_count,
+                    skip_frames=shard_config.skip_frames
+                )
+                success, image = video_source.read_frame(
+                    ocv_video_capture=cap,
+                    retrieve=is_detection_frame
+                )
+                if not success:
+                    break
+
+                predictions = None
+                if is_detection_frame:
+                    predictions = detection_model.get_image_predictions(
+                        raw_image=image,
+                        resize=True
+                    )
+                frame_result = post_inference.process_frame(
+                    frame_number=frame_count,
+                    predictions=predictions,
+                    period=shard_config.skip_frames
+                )
+
+                frame_tracks = None
+                if head_start <= frame_count < shard.start_frame:
+                    frame_tracks = cls.get_frame_tracks(frame_result)
+                    shard_result.head_tracks[frame_count] = frame_tracks
+                if tail_start is not None and frame_count >= tail_start:
+                    frame_tracks = (
+                        frame_tracks or cls.get_frame_tracks(frame_result)
+                    )
+                    shard_result.tail_tracks[frame_count] = frame_tracks
+
+                frame_groups = frame_result.frame_state.groups
+                for group_key, group in frame_groups.items():
+                    shard_result.track_ids.setdefault(group_key, set()).update(
+                        group.track_ids.tolist()
+                    )
+
+                if (
+                    frame_count >= shard.start_frame and
+                    frame_result.active_costumers
+                ):
+                    shard_result.events.append(
+                        cls.get_frame_event(frame_result=frame_result)
+                    )
+
+                shard_result.frames_processed += 1
+                shard_result.last_frame = frame_count
+                frame_count += 1
+        finally:
+            cap.release()
+
+        shard_result.elapsed_s = time.perf_counter() - start
+        return shard_result
+
+    @staticmethod
+    def match_tracks(
+        prev_tracks: Dict[int, Dict],
+        next_tracks: Dict[int, Dict],
+        min_iou: float = 0.5
+    ) -> Dict[int, Dict[int, int]]:
+        """
+        Match the tracks of two shards over the frames they both processed.
+        The score of a pair is its mean IoU over those frames (0 in the
+        frames where one of them is missing), pairs are assigned with the
+        Hungarian algorithm and kept if the score is at least min_iou.
+
+        Returns {group key: {next shard id: previous shard id}}.
+        """
+        common_frames = sorted(set(prev_tracks) & set(next_tracks))
+        if not common_frames:
+            return {}
+
+        # Ids of each side by group, in a fixed order
+        prev_ids = {}
+        next_ids = {}
+        for frame_number in common_frames:
+            for tracks, ids in [
+                (prev_tracks[frame_number], prev_ids),
+                (next_tracks[frame_number], next_ids),
+            ]:
+                for group_key, (track_ids, _) in tracks.items():
+                    ids.setdefault(group_key, set()).update(track_ids)
+
+        groups_matches = {}
+        for group_key in set(prev_ids) & set(next_ids):
+            group_prev_ids = sorted(prev_ids[group_key])
+            group_next_ids = sorted(next_ids[group_key])
+            prev_rows = {
+                track_id: row for row, track_id in enumerate(group_prev_ids)
+            }
+            next_rows = {
+                track_id: row for row, track_id in enumerate(group_next_ids)
+            }
+            iou_sum = numpy.zeros((len(group_next_ids), len(group_prev_ids)))
+
+            for frame_number in common_frames:
+                prev_group = prev_tracks[frame_number].get(group_key)
+                next_group = next_tracks[frame_number].get(group_key)
+                if prev_group is None or next_group is None:
+                    continue
+                frame_iou = BoxGeometry.pairwise_iou(
+                    bboxes1=next_group[1],
+                    bboxes2=prev_group[1],
+                    pixels_border=0
+                )
+                rows = [next_rows[track_id] for track_id in next_group[0]]
+                cols = [prev_rows[track_id] for track_id in prev_group[0]]
+                iou_sum[numpy.ix_(rows, cols)] += frame_iou
+
+            mean_iou = iou_sum / len(common_frames)
+            next_idxs, prev_idxs = linear_sum_assignment(-mean_iou)
+            groups_matches[group_key] = {
+                group_next_ids[next_idx]: group_prev_ids[prev_idx]
+                for next_idx, prev_idx in zip(next_idxs, prev_idxs)
+                if mean_iou[next_idx, prev_idx] >= min_iou
+            }
+
+        return groups_matches
+
+    def compute_global_ids(
+        self,
+        shards_results: List[ShardResult]
+    ) -> List[Dict[int, Dict[int, int]]]:
+        """
+        Global ids of the tracks of every shard by group. The first shard
+        keeps its ids, the tracks of the next shards take the global id of
+        their match in the previous shard or a new one, in the order of
+        their ids.
+        """
+        shards_global_ids = []
+        next_global_id = {}
+        for shard_result_idx, shard_result in enumerate(shards_results):
+            matches = {}
+            prev_global_ids = {}
+            if shard_result_idx > 0:
+                prev_result = shards_results[shard_result_idx - 1]
+                matches = self.match_tracks(
+                    prev_tracks=prev_result.tail_tracks,
+                    next_tracks=shard_result.head_tracks,
+                    min_iou=self.min_match_iou
+                )
+                prev_global_ids = shards_global_ids[-1]
+
+            global_ids = {}
+            for group_key, track_ids in shard_result.track_ids.items():
+                group_matches = matches.get(group_key, {})
+                group_prev_global_ids = prev_global_ids.get(group_key, {})
+                group_global_ids = global_ids[group_key] = {}
+                for track_id in sorted(track_ids):
+                    if shard_result_idx == 0:
+                        global_id = track_id
+                    elif track_id in group_matches:
+                        global_id = group_prev_global_ids[
+                            group_matches[track_id]
+                        ]
+                    else:
+                        global_id = next_global_id.get(group_key, 1)
+                    group_global_ids[track_id] = global_id
+                    next_global_id[group_key] = max(
+                        next_global_id.get(group_key, 1),
+                        global_id + 1
+                    )
+            shards_global_ids.append(global_ids)
+
+        return shards_global_ids
+
+    @staticmethod
+    def remap_product_code(
+        product_code: str,
+        products_global_ids: Dict[int, int]
+    ) -> str:
+        product_name, product_id = product_code.rsplit('#', 1)
+        global_id = products_global_ids.get(int(product_id), product_id)
+        return f'{product_name}#{global_id}'
+
+    @classmethod
+    def remap_event(
+        cls,
+        event: Dict,
+        global_ids: Dict[int, Dict[int, int]]
+    ) -> Dict:
+        products_global_ids = global_ids.get(DetectionLabel.PRODUCTS, {})
+        persons_global_ids = global_ids.get(DetectionLabel.PERSON, {})
+        return {
+            'frame_number': event['frame_number'],
+            'products_gone': sorted(
+                cls.remap_product_code(
+                    product_code=product_code,
+                    products_global_ids=products_global_ids
+                )
+                for product_code in event['products_gone']
+            ),
+            'products_added': sorted(
+                cls.remap_product_code(
+                    product_code=product_code,
+                    products_global_ids=products_global_ids
+                )
+                for product_code in event['products_added']
+            ),
+            'costumers': sorted(
+                persons_global_ids.get(person_id, person_id)
+                for person_id in event['costumers']
+            ),
+        }
+
+    def merge_events(
+        self,
+        shards_results: List[ShardResult]
+    ) -> List[Dict]:
+        """
+        One event log ordered by frame, with global ids.
+        """
+        shards_global_ids = self.compute_global_ids(
+            shards_results=shards_results
+        )
+        events = []
+        for shard_result, global_ids in zip(
+            shards_results,
+            shards_global_ids
+        ):
+            events.extend(
+                self.remap_event(event=event, global_ids=global_ids)
+                for event in shard_result.events
+            )
+        events.sort(key=lambda event: event['frame_number'])
+        return events
+
+    def iter_shards_results(
+        self,
+        shards: List[VideoShard]
+    ) -> Iterator[ShardResult]:
+        """
+        Process the shards in the worker processes, yielding the results in
+        the order of the shards.
+        """
+        if self.n_workers <= 1:
+            for shard in shards:
+                yield self.process_shard(
+                    shard=shard,
+                    shard_config=self.shard_config
+                )
+            return
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.n_workers
+        ) as executor:
+            shards_futures = [
+                executor.submit(
+                    self.process_shard,
+                    shard=shard,
+                    shard_config=self.shard_config
+                )
+                for shard in shards
+            ]
+            for shard_future in shards_futures:
+                yield shard_future.result()
+
+    def run(self) -> Tuple[List[Dict], List[ShardResult]]:
+        n_frames = self.count_frames(shard_config=self.shard_config)
+        shards = VideoShard.plan_shards(
+            n_frames=n_frames,
+            n_shards=self.n_shards,
+            overlap_frames=self.overlap_frames
+        )
+        logger.info(
+            f'{n_frames} frames in {len(shards)} shards, '
+            f'{self.n_workers} workers'
+        )
+
+        shards_results = []
+        for shard_result in self.iter_shards_results(shards=shards):
+            logger.info(
+                f'{shard_result.shard}: {shard_result.frames_processed} '
+                f'frames in {shard_result.elapsed_s:.2f} s, '
+                f'{len(shard_result.events)} events'
+            )
+            shards_results.append(shard_result)
+
+        return self.merge_events(shards_results=shards_results), shards_results
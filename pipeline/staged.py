@@ -0,0 +1,407 @@
+import cv2
+import numpy
+
+from typing import Callable, Dict, Iterator, List, Optional
+import logging
+import queue
+import threading
+import time
+
+from source.read_video import VideoSource
+from detection.detections import DetectionsModel
+from pipeline.post_inference import FrameResult, PostInferencePipeline
+from profiling.stage_timer import StageTimer
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+# create handler
+c_handler = logging.StreamHandler()
+# create formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+# add formatter to ch
+c_handler.setFormatter(formatter)
+# Add handler to logger
+logger.addHandler(c_handler)
+
+
+class StageItem:
+    """
+    One frame on its way through the stages of the StagedPipeline.
+    """
+
+    __slots__ = (
+        'frame_number',
+        'image',
+        'is_detection_frame',
+        'is_render_frame',
+        'predictions',
+        'frame_result',
+        'start_ns',
+    )
+
+    def __init__(
+            self,
+            frame_number: int,
+            image: Optional[numpy.ndarray],
+            is_detection_frame: bool,
+            is_render_frame: bool,
+            start_ns: int
+    ) -> None:
+        self.frame_number = frame_number
+        self.image = image
+        self.is_detection_frame = is_detection_frame
+        self.is_render_frame = is_render_frame
+        self.predictions = None
+        self.frame_result: Optional[FrameResult] = None
+        self.start_ns = start_ns
+
+
+class StageQueue:
+    """
+    Bounded queue between two stages. A full queue blocks the producer
+    (backpressure), so at most maxsize frames wait between the stages.
+
+    It keeps the occupancy of the queue seen by each get and the time the
+    producer waited on a full queue and the consumer on an empty one. A
+    queue that is usually full is in front of the slowest stage, a queue
+    that is usually empty is behind it.
+    """
+
+    # Marks the end of the frames
+    END = None
+    # Seconds between the checks of the stop event while waiting
+    WAIT_STEP_S = 0.1
+
+    def __init__(
+            self,
+            name: str,
+            maxsize: int,
+            stop_event: threading.Event
+    ) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stop_event = stop_event
+
+        self.gets = 0
+        self.occupancy_sum = 0
+        self.max_occupancy = 0
+        self.full_gets = 0
+        self.producer_wait_time = 0.0
+        self.consumer_wait_time = 0.0
+
+    def put(self, item: Optional[StageItem]) -> bool:
+        """
+        Put the item, waiting while the queue is full. Returns False if the
+        pipeline was stopped before the item could be put.
+        """
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+
+        wait_start = time.perf_counter()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self.queue.put(item, timeout=self.WAIT_STEP_S)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            self.producer_wait_time += time.perf_counter() - wait_start
+
+    def get(self) -> Optional[StageItem]:
+        """
+        Get the next item, waiting while the queue is empty. Returns END
+        at the end of the frames or if the pipeline was stopped.
+        """
+        occupancy = self.queue.qsize()
+        self.gets += 1
+        self.occupancy_sum += occupancy
+        self.max_occupancy = max(self.max_occupancy, occupancy)
+        if occupancy >= self.maxsize:
+            self.full_gets += 1
+
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            pass
+
+        wait_start = time.perf_counter()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    return self.queue.get(timeout=self.WAIT_STEP_S)
+                except queue.Empty:
+                    continue
+            return self.END
+        finally:
+            self.consumer_wait_time += time.perf_counter() - wait_start
+
+    def get_stats(self) -> Dict[str, float]:
+        gets = max(self.gets, 1)
+        return {
+            'maxsize': self.maxsize,
+            'mean_occupancy': round(self.occupancy_sum / gets, 2),
+            'max_occupancy': self.max_occupancy,
+            'full_rate': round(self.full_gets / gets, 3),
+            'producer_wait_s': round(self.producer_wait_time, 3),
+            'consumer_wait_s': round(self.consumer_wait_time, 3),
+        }
+
+
+class StagedPipeline:
+    """
+    Runs the frame pipeline of a video source as stages in their own
+    threads, connected by bounded StageQueues:
+
+    decode -> inference -> post_inference -> the caller (render/output)
+
+    Each stage has one thread and the queues are FIFO, so the frames reach
+    the tracker and the caller in the order of the video. While the
+    post-inference stages (tracking to store, that keep state between
+    frames) run for frame N, the model runs on frame N + 1 and the next
+    frames are decoded. onnxruntime, OpenCV and most of numpy release the
+    GIL, so the stages overlap on multi-core machines.
+
+    The caller iterates over iter_frames in its own thread (windows and
+    video writers stay in the main thread) and gets the StageItems with
+    their FrameResult.
+    """
+
+    STAGES = ('decode', 'inference', 'post_inference', 'output')
+
+    def __init__(
+            self,
+            video_source: VideoSource,
+            ocv_video_capture: cv2.VideoCapture,
+            detection_model: DetectionsModel,
+            post_inference: PostInferencePipeline,
+            is_detection_frame: Callable[[int], bool],
+            is_render_frame: Callable[[int], bool],
+            start_frame: int = 0,
+            period: int = 1,
+            queue_size: int = 4,
+            stage_timer: Optional[StageTimer] = None
+    ) -> None:
+        if queue_size < 1:
+            raise ValueError(f'Queue size must be positive, got {queue_size}')
+
+        self.video_source = video_source
+        self.capture = ocv_video_capture
+        self.detection_model = detection_model
+        self.post_inference = post_inference
+        self.is_detection_frame = is_detection_frame
+        self.is_render_frame = is_render_frame
+        self.start_frame = start_frame
+        self.period = period
+        self.stage_timer = stage_timer or StageTimer()
+
+        self.stop_event = threading.Event()
+        self.decoded_queue = StageQueue(
+            name='decode->inference',
+            maxsize=queue_size,
+            stop_event=self.stop_event
+        )
+        self.inferred_queue = StageQueue(
+            name='inference->post_inference',
+            maxsize=queue_size,
+            stop_event=self.stop_event
+        )
+        self.output_queue = StageQueue(
+            name='post_inference->output',
+            maxsize=queue_size,
+            stop_event=self.stop_event
+        )
+
+        self.threads: List[threading.Thread] = []
+        self.exception = None
+        self.busy_time = {stage: 0.0 for stage in self.STAGES}
+        self.frames = {stage: 0 for stage in self.STAGES}
+        self.start_time = None
+        self.end_time = None
+
+    def start(self):
+        if self.threads:
+            return
+        self.start_time = time.perf_counter()
+        for stage, target in [
+            ('decode', self.decode_frames),
+            ('inference', self.infer_frames),
+            ('post_inference', self.post_process_frames),
+        ]:
+            thread = threading.Thread(
+                target=self.run_stage,
+                args=(stage, target),
+                name=f'StagedPipeline-{stage}',
+                daemon=True
+            )
+            self.threads.append(thread)
+            thread.start()
+
+    def run_stage(self, stage: str, target: Callable[[], None]):
+        try:
+            target()
+        except Exception as e:
+            logger.exception(f'Pipeline stage {stage} failed')
+            self.exception = self.exception or e
+            self.stop_event.set()
+
+    def decode_frames(self):
+        frame_number = self.start_frame
+        while self.capture.isOpened() and not self.stop_event.is_set():
+            start_ns = time.perf_counter_ns()
+            is_detection_frame = self.is_detection_frame(frame_number)
+            is_render_frame = self.is_render_frame(frame_number)
+            with self.stage_timer.stage('decode'):
+                success, image = self.video_source.read_frame(
+                    ocv_video_capture=self.capture,
+                    retrieve=is_detection_frame or is_render_frame
+                )
+            self.add_busy_time(stage='decode', start_ns=start_ns)
+
+            if not success:
+                # If loading a video, stop, a live camera keeps reading
+                if self.video_source.source_path != 0:
+                    break
+                continue
+
+            stage_item = StageItem(
+                frame_number=frame_number,
+                image=image,
+                is_detection_frame=is_detection_frame,
+                is_render_frame=is_render_frame,
+                start_ns=start_ns
+            )
+            if not self.decoded_queue.put(stage_item):
+                return
+            frame_number += 1
+
+        self.decoded_queue.put(StageQueue.END)
+
+    def infer_frames(self):
+        while True:
+            stage_item = self.decoded_queue.get()
+            if stage_item is StageQueue.END:
+                break
+
+            start_ns = time.perf_counter_ns()
+            if stage_item.is_detection_frame:
+                stage_item.predictions = (
+                    self.detection_model.get_image_predictions(
+                        raw_image=stage_item.image,
+                        resize=True
+                    )
+                )
+            if not stage_item.is_render_frame:
+                # Only the rendered frames need the image after inference
+                stage_item.image = None
+            self.add_busy_time(stage='inference', start_ns=start_ns)
+
+            if not self.inferred_queue.put(stage_item):
+                return
+
+        self.inferred_queue.put(StageQueue.END)
+
+    def post_process_frames(self):
+        while True:
+            stage_item = self.inferred_queue.get()
+            if stage_item is StageQueue.END:
+                break
+
+            start_ns = time.perf_counter_ns()
+            # Frames without predictions only update the tracker estimates
+            stage_item.frame_result = self.post_inference.process_frame(
+                frame_number=stage_item.frame_number,
+                predictions=stage_item.predictions,
+                period=self.period
+            )
+            self.add_busy_time(stage='post_inference', start_ns=start_ns)
+
+            if not self.output_queue.put(stage_item):
+                return
+
+        self.output_queue.put(StageQueue.END)
+
+    def iter_frames(self) -> Iterator[StageItem]:
+        """
+        Start the stages and yield the processed frames in order. The work
+        of the caller between two frames is timed as the output stage.
+        Stopping the iteration early stops the stages.
+        """
+        self.start()
+        try:
+            while True:
+                stage_item = self.output_queue.get()
+                if stage_item is StageQueue.END:
+                    break
+
+                start_ns = time.perf_counter_ns()
+                yield stage_item
+                self.add_busy_time(stage='output', start_ns=start_ns)
+                self.stage_timer.record_frame(
+                    frame_number=stage_item.frame_number,
+                    start_ns=stage_item.start_ns
+                )
+        finally:
+            self.stop()
+
+        if self.exception is not None:
+            raise self.exception
+
+    def add_busy_time(self, stage: str, start_ns: int):
+        self.busy_time[stage] += (time.perf_counter_ns() - start_ns) / 1e9
+        self.frames[stage] += 1
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+        if self.end_time is None:
+            self.end_time = time.perf_counter()
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """
+        Busy time of each stage (the stage with the highest busy rate is
+        the bottleneck) and the occupancy of the queues between them.
+        """
+        elapsed = (self.end_time or time.perf_counter()) - (
+            self.start_time or time.perf_counter()
+        )
+        stages_stats = {
+            stage: {
+                'frames': self.frames[stage],
+                'busy_s': round(self.busy_time[stage], 3),
+                'busy_rate': round(self.busy_time[stage] / elapsed, 3)
+                if elapsed > 0 else 0.0,
+            }
+            for stage in self.STAGES
+        }
+        queues_stats = {
+            stage_queue.name: stage_queue.get_stats()
+            for stage_queue in [
+                self.decoded_queue,
+                self.inferred_queue,
+                self.output_queue,
+            ]
+        }
+        return {
+            'fps': round(self.frames['output'] / elapsed, 2)
+            if elapsed > 0 else 0.0,
+            'stages': stages_stats,
+            'queues': queues_stats,
+        }
+
+    def report(self):
+        stats = self.get_stats()
+        logger.info(f'Pipeline FPS: {stats["fps"]}')
+        for stage, stage_stats in stats['stages'].items():
+            logger.info(f'Pipeline stage {stage}: {stage_stats}')
+        for queue_name, queue_stats in stats['queues'].items():
+            logger.info(f'Pipeline queue {queue_name}: {queue_stats}')
@@ -0,0 +1,320 @@
+import numpy
+
+from typing import Dict, List, Optional
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+# create handler
+c_handler = logging.StreamHandler()
+# create formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+# add formatter to ch
+c_handler.setFormatter(formatter)
+# Add handler to logger
+logger.addHandler(c_handler)
+
+
+class LatencyHistogram:
+    """
+    Fixed size HDR-style histogram of durations in microseconds.
+
+    Values below 2 ** (sub_bucket_bits + 1) are recorded exactly, bigger
+    values fall in log-linear buckets: each power of two is split into
+    2 ** sub_bucket_bits sub-buckets, so the relative error of a percentile
+    is below 1 / 2 ** sub_bucket_bits (about 3% with the default 5 bits).
+    Values above 2 ** max_bits microseconds are clamped.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 5, max_bits: int = 36) -> None:
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.max_value = (1 << max_bits) - 1
+        n_buckets = self.bucket_index(self.max_value) + 1
+        self.counts = numpy.zeros(n_buckets, dtype=numpy.int64)
+
+        self.count = 0
+        self.total = 0
+        self.min_value = None
+        self.max_recorded = 0
+
+    def bucket_index(self, value: int) -> int:
+        shift = value.bit_length() - (self.sub_bucket_bits + 1)
+        if shift <= 0:
+            return value
+        return (shift << self.sub_bucket_bits) + (value >> shift)
+
+    def bucket_value(self, bucket_index: int) -> int:
+        """
+        Return the middle value of the bucket, inverse of bucket_index.
+        """
+        if bucket_index < 2 * self.sub_bucket_count:
+            return bucket_index
+        shift = (bucket_index >> self.sub_bucket_bits) - 1
+        sub_bucket = bucket_index - (shift << self.sub_bucket_bits)
+        return (sub_bucket << shift) + (1 << (shift - 1))
+
+    def record(self, value_us: int):
+        value_us = min(max(int(value_us), 0), self.max_value)
+        self.counts[self.bucket_index(value_us)] += 1
+        self.count += 1
+        self.total += value_us
+        if self.min_value is None or value_us < self.min_value:
+            self.min_value = value_us
+        if value_us > self.max_recorded:
+            self.max_recorded = value_us
+
+    def percentile(self, percentile: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(numpy.ceil(self.count * percentile / 100)))
+        bucket_index = int(
+            numpy.searchsorted(numpy.cumsum(self.counts), rank)
+        )
+        return float(
+            min(self.bucket_value(bucket_index), self.max_recorded)
+        )
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Return count, mean, p50, p95, p99 and max, in milliseconds.
+        """
+        return {
+            'count': self.count,
+            'mean_ms': round(self.mean / 1000, 3),
+            'p50_ms': round(self.percentile(50) / 1000, 3),
+            'p95_ms': round(self.percentile(95) / 1000, 3),
+            'p99_ms': round(self.percentile(99) / 1000, 3),
+            'max_ms': round(self.max_recorded / 1000, 3),
+        }
+
+    def reset(self):
+        self.counts[:] = 0
+        self.count = 0
+        self.total = 0
+        self.min_value = None
+        self.max_recorded = 0
+
+
+class TimedStage:
+    """
+    Context manager that records the duration of one stage in its timer.
+    One instance is kept for each stage name and thread, so timing a stage
+    does not allocate.
+    """
+
+    def __init__(self, stage_timer: 'StageTimer', name: str) -> None:
+        self.stage_timer = stage_timer
+        self.name = name
+        self.start_ns = 0
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stage_timer.record(
+            name=self.name,
+            start_ns=self.start_ns,
+            end_ns=time.perf_counter_ns()
+        )
+        return False
+
+
+class StageTimer:
+    """
+    Records the latency of the named stages of the frame pipeline into
+    latency histograms, together with the time of each frame.
+
+    When disabled, stage() returns a shared no-op context manager and the
+    frame methods return right away, so the instrumented code can stay in
+    place. When enabled it logs p50/p95/p99 and FPS summaries every
+    report_every frames and on close(), and optionally writes the stages as
+    a Chrome trace-event JSON file (chrome://tracing or Perfetto).
+    """
+
+    NULL_STAGE = contextlib.nullcontext()
+    FRAME_STAGE = 'frame'
+
+    def __init__(
+            self,
+            enabled: bool = False,
+            report_every: int = 0,
+            trace_path: Optional[str] = None,
+            max_trace_events: int = 500000
+    ) -> None:
+        self.enabled = enabled or trace_path is not None
+        self.report_every = report_every
+        self.trace_path = trace_path
+        self.max_trace_events = max_trace_events
+
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        # The stages of the pipeline mode record from several threads, new
+        # stages must not be added while a summary goes through them
+        self.histograms_lock = threading.Lock()
+        self.stages = threading.local()
+        self.trace_events: List[Dict] = []
+        self.dropped_trace_events = 0
+
+        self.start_ns = time.perf_counter_ns()
+        self.frame_start_ns = None
+        self.frame_number = None
+        self.n_frames = 0
+        self.interval_start_ns = self.start_ns
+        self.interval_frames = 0
+
+    def stage(self, name: str):
+        """
+        Return a context manager that times the code inside it as stage name.
+        """
+        if not self.enabled:
+            return self.NULL_STAGE
+
+        thread_stages = getattr(self.stages, 'by_name', None)
+        if thread_stages is None:
+            thread_stages = self.stages.by_name = {}
+        timed_stage = thread_stages.get(name)
+        if timed_stage is None:
+            timed_stage = thread_stages[name] = TimedStage(self, name)
+        return timed_stage
+
+    def record(self, name: str, start_ns: int, end_ns: int, args=None):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.histograms_lock:
+                histogram = self.histograms.setdefault(
+                    name,
+                    LatencyHistogram()
+                )
+        histogram.record((end_ns - start_ns) // 1000)
+
+        if self.trace_path is not None:
+            if len(self.trace_events) < self.max_trace_events:
+                trace_event = {
+                    'name': name,
+                    'cat': 'stage',
+                    'ph': 'X',
+                    'ts': (start_ns - self.start_ns) / 1000,
+                    'dur': (end_ns - start_ns) / 1000,
+                    'pid': os.getpid(),
+                    'tid': threading.get_ident(),
+                }
+                if args is not None:
+                    trace_event['args'] = args
+                self.trace_events.append(trace_event)
+            else:
+                self.dropped_trace_events += 1
+
+    def start_frame(self, frame_number: Optional[int] = None):
+        if not self.enabled:
+            return
+        self.frame_number = frame_number
+        self.frame_start_ns = time.perf_counter_ns()
+
+    def end_frame(self):
+        if not self.enabled or self.frame_start_ns is None:
+            return
+        self.record_frame(
+            frame_number=self.frame_number,
+            start_ns=self.frame_start_ns
+        )
+        self.frame_start_ns = None
+
+    def record_frame(self, frame_number: Optional[int], start_ns: int):
+        """
+        Record a frame that started at start_ns and ends now. Used directly
+        when the stages of a frame run in different threads (pipeline mode).
+        """
+        if not self.enabled:
+            return
+        self.record(
+            name=self.FRAME_STAGE,
+            start_ns=start_ns,
+            end_ns=time.perf_counter_ns(),
+            args={'frame_number': frame_number}
+        )
+        self.n_frames += 1
+        self.interval_frames += 1
+
+        if self.report_every > 0 and self.n_frames % self.report_every == 0:
+            self.report()
+
+    def get_fps(self, interval=False) -> float:
+        now_ns = time.perf_counter_ns()
+        if interval:
+            elapsed_ns = now_ns - self.interval_start_ns
+            n_frames = self.interval_frames
+        else:
+            elapsed_ns = now_ns - self.start_ns
+            n_frames = self.n_frames
+        return n_frames / (elapsed_ns / 1e9) if elapsed_ns > 0 else 0.0
+
+    def get_summary(self) -> Dict[str, Dict[str, float]]:
+        with self.histograms_lock:
+            histograms = list(self.histograms.items())
+        return {
+            name: histogram.summary()
+            for name, histogram in histograms
+        }
+
+    def report(self):
+        """
+        Log the latency summary of every stage and the FPS of the frames
+        since the last report and since the start.
+        """
+        if not self.enabled:
+            return
+        logger.info(
+            f'Frames: {self.n_frames}, '
+            f'FPS (interval): {self.get_fps(interval=True):.2f}, '
+            f'FPS (total): {self.get_fps():.2f}'
+        )
+        for name, summary in self.get_summary().items():
+            logger.info(
+                f'Stage {name}: n={summary["count"]} '
+                f'mean={summary["mean_ms"]}ms p50={summary["p50_ms"]}ms '
+                f'p95={summary["p95_ms"]}ms p99={summary["p99_ms"]}ms '
+                f'max={summary["max_ms"]}ms'
+            )
+        self.interval_start_ns = time.perf_counter_ns()
+        self.interval_frames = 0
+
+    def export_chrome_trace(self, trace_path: Optional[str] = None):
+        trace_path = trace_path or self.trace_path
+        if trace_path is None:
+            return
+        if self.dropped_trace_events:
+            logger.info(
+                f'Trace limit reached, {self.dropped_trace_events} stage '
+                'events were not saved'
+            )
+        with open(trace_path, 'w') as f:
+            json.dump(
+                {
+                    'traceEvents': self.trace_events,
+                    'displayTimeUnit': 'ms',
+                },
+                f
+            )
+        logger.info(f'Chrome trace saved in {trace_path}')
+
+    def close(self):
+        """
+        Log the final summary and write the trace file, if any.
+        """
+        if not self.enabled:
+            return
+        self.report()
+        self.export_chrome_trace()
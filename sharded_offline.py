@@ -0,0 +1,195 @@
+import click
+
+import json
+import logging
+import time
+
+from detection.session_config import SessionConfig
+from pipeline.sharded import ShardConfig, ShardedVideoProcessor
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+# create handler
+c_handler = logging.StreamHandler()
+# create formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+# add formatter to logger handler
+c_handler.setFormatter(formatter)
+# Add handler to logger
+logger.addHandler(c_handler)
+
+
+@click.command()
+@click.option(
+    '--source-name',
+    '-sn',
+    required=True,
+    help='The name of the recorded video to analyze'
+)
+@click.option(
+    '--source-folder',
+    default=None,
+    type=click.Path(),
+    help='Path of the folder where the source is stored'
+)
+@click.option(
+    '--detection-model',
+    '-dmodel',
+    default='best_tiny_elvis_peoplehands_032023.onnx',
+    type=str,
+    help='Name the folder where the detection model is stored'
+)
+@click.option(
+    '--skip-frames',
+    '-sf',
+    default=2,
+    help='Number of frame to skip detections'
+)
+@click.option(
+    '--perspective_matrix_name',
+    '-pm',
+    default='table_persp_mtx_v1',
+    help="Name of the perspective matrix version in location/transforms folder"
+)
+@click.option(
+    '--shards',
+    default=4,
+    type=click.IntRange(min=1),
+    help="Number of shards the video is split in"
+)
+@click.option(
+    '--workers',
+    default=None,
+    type=click.IntRange(min=1),
+    help="Worker processes (default: one per shard)"
+)
+@click.option(
+    '--overlap-frames',
+    default=60,
+    type=click.IntRange(min=0),
+    help="Frames before each shard processed to warm up its tracker"
+)
+@click.option(
+    '--match-frames',
+    default=10,
+    type=click.IntRange(min=1),
+    help="Last overlap frames used to match the tracks of two shards"
+)
+@click.option(
+    '--min-match-iou',
+    default=0.5,
+    type=click.FloatRange(min=0.0, max=1.0),
+    help="Minimum mean IoU to give a track the id of the previous shard"
+)
+@click.option(
+    '--session-preset',
+    default=None,
+    type=click.Choice(list(SessionConfig.PRESETS)),
+    help="Named onnxruntime session preset for the detection model"
+)
+@click.option(
+    '--intra-op-threads',
+    default=1,
+    type=int,
+    help="Threads used by onnxruntime inside each operator, per worker"
+)
+@click.option(
+    '--track-min-score',
+    default=0.0,
+    type=click.FloatRange(min=0.0, max=1.0),
+    help="Detections with a lower score are not passed to the tracker"
+)
+@click.option(
+    '--per-class-tracking',
+    is_flag=True,
+    default=False,
+    help="Track persons, hands and products with separate trackers"
+)
+@click.option(
+    '--events-output',
+    default=None,
+    type=click.Path(dir_okay=False),
+    help="Write the merged events as a JSON lines file"
+)
+def main(
+    source_name,
+    source_folder,
+    detection_model,
+    skip_frames,
+    perspective_matrix_name,
+    shards,
+    workers,
+    overlap_frames,
+    match_frames,
+    min_match_iou,
+    session_preset,
+    intra_op_threads,
+    track_min_score,
+    per_class_tracking,
+    events_output
+):
+    if match_frames > overlap_frames:
+        logger.info(
+            f'Match frames reduced to the {overlap_frames} overlap frames'
+        )
+        match_frames = max(overlap_frames, 1)
+
+    shard_config = ShardConfig(
+        source_name=source_name,
+        source_folder=source_folder,
+        detection_model_name=detection_model,
+        # Worker processes share the cores, one thread each by default
+        session_config=SessionConfig.from_options(
+            preset_name=session_preset,
+            intra_op_num_threads=intra_op_threads
+        ),
+        perspective_matrix_name=perspective_matrix_name,
+        skip_frames=skip_frames,
+        track_min_score=track_min_score,
+        per_class_tracking=per_class_tracking,
+        match_frames=match_frames
+    )
+    processor = ShardedVideoProcessor(
+        shard_config=shard_config,
+        n_shards=shards,
+        n_workers=workers,
+        overlap_frames=overlap_frames,
+        min_match_iou=min_match_iou
+    )
+
+    start = time.perf_counter()
+    events, shards_results = processor.run()
+    elapsed = time.perf_counter() - start
+    n_frames = sum(
+        shard_result.frames_processed for shard_result in shards_results
+    )
+    logger.info(
+        f'{len(events)} events, {n_frames} frames processed (with the '
+        f'overlaps) in {elapsed:.2f} s'
+    )
+
+    for event in events:
+        logger.info(
+            f'Frame {event["frame_number"]}: '
+            'Products gone between previous and current frame: '
+            f'{set(event["products_gone"])}, '
+            f'N#:{len(event["products_gone"])}'
+        )
+        logger.info(
+            f'Frame {event["frame_number"]}: '
+            'Products added between previous and current frame: '
+            f'current frame: {set(event["products_added"])}, '
+            f'N#:{len(event["products_added"])}'
+        )
+
+    if events_output is not None:
+        with open(events_output, 'w') as f:
+            for event in events:
+                f.write(json.dumps(event) + '\n')
+
+
+if __name__ == '__main__':
+    main()
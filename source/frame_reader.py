@@ -0,0 +1,233 @@
+import cv2
+import numpy
+
+from typing import Callable, Dict, List, Optional, Tuple
+import collections
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+# create handler
+c_handler = logging.StreamHandler()
+# create formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+# add formatter to ch
+c_handler.setFormatter(formatter)
+# Add handler to logger
+logger.addHandler(c_handler)
+
+
+class PrefetchVideoReader:
+    """
+    Reads frames from an OpenCV video capture in a background thread, so the
+    decoding of the next frames overlaps with the processing of the current
+    one.
+
+    Frames are decoded into a ring of depth + 1 frame buffers that are
+    allocated once and reused: up to depth decoded frames wait for the
+    consumer, plus the frame the consumer is holding. The frame returned by
+    read() is only valid until the next call to read().
+
+    - policy 'block': the decoder waits when the ring is full (files, where
+    every frame must be processed).
+    - policy 'drop_oldest': the decoder overwrites the oldest waiting frame
+    when the ring is full (live cameras, where the newest frame matters).
+
+    If retrieve_filter is given, it is called with the number of each frame
+    and frames for which it returns False are only grabbed (not decoded into
+    an image), read() returns them as (True, None).
+
+    It offers the subset of the cv2.VideoCapture API used by main.py, so it
+    can be used in place of the capture.
+    """
+
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop_oldest'
+    POLICIES = (BLOCK, DROP_OLDEST)
+
+    def __init__(
+            self,
+            ocv_video_capture: cv2.VideoCapture,
+            depth: int = 4,
+            policy: str = BLOCK,
+            is_live: bool = False,
+            start_frame: int = 0,
+            retrieve_filter: Optional[Callable[[int], bool]] = None
+    ) -> None:
+        if depth < 1:
+            raise ValueError(f'Prefetch depth must be positive, got {depth}')
+        if policy not in self.POLICIES:
+            raise ValueError(
+                f'Unknown prefetch policy {policy}, expecting one of '
+                f'{self.POLICIES}'
+            )
+
+        self.capture = ocv_video_capture
+        self.depth = depth
+        self.policy = policy
+        self.is_live = is_live
+        self.retrieve_filter = retrieve_filter
+
+        self.frame_buffers: List[Optional[numpy.ndarray]] = (
+            [None] * (depth + 1)
+        )
+        self.free_buffers = collections.deque(range(depth + 1))
+        # Queued frames as (frame number, buffer index or None if grabbed)
+        self.filled_buffers = collections.deque()
+        self.held_buffer = None
+        self.next_frame_number = start_frame
+        self.last_frame_number = None
+
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopped = False
+        self.finished = False
+
+        self.frames_decoded = 0
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.frames_grabbed = 0
+        self.failed_reads = 0
+        self.consumer_stalls = 0
+        self.consumer_stall_time = 0.0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.decode_frames,
+                name='PrefetchVideoReader',
+                daemon=True
+            )
+            self.thread.start()
+
+    def decode_frames(self):
+        """
+        Background loop that decodes frames into free buffers and queues them
+        for the consumer.
+        """
+        while True:
+            with self.condition:
+                while (
+                    len(self.filled_buffers) >= self.depth and
+                    self.policy == self.BLOCK and
+                    not self.stopped
+                ):
+                    self.condition.wait()
+                if self.stopped:
+                    break
+
+                if len(self.filled_buffers) >= self.depth:
+                    # Drop the oldest frame the consumer has not read yet
+                    _, dropped_buffer_idx = self.filled_buffers.popleft()
+                    if dropped_buffer_idx is not None:
+                        self.free_buffers.append(dropped_buffer_idx)
+                    self.frames_dropped += 1
+
+                frame_number = self.next_frame_number
+                retrieve = (
+                    self.retrieve_filter is None or
+                    self.retrieve_filter(frame_number)
+                )
+                # At most depth - 1 queued frames and the held frame own a
+                # buffer, so there is always a free one
+                buffer_idx = self.free_buffers.popleft() if retrieve else None
+
+            # Decode outside the lock, into the buffer no one else owns
+            if retrieve:
+                success, frame = self.capture.read(
+                    self.frame_buffers[buffer_idx]
+                )
+            else:
+                success, frame = self.capture.grab(), None
+
+            with self.condition:
+                if success:
+                    if retrieve:
+                        self.frame_buffers[buffer_idx] = frame
+                        self.frames_decoded += 1
+                    else:
+                        self.frames_grabbed += 1
+                    self.filled_buffers.append((frame_number, buffer_idx))
+                    self.next_frame_number += 1
+                else:
+                    if buffer_idx is not None:
+                        self.free_buffers.append(buffer_idx)
+                    self.failed_reads += 1
+                    if not self.is_live:
+                        self.finished = True
+                self.condition.notify_all()
+                if self.finished:
+                    break
+
+    def read(self) -> Tuple[bool, Optional[numpy.ndarray]]:
+        """
+        Return the next frame as (success, frame), like
+        cv2.VideoCapture.read. Waits for the decoder if no frame is ready.
+        Frames excluded by the retrieve filter are returned as (True, None).
+        """
+        self.start()
+
+        with self.condition:
+            if self.held_buffer is not None:
+                self.free_buffers.append(self.held_buffer)
+                self.held_buffer = None
+                self.condition.notify_all()
+
+            if not self.filled_buffers and not self.finished:
+                self.consumer_stalls += 1
+                stall_start = time.perf_counter()
+                while not self.filled_buffers and not self.finished:
+                    self.condition.wait()
+                self.consumer_stall_time += time.perf_counter() - stall_start
+
+            if not self.filled_buffers:
+                return False, None
+
+            frame_number, buffer_idx = self.filled_buffers.popleft()
+            self.held_buffer = buffer_idx
+            self.last_frame_number = frame_number
+            self.frames_read += 1
+            self.condition.notify_all()
+
+            if buffer_idx is None:
+                return True, None
+            return True, self.frame_buffers[buffer_idx]
+
+    def isOpened(self) -> bool:
+        with self.condition:
+            has_frames = bool(self.filled_buffers) or not self.finished
+        return has_frames and self.capture.isOpened()
+
+    def get(self, property_id: int) -> float:
+        return self.capture.get(property_id)
+
+    def release(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.capture.release()
+        logger.info(f'Prefetch reader stats: {self.get_stats()}')
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Return the counters of the reader. The consumer stall rate is the
+        fraction of reads that had to wait for the decoder.
+        """
+        frames_read = max(self.frames_read, 1)
+        return {
+            'frames_decoded': self.frames_decoded,
+            'frames_read': self.frames_read,
+            'frames_dropped': self.frames_dropped,
+            'frames_grabbed': self.frames_grabbed,
+            'failed_reads': self.failed_reads,
+            'consumer_stalls': self.consumer_stalls,
+            'consumer_stall_rate': self.consumer_stalls / frames_read,
+            'consumer_stall_time_s': round(self.consumer_stall_time, 4),
+        }
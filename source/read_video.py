@@ -1,10 +1,33 @@
 from pathlib import Path
+from typing import Callable, Optional, Tuple, Union
+import logging
 
 import cv2
+import numpy
+
+from source.frame_reader import PrefetchVideoReader
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+# create handler
+c_handler = logging.StreamHandler()
+# create formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+# add formatter to ch
+c_handler.setFormatter(formatter)
+# Add handler to logger
+logger.addHandler(c_handler)
 
 
 class VideoSource:
 
+    # Frames to seek back before the target when the backend does not land
+    # on the requested frame, it should cover the keyframe interval
+    SEEK_KEYFRAME_BACKOFF = 300
+
     def __init__(self, source_path: Path, source_folder: str) -> None:
         self.source_folder = source_folder
         self.source_path = source_path
@@ -34,6 +57,154 @@ class VideoSource:
             video_source = str(self.source_path)
         return cv2.VideoCapture(video_source)
 
+    def get_prefetch_reader(
+            self,
+            ocv_video_capture: Optional[cv2.VideoCapture] = None,
+            depth: int = 4,
+            policy: Optional[str] = None,
+            start_frame: int = 0,
+            retrieve_filter: Optional[Callable[[int], bool]] = None
+    ) -> PrefetchVideoReader:
+        """
+        Wrap the video capture in a reader that decodes frames in a background
+        thread. By default live cameras drop the oldest frames when the
+        consumer falls behind, while files block the decoder.
+        """
+        if ocv_video_capture is None:
+            ocv_video_capture = self.get_ocv_video_capture()
+
+        is_live = self.source_path == 0
+        if policy is None:
+            policy = (
+                PrefetchVideoReader.DROP_OLDEST if is_live
+                else PrefetchVideoReader.BLOCK
+            )
+
+        return PrefetchVideoReader(
+            ocv_video_capture=ocv_video_capture,
+            depth=depth,
+            policy=policy,
+            is_live=is_live,
+            start_frame=start_frame,
+            retrieve_filter=retrieve_filter
+        )
+
+    def seek_to_frame(
+            self,
+            ocv_video_capture: cv2.VideoCapture,
+            frame_number: int
+    ) -> int:
+        """
+        Move the capture so that the next read returns frame_number, without
+        decoding the frames before it. Returns the number of the frame the
+        next read will return.
+
+        The capture seeks to the frame before the target and grabs it, the
+        seek is verified with the decoded timestamp of that frame
+        (CAP_PROP_POS_MSEC), as many backends only echo the position that was
+        set. If it landed before the target (e.g. on a keyframe) the capture
+        grabs forward without decoding, if it landed after it the capture is
+        moved a keyframe interval before the target. Live cameras and videos
+        without a frame rate cannot be verified, so they grab the frames.
+        """
+        if frame_number <= 0:
+            return 0
+
+        fps = 0.0
+        if self.source_path != 0:
+            fps = ocv_video_capture.get(cv2.CAP_PROP_FPS)
+
+        position = 0
+        if fps > 0:
+            seek_target = frame_number - 1
+            ocv_video_capture.set(cv2.CAP_PROP_POS_FRAMES, seek_target)
+            grabbed_frame = self.grab_frame_number(
+                ocv_video_capture=ocv_video_capture,
+                fps=fps
+            )
+            if grabbed_frame is not None and grabbed_frame > seek_target:
+                logger.info(
+                    f'Seek to frame {frame_number} landed after it, on '
+                    f'{grabbed_frame + 1}, correcting'
+                )
+                ocv_video_capture.set(
+                    cv2.CAP_PROP_POS_FRAMES,
+                    max(0, frame_number - self.SEEK_KEYFRAME_BACKOFF)
+                )
+                grabbed_frame = self.grab_frame_number(
+                    ocv_video_capture=ocv_video_capture,
+                    fps=fps
+                )
+
+            if grabbed_frame is None or grabbed_frame > seek_target:
+                # The backend can not seek reliably, start from the beginning
+                ocv_video_capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            else:
+                if grabbed_frame < seek_target:
+                    logger.info(
+                        f'Seek to frame {frame_number} landed on '
+                        f'{grabbed_frame + 1}, grabbing forward'
+                    )
+                position = grabbed_frame + 1
+        elif self.source_path != 0:
+            ocv_video_capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+        while position < frame_number:
+            if not ocv_video_capture.grab():
+                break
+            position += 1
+
+        return position
+
+    @staticmethod
+    def grab_frame_number(
+            ocv_video_capture: cv2.VideoCapture,
+            fps: float
+    ) -> Optional[int]:
+        """
+        Grab the next frame without decoding it into an image and return its
+        number from its timestamp, or None at the end of the video.
+        """
+        if not ocv_video_capture.grab():
+            return None
+        frame_msec = ocv_video_capture.get(cv2.CAP_PROP_POS_MSEC)
+        return max(0, int(round(frame_msec * fps / 1000)))
+
+    @staticmethod
+    def read_frame(
+            ocv_video_capture: Union[cv2.VideoCapture, PrefetchVideoReader],
+            retrieve: bool = True
+    ) -> Tuple[bool, Optional[numpy.ndarray]]:
+        """
+        Read the next frame as (success, frame). When retrieve is False the
+        frame is only grabbed, skipping the decoding into an image, and it is
+        returned as (success, None). Readers (prefetch and shared frame
+        readers) decide it with their own retrieve filter.
+        """
+        if retrieve or not isinstance(ocv_video_capture, cv2.VideoCapture):
+            return ocv_video_capture.read()
+        return ocv_video_capture.grab(), None
+
+    @staticmethod
+    def read_frame_into(
+            ocv_video_capture: cv2.VideoCapture,
+            frame_buffer: numpy.ndarray
+    ) -> bool:
+        """
+        Decode the next frame straight into frame_buffer (e.g. a shared
+        memory slot). OpenCV only reuses the buffer if it has the shape and
+        type of the frame, otherwise the frame is copied into it.
+        """
+        success, frame = ocv_video_capture.read(frame_buffer)
+        if success and frame is not frame_buffer:
+            if frame.shape != frame_buffer.shape:
+                raise ValueError(
+                    f'Frame of shape {frame.shape} does not fit in a buffer '
+                    f'of shape {frame_buffer.shape}'
+                )
+            frame_buffer[...] = frame
+        return success
+
     def create_ocv_video_output(
             self,
             ocv_video_capture: cv2.VideoCapture,
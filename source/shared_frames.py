@@ -0,0 +1,454 @@
+import cv2
+import numpy
+
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import multiprocessing
+import os
+import queue
+import time
+
+from source.read_video import VideoSource
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+# create handler
+c_handler = logging.StreamHandler()
+# create formatter
+formatter = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+# add formatter to ch
+c_handler.setFormatter(formatter)
+# Add handler to logger
+logger.addHandler(c_handler)
+
+
+class FrameSlotMetadata:
+    """
+    What travels through the queues of a SharedFramePool with the index of
+    the slot that holds the frame (the frame itself never does):
+
+    - frame_number and timestamp (time.time() when it was decoded).
+    - scale_ratio and diff_padds of the letterbox, once the frame is
+    preprocessed, for the stages after the model.
+    - retrieved: False for frames that were only grabbed, without a slot.
+    """
+
+    __slots__ = (
+        'frame_number',
+        'timestamp',
+        'scale_ratio',
+        'diff_padds',
+        'retrieved',
+    )
+
+    def __init__(
+            self,
+            frame_number: int,
+            timestamp: float,
+            scale_ratio: Optional[float] = None,
+            diff_padds: Optional[Tuple[float, float]] = None,
+            retrieved: bool = True
+    ) -> None:
+        self.frame_number = frame_number
+        self.timestamp = timestamp
+        self.scale_ratio = scale_ratio
+        self.diff_padds = diff_padds
+        self.retrieved = retrieved
+
+    def __getstate__(self):
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    def __setstate__(self, state):
+        for field, value in zip(self.__slots__, state):
+            setattr(self, field, value)
+
+
+class SharedFramePool:
+    """
+    Fixed-size frame slots in one multiprocessing.shared_memory block, to
+    pass frames between processes without pickling them. The processes
+    exchange slot indices and FrameSlotMetadata only.
+
+    Ownership of a slot:
+
+    FREE -> acquire (producer) -> WRITING -> publish -> READY
+         -> receive (consumer) -> READING -> release -> FREE
+
+    Only the owner of a slot touches its memory. The free slots and the
+    published slots wait in two multiprocessing queues, so a producer
+    blocks when every slot is in use (backpressure). The state of each
+    slot is kept in the shared block and checked on every transition.
+
+    The pool is created by one process (the owner, which unlinks the
+    block) and passed to the others, which attach to the block by name.
+    """
+
+    FREE = 0
+    WRITING = 1
+    READY = 2
+    READING = 3
+    STATES_NAMES = ('free', 'writing', 'ready', 'reading')
+
+    # Slots start at a cache line boundary after the slots states
+    SLOTS_ALIGNMENT = 64
+
+    def __init__(
+            self,
+            n_slots: int,
+            frame_shape: Tuple[int, ...],
+            dtype=numpy.uint8,
+            mp_context: Optional[multiprocessing.context.BaseContext] = None
+    ) -> None:
+        if n_slots < 1:
+            raise ValueError(f'Pool slots must be positive, got {n_slots}')
+        mp_context = mp_context or multiprocessing.get_context()
+
+        self.n_slots = n_slots
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = numpy.dtype(dtype)
+        self.slot_nbytes = (
+            int(numpy.prod(self.frame_shape)) * self.dtype.itemsize
+        )
+        self.slots_offset = self.compute_slots_offset(n_slots=n_slots)
+
+        self.shared_memory = shared_memory.SharedMemory(
+            create=True,
+            size=self.slots_offset + n_slots * self.slot_nbytes
+        )
+        # Forked processes get a copy of the pool, ownership follows the pid
+        self.owner_pid = os.getpid()
+
+        self.free_slots = mp_context.Queue()
+        self.ready_slots = mp_context.Queue()
+        for slot_idx in range(n_slots):
+            self.free_slots.put(slot_idx)
+
+        self.attach_views()
+        self.slots_states[:] = self.FREE
+
+    @classmethod
+    def compute_slots_offset(cls, n_slots: int) -> int:
+        return (
+            (n_slots + cls.SLOTS_ALIGNMENT - 1) //
+            cls.SLOTS_ALIGNMENT * cls.SLOTS_ALIGNMENT
+        )
+
+    def attach_views(self):
+        self.slots_states = numpy.ndarray(
+            (self.n_slots,),
+            dtype=numpy.int8,
+            buffer=self.shared_memory.buf
+        )
+        self.slots: List[numpy.ndarray] = [
+            numpy.ndarray(
+                self.frame_shape,
+                dtype=self.dtype,
+                buffer=self.shared_memory.buf,
+                offset=self.slots_offset + slot_idx * self.slot_nbytes
+            )
+            for slot_idx in range(self.n_slots)
+        ]
+
+    def __getstate__(self) -> Dict:
+        # Other processes attach to the block by its name
+        return {
+            'n_slots': self.n_slots,
+            'frame_shape': self.frame_shape,
+            'dtype': self.dtype,
+            'slot_nbytes': self.slot_nbytes,
+            'slots_offset': self.slots_offset,
+            'owner_pid': self.owner_pid,
+            'shared_memory_name': self.shared_memory.name,
+            'free_slots': self.free_slots,
+            'ready_slots': self.ready_slots,
+        }
+
+    def __setstate__(self, state: Dict):
+        shared_memory_name = state.pop('shared_memory_name')
+        self.__dict__.update(state)
+        self.shared_memory = shared_memory.SharedMemory(
+            name=shared_memory_name
+        )
+        self.attach_views()
+
+    def get_slot(self, slot_idx: int) -> numpy.ndarray:
+        """
+        The frame array of the slot, a view of the shared memory.
+        """
+        return self.slots[slot_idx]
+
+    def set_slot_state(self, slot_idx: int, expected: int, new: int):
+        state = int(self.slots_states[slot_idx])
+        if state != expected:
+            raise RuntimeError(
+                f'Frame slot {slot_idx} is '
+                f'{self.STATES_NAMES[state]}, expecting '
+                f'{self.STATES_NAMES[expected]}'
+            )
+        self.slots_states[slot_idx] = new
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        Producer: take a free slot to write a frame in it. Returns None if
+        no slot was freed within timeout.
+        """
+        try:
+            slot_idx = self.free_slots.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        self.set_slot_state(slot_idx, expected=self.FREE, new=self.WRITING)
+        return slot_idx
+
+    def publish(
+        self,
+        slot_idx: Optional[int],
+        metadata: FrameSlotMetadata
+    ):
+        """
+        Producer: hand the written slot to the consumers. Frames that were
+        not retrieved are published without a slot (slot_idx None).
+        """
+        if slot_idx is not None:
+            self.set_slot_state(
+                slot_idx,
+                expected=self.WRITING,
+                new=self.READY
+            )
+        self.ready_slots.put((slot_idx, metadata))
+
+    def cancel(self, slot_idx: int):
+        """
+        Producer: give back an acquired slot that was not written.
+        """
+        self.set_slot_state(slot_idx, expected=self.WRITING, new=self.FREE)
+        self.free_slots.put(slot_idx)
+
+    def end(self):
+        """
+        Producer: no more frames, receive returns None after the last one.
+        """
+        self.ready_slots.put(None)
+
+    def receive(
+        self,
+        timeout: Optional[float] = None
+    ) -> Optional[Tuple[Optional[int], FrameSlotMetadata]]:
+        """
+        Consumer: take the next published slot as (slot index, metadata),
+        None at the end of the frames. Raises queue.Empty on timeout.
+        """
+        item = self.ready_slots.get(timeout=timeout)
+        if item is None:
+            return None
+        slot_idx, metadata = item
+        if slot_idx is not None:
+            self.set_slot_state(
+                slot_idx,
+                expected=self.READY,
+                new=self.READING
+            )
+        return slot_idx, metadata
+
+    def release(self, slot_idx: int):
+        """
+        Consumer: the frame of the slot is not used anymore.
+        """
+        self.set_slot_state(slot_idx, expected=self.READING, new=self.FREE)
+        self.free_slots.put(slot_idx)
+
+    def close(self):
+        # The views must be gone before the shared memory is closed
+        self.slots = []
+        self.slots_states = None
+        self.shared_memory.close()
+        if os.getpid() == self.owner_pid:
+            self.shared_memory.unlink()
+            self.free_slots.close()
+            self.ready_slots.close()
+
+
+class SharedFrameReader:
+    """
+    Decodes a video source in a separate process into a SharedFramePool,
+    and offers the subset of the cv2.VideoCapture API used by main.py, like
+    PrefetchVideoReader.
+
+    The decoding process writes each frame straight into a slot
+    (VideoSource.read_frame_into) and read() returns the slot as a view,
+    so ONNXModel.preprocess_input letterboxes it without any copy. The
+    frame returned by read() is only valid until the next call to read().
+
+    retrieve_filter must be picklable (e.g. a functools.partial of a
+    function), frames it rejects are only grabbed and read() returns them
+    as (True, None).
+    """
+
+    # Seconds between the checks of the stop event while waiting
+    WAIT_STEP_S = 0.1
+
+    def __init__(
+            self,
+            video_source: VideoSource,
+            ocv_video_capture: cv2.VideoCapture,
+            n_slots: int = 4,
+            start_frame: int = 0,
+            retrieve_filter: Optional[Callable[[int], bool]] = None
+    ) -> None:
+        # The capture of this process is only used for its properties, the
+        # decoding process opens its own
+        self.video_source = video_source
+        self.capture = ocv_video_capture
+        self.start_frame = start_frame
+        self.retrieve_filter = retrieve_filter
+
+        frame_shape = (
+            int(ocv_video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            int(ocv_video_capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            3
+        )
+        self.frame_pool = SharedFramePool(
+            n_slots=n_slots,
+            frame_shape=frame_shape
+        )
+        self.stop_event = multiprocessing.Event()
+        self.process = None
+
+        self.held_slot = None
+        self.finished = False
+        self.last_frame_number = None
+        self.last_metadata = None
+        self.frames_read = 0
+        self.consumer_stall_time = 0.0
+
+    def start(self):
+        if self.process is None:
+            self.process = multiprocessing.Process(
+                target=self.decode_frames,
+                args=(
+                    self.video_source,
+                    self.frame_pool,
+                    self.stop_event,
+                    self.start_frame,
+                    self.retrieve_filter,
+                ),
+                name='SharedFrameReader',
+                daemon=True
+            )
+            self.process.start()
+
+    @classmethod
+    def decode_frames(
+        cls,
+        video_source: VideoSource,
+        frame_pool: SharedFramePool,
+        stop_event,
+        start_frame: int,
+        retrieve_filter: Optional[Callable[[int], bool]]
+    ):
+        """
+        Decoding process loop.
+        """
+        cap = video_source.get_ocv_video_capture()
+        frame_number = video_source.seek_to_frame(
+            ocv_video_capture=cap,
+            frame_number=start_frame
+        )
+        try:
+            while not stop_event.is_set():
+                retrieve = (
+                    retrieve_filter is None or retrieve_filter(frame_number)
+                )
+                slot_idx = None
+                if retrieve:
+                    slot_idx = frame_pool.acquire(timeout=cls.WAIT_STEP_S)
+                    if slot_idx is None:
+                        continue
+                    success = VideoSource.read_frame_into(
+                        ocv_video_capture=cap,
+                        frame_buffer=frame_pool.get_slot(slot_idx)
+                    )
+                else:
+                    success = cap.grab()
+
+                if not success:
+                    if slot_idx is not None:
+                        frame_pool.cancel(slot_idx)
+                    if video_source.source_path != 0:
+                        break
+                    continue
+
+                frame_pool.publish(
+                    slot_idx=slot_idx,
+                    metadata=FrameSlotMetadata(
+                        frame_number=frame_number,
+                        timestamp=time.time(),
+                        retrieved=retrieve
+                    )
+                )
+                frame_number += 1
+        finally:
+            frame_pool.end()
+            cap.release()
+            frame_pool.close()
+
+    def read(self) -> Tuple[bool, Optional[numpy.ndarray]]:
+        self.start()
+
+        if self.held_slot is not None:
+            self.frame_pool.release(self.held_slot)
+            self.held_slot = None
+        if self.finished:
+            return False, None
+
+        stall_start = time.perf_counter()
+        item = self.frame_pool.receive()
+        self.consumer_stall_time += time.perf_counter() - stall_start
+        if item is None:
+            self.finished = True
+            return False, None
+
+        slot_idx, metadata = item
+        self.last_frame_number = metadata.frame_number
+        self.last_metadata = metadata
+        self.frames_read += 1
+        if slot_idx is None:
+            return True, None
+        self.held_slot = slot_idx
+        return True, self.frame_pool.get_slot(slot_idx)
+
+    def isOpened(self) -> bool:
+        return not self.finished
+
+    def get(self, property_id: int) -> float:
+        return self.capture.get(property_id)
+
+    def release(self):
+        self.stop_event.set()
+        if self.process is not None:
+            # Free the slots so the decoding process is not kept waiting
+            while self.process.is_alive():
+                try:
+                    item = self.frame_pool.receive(timeout=self.WAIT_STEP_S)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    break
+                if item[0] is not None:
+                    self.frame_pool.release(item[0])
+            self.process.join()
+        self.held_slot = None
+        self.frame_pool.close()
+        self.capture.release()
+        logger.info(f'Shared frame reader stats: {self.get_stats()}')
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            'frames_read': self.frames_read,
+            'slots': self.frame_pool.n_slots,
+            'slot_mb': round(self.frame_pool.slot_nbytes / 2 ** 20, 2),
+            'consumer_stall_time_s': round(self.consumer_stall_time, 4),
+        }
@@ -1,6 +1,8 @@
 import cv2
 import numpy
 
+from typing import Optional, Tuple
+
 
 class ImageUtils:
     def __init__(self) -> None:
@@ -51,19 +53,17 @@ class ImageUtils:
         return cv2.cvtColor(image_array, opencv_color_space)
 
     @staticmethod
-    def resize_image_get_scale_padds(
-        image_array: numpy.array,
+    def compute_letterbox_geometry(
+        image_shape: Tuple[int, int],
         output_shape=(640, 640),
     ):
         """
-        This method returns the image resized (I), along with the scale ratio
-        (R) and the difference padding width (PW) and height (PH) as a
-        tuple (I, R, (PW, PH)). The last two elements are useful when trying
-        to get the image back to the original size.
+        Compute the letterbox geometry used to fit an image of shape
+        image_shape (height, width) inside output_shape. Returns a tuple
+        (R, (NH, NW), (T, B, L, R), (PW, PH)) with the scale ratio, the size
+        of the resized image, the border of each side and the difference
+        padding width and height.
         """
-        image = image_array.copy()
-
-        image_shape = image.shape[:2]
         image_x = image_shape[0]
         image_y = image_shape[1]
 
@@ -88,32 +88,128 @@ class ImageUtils:
         diff_padding_w = diff_padding_w / 2
         diff_padding_h = diff_padding_h / 2
 
+        new_image_top = int(round(diff_padding_h - 0.1))
+        new_image_bottom = int(round(diff_padding_h + 0.1))
+        new_image_left = int(round(diff_padding_w - 0.1))
+        new_image_right = int(round(diff_padding_w + 0.1))
+
+        return (
+            scale_ratio,
+            (new_image_x, new_image_y),
+            (new_image_top, new_image_bottom, new_image_left, new_image_right),
+            (diff_padding_w, diff_padding_h)
+        )
+
+    @staticmethod
+    def resize_image_get_scale_padds(
+        image_array: numpy.array,
+        output_shape=(640, 640),
+    ):
+        """
+        This method returns the image resized (I), along with the scale ratio
+        (R) and the difference padding width (PW) and height (PH) as a
+        tuple (I, R, (PW, PH)). The last two elements are useful when trying
+        to get the image back to the original size.
+        """
+        image = image_array.copy()
+
+        scale_ratio, new_image_shape, borders, diff_padds = (
+            ImageUtils.compute_letterbox_geometry(
+                image_shape=image.shape[:2],
+                output_shape=output_shape
+            )
+        )
+        new_image_x, new_image_y = new_image_shape
+
         # Check if we need to resize the image
-        if (image_x, image_y) != (new_image_x, new_image_y):
+        if image.shape[:2] != (new_image_x, new_image_y):
             image = cv2.resize(
                 image,
                 (new_image_y, new_image_x),
                 interpolation=cv2.INTER_LINEAR
             )
 
-        new_image_top = int(round(diff_padding_h - 0.1))
-        new_image_bottom = int(round(diff_padding_h + 0.1))
-        new_image_left = int(round(diff_padding_w - 0.1))
-        new_image_right = int(round(diff_padding_w + 0.1))
-
         image = cv2.copyMakeBorder(
             image,
-            new_image_top,
-            new_image_bottom,
-            new_image_left,
-            new_image_right,
+            *borders,
             cv2.BORDER_CONSTANT,
             value=(114, 114, 114)   # Random color (gray)
         )
 
         # We return all the extra values to resize the inference results back
         # to the original image
-        return image, scale_ratio, (diff_padding_w, diff_padding_h)
+        return image, scale_ratio, diff_padds
+
+    @staticmethod
+    def letterbox_normalize_into(
+        image_array: numpy.array,
+        output_buffer: numpy.ndarray,
+        resize_buffer: Optional[numpy.ndarray] = None,
+        padding_value=114,
+        max_val=255,
+    ):
+        """
+        Fused version of convert_image_channels, resize_image_get_scale_padds,
+        reshape_img_dims and normalize_image. The BGR image is resized once
+        and written as a RGB, CHW and float32 normalized tensor straight into
+        output_buffer, which must have shape (3, H, W) or (1, 3, H, W).
+
+        - resize_buffer: Optional uint8 array of shape (NH, NW, 3) where the
+        resized image is written. If it does not match the resized shape a
+        new array is allocated by OpenCV.
+
+        Returns the scale ratio (R) and the difference padding (PW, PH) as a
+        tuple (R, (PW, PH)), identical to resize_image_get_scale_padds.
+        """
+        if output_buffer.ndim == 4:
+            output_buffer = output_buffer[0]
+        output_shape = output_buffer.shape[1:]
+
+        scale_ratio, new_image_shape, borders, diff_padds = (
+            ImageUtils.compute_letterbox_geometry(
+                image_shape=image_array.shape[:2],
+                output_shape=output_shape
+            )
+        )
+        new_image_x, new_image_y = new_image_shape
+        top, bottom, left, right = borders
+
+        if image_array.shape[:2] != (new_image_x, new_image_y):
+            if (
+                resize_buffer is None or
+                resize_buffer.shape != (new_image_x, new_image_y, 3)
+            ):
+                resize_buffer = None
+            resized_image = cv2.resize(
+                image_array,
+                (new_image_y, new_image_x),
+                dst=resize_buffer,
+                interpolation=cv2.INTER_LINEAR
+            )
+        else:
+            resized_image = image_array
+
+        # Fill only the borders with the padding color, the rest of the
+        # buffer is overwritten by the resized image
+        padding_norm = numpy.float32(padding_value) / numpy.float32(max_val)
+        output_buffer[:, :top, :] = padding_norm
+        output_buffer[:, output_shape[0] - bottom:, :] = padding_norm
+        output_buffer[:, :, :left] = padding_norm
+        output_buffer[:, :, output_shape[1] - right:] = padding_norm
+
+        # Swap BGR to RGB and HWC to CHW as a view, then cast and normalize
+        # in a single pass into the output buffer
+        numpy.divide(
+            resized_image[:, :, ::-1].transpose(2, 0, 1),
+            numpy.float32(max_val),
+            out=output_buffer[
+                :,
+                top:top + new_image_x,
+                left:left + new_image_y
+            ]
+        )
+
+        return scale_ratio, diff_padds
 
     @staticmethod
     def reshape_img_dims(
@@ -0,0 +1,328 @@
+import numpy
+import pytest
+
+from assigning.assign import AssignPersonHands, DetectionLabel
+from assigning.hand import Hand
+from assigning.person import Person
+from assigning.utils import AssignUtils
+from geometry.boxes import BoxGeometry
+
+
+ALPHA_X = AssignUtils.INSIDE_ALPHA_X
+ALPHA_Y = AssignUtils.INSIDE_ALPHA_Y
+
+PERSONS_BBOXES = numpy.array(
+    [
+        [400, 100, 620, 720],
+        [576, 100, 796, 720],
+        [752, 100, 972, 720],
+        [1200, 100, 1420, 720],
+    ],
+    dtype=numpy.float64
+)
+
+
+def bbox_inside_reference(bbox1, bbox2, alpha_x=ALPHA_X, alpha_y=ALPHA_Y):
+    """
+    Scalar containment check of check_bbox1_inside_bbox2 before it was
+    vectorized.
+    """
+    return bool(
+        bbox1[0] >= (bbox2[0] - alpha_x) and
+        bbox1[1] >= (bbox2[1] - alpha_y) and
+        bbox1[2] <= (bbox2[2] + alpha_x) and
+        bbox1[3] <= (bbox2[3] + alpha_y)
+    )
+
+
+def check_each_hand_inside_each_person_reference(person_objs, hand_objs):
+    """
+    Hand by person loop of check_each_hand_inside_each_person before it was
+    vectorized.
+    """
+    intercepted_hands = set()
+    assignments = []
+    for hand in hand_objs:
+        for person in person_objs:
+            if bbox_inside_reference(hand.bbox_tracking, person.bbox_tracking):
+                hand.add_potential_person_assignment(potential_person=person)
+        if hand.n_potential_assignments > 1:
+            intercepted_hands.add(hand)
+        elif hand.n_potential_assignments == 1:
+            assignments.append((hand, hand.potential_persons[0]))
+    return assignments, intercepted_hands
+
+
+def create_interactions(interaction_cls, bboxes, label, first_id=1):
+    return [
+        interaction_cls(
+            bbox_tracking=bbox,
+            bbox_last_detection=bbox,
+            class_name=label,
+            track_id=first_id + bbox_indx
+        )
+        for bbox_indx, bbox in enumerate(bboxes)
+    ]
+
+
+def create_border_hands_bboxes():
+    """
+    Hands exactly on the expanded border of the first person, and just
+    outside of it, on each side.
+    """
+    x1, y1, x2, y2 = PERSONS_BBOXES[0]
+    return numpy.array(
+        [
+            [x1 - ALPHA_X, 300, x1 - ALPHA_X + 60, 360],
+            [x1 - ALPHA_X - 0.5, 300, x1 - ALPHA_X + 60, 360],
+            [x2 + ALPHA_X - 60, 300, x2 + ALPHA_X, 360],
+            [x2 + ALPHA_X - 60, 300, x2 + ALPHA_X + 0.5, 360],
+            [450, y1 - ALPHA_Y, 510, y1 - ALPHA_Y + 60],
+            [450, y1 - ALPHA_Y - 0.5, 510, y1 - ALPHA_Y + 60],
+            [450, y2 + ALPHA_Y - 60, 510, y2 + ALPHA_Y],
+            [450, y2 + ALPHA_Y - 60, 510, y2 + ALPHA_Y + 0.5],
+        ]
+    )
+
+
+def create_random_hands_bboxes(n_hands, seed=0):
+    rng = numpy.random.default_rng(seed)
+    top_left = rng.uniform(low=[300, 0], high=[1500, 760], size=(n_hands, 2))
+    return numpy.concatenate([top_left, top_left + 60], axis=1)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_check_each_hand_inside_each_person_matches_pairwise(seed):
+    hands_bboxes = numpy.concatenate(
+        [
+            create_border_hands_bboxes(),
+            create_random_hands_bboxes(n_hands=40, seed=seed)
+        ]
+    )
+    # The persons are not sorted by position, the potential persons must
+    # keep the order of the persons list
+    persons_order = numpy.random.default_rng(seed).permutation(
+        len(PERSONS_BBOXES)
+    )
+    persons_bboxes = PERSONS_BBOXES[persons_order]
+
+    expected_matrix = numpy.array(
+        [
+            [
+                AssignUtils.check_bbox1_inside_bbox2(
+                    bbox1=hand_bbox,
+                    bbox2=person_bbox
+                )
+                for person_bbox in persons_bboxes
+            ]
+            for hand_bbox in hands_bboxes
+        ]
+    )
+    reference_matrix = numpy.array(
+        [
+            [
+                bbox_inside_reference(hand_bbox, person_bbox)
+                for person_bbox in persons_bboxes
+            ]
+            for hand_bbox in hands_bboxes
+        ]
+    )
+    hands_inside_persons = BoxGeometry.containment(
+        bboxes1=hands_bboxes,
+        bboxes2=persons_bboxes,
+        alpha_x=ALPHA_X,
+        alpha_y=ALPHA_Y
+    )
+    numpy.testing.assert_array_equal(expected_matrix, reference_matrix)
+    numpy.testing.assert_array_equal(hands_inside_persons, reference_matrix)
+    # The border hands are inside on the border and outside past it
+    assert reference_matrix[:8, persons_order.tolist().index(0)].tolist() == (
+        [True, False] * 4
+    )
+    # Some hands are intercepted by two persons
+    assert (reference_matrix.sum(axis=1) > 1).any()
+
+    reference_persons = create_interactions(
+        Person, persons_bboxes, DetectionLabel.PERSON
+    )
+    reference_hands = create_interactions(
+        Hand, hands_bboxes, DetectionLabel.HAND
+    )
+    reference_assignments, reference_intercepted = (
+        check_each_hand_inside_each_person_reference(
+            person_objs=reference_persons,
+            hand_objs=reference_hands
+        )
+    )
+
+    for pass_bboxes in (False, True):
+        persons = create_interactions(
+            Person, persons_bboxes, DetectionLabel.PERSON
+        )
+        hands = create_interactions(Hand, hands_bboxes, DetectionLabel.HAND)
+        assignments, intercepted_hands = (
+            AssignPersonHands.check_each_hand_inside_each_person(
+                person_objs=persons,
+                hand_objs=hands,
+                persons_bboxes=persons_bboxes if pass_bboxes else None,
+                hands_bboxes=hands_bboxes if pass_bboxes else None
+            )
+        )
+
+        assert [
+            (hand.track_id, person.track_id) for hand, person in assignments
+        ] == [
+            (hand.track_id, person.track_id)
+            for hand, person in reference_assignments
+        ]
+        assert {hand.track_id for hand in intercepted_hands} == {
+            hand.track_id for hand in reference_intercepted
+        }
+        for hand, reference_hand in zip(hands, reference_hands):
+            assert [
+                person.track_id for person in hand.potential_persons
+            ] == [
+                person.track_id for person in reference_hand.potential_persons
+            ]
+
+
+def iou_reference(bbox1, bbox2):
+    """
+    Scalar IoU of compute_iou before it was vectorized.
+    """
+    inter_width = min(bbox1[2], bbox2[2]) - max(bbox1[0], bbox2[0]) + 1
+    inter_height = min(bbox1[3], bbox2[3]) - max(bbox1[1], bbox2[1]) + 1
+    inter_area = max(0, inter_width) * max(0, inter_height)
+    bbox1_area = (bbox1[2] - bbox1[0] + 1) * (bbox1[3] - bbox1[1] + 1)
+    bbox2_area = (bbox2[2] - bbox2[0] + 1) * (bbox2[3] - bbox2[1] + 1)
+    return inter_area / float(bbox1_area + bbox2_area - inter_area)
+
+
+def compute_score_reference(
+    intercepted_hands,
+    intercepted_persons,
+    prev_assignments
+):
+    """
+    Person, hand and previous assignment loop of
+    compute_score_intercepted_hands_persons before it was vectorized.
+    """
+    score_matrix = numpy.zeros(
+        (len(intercepted_hands), len(intercepted_persons))
+    )
+    for person_indx, person in enumerate(intercepted_persons):
+        for hand_indx, hand in enumerate(intercepted_hands):
+            hand_scores_for_a_person = []
+            for prev_hand, prev_person in prev_assignments:
+                same_track_ids = (
+                    hand.track_id == prev_hand.track_id and
+                    person.track_id == prev_person.track_id
+                )
+                hand_scores_for_a_person.append(
+                    AssignPersonHands.WEIGHT_SAME_ID * same_track_ids +
+                    AssignPersonHands.WEIGHT_HANDS * iou_reference(
+                        hand.bbox_tracking, prev_hand.bbox_tracking
+                    ) +
+                    AssignPersonHands.WEIGHT_PERSON * iou_reference(
+                        person.bbox_tracking, prev_person.bbox_tracking
+                    )
+                )
+            score_matrix[hand_indx, person_indx] = max(
+                hand_scores_for_a_person
+            )
+    return score_matrix
+
+
+def compute_score(intercepted_hands, intercepted_persons, **kwargs):
+    return AssignPersonHands.compute_score_intercepted_hands_persons(
+        intercepted_hands=intercepted_hands,
+        intercepted_persons=intercepted_persons,
+        weight_hand=AssignPersonHands.WEIGHT_HANDS,
+        weight_person=AssignPersonHands.WEIGHT_PERSON,
+        weight_same_id=AssignPersonHands.WEIGHT_SAME_ID,
+        **kwargs
+    )
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_compute_score_intercepted_hands_persons_matches_loop(seed):
+    rng = numpy.random.default_rng(seed)
+    hands = create_interactions(
+        Hand,
+        create_random_hands_bboxes(n_hands=5, seed=seed),
+        DetectionLabel.HAND
+    )
+    persons = create_interactions(
+        Person, PERSONS_BBOXES, DetectionLabel.PERSON
+    )
+
+    # Previous assignments moved a few pixels, with the same track ids for
+    # some hands and persons and new ids for the others
+    prev_hands = create_interactions(
+        Hand,
+        create_random_hands_bboxes(n_hands=5, seed=seed) +
+        rng.normal(0, 8, size=(5, 4)),
+        DetectionLabel.HAND,
+        first_id=3
+    )
+    prev_persons = create_interactions(
+        Person,
+        PERSONS_BBOXES[rng.permutation(len(PERSONS_BBOXES))] +
+        rng.normal(0, 8, size=PERSONS_BBOXES.shape),
+        DetectionLabel.PERSON
+    )
+    prev_assignments = list(zip(prev_hands, prev_persons))
+
+    expected_matrix = compute_score_reference(
+        intercepted_hands=hands,
+        intercepted_persons=persons,
+        prev_assignments=prev_assignments
+    )
+    # Some pairs get the same id weight and some overlap previous bboxes
+    assert (expected_matrix >= AssignPersonHands.WEIGHT_SAME_ID).any()
+    assert (expected_matrix > 0).any()
+
+    score_matrix = compute_score(
+        intercepted_hands=hands,
+        intercepted_persons=persons,
+        prev_assignments=prev_assignments
+    )
+    numpy.testing.assert_allclose(score_matrix, expected_matrix, rtol=1e-12)
+
+    snapshot_score_matrix = compute_score(
+        intercepted_hands=hands,
+        intercepted_persons=persons,
+        prev_assignments=prev_assignments,
+        prev_assignments_snapshot=AssignPersonHands.snapshot_assignments(
+            assignments=prev_assignments
+        )
+    )
+    numpy.testing.assert_allclose(
+        snapshot_score_matrix, expected_matrix, rtol=1e-12
+    )
+
+
+def test_compute_score_intercepted_hands_persons_without_history():
+    # Without previous assignments the score is the distance between the
+    # centers of the hand and the person, the weights are not used
+    hands = create_interactions(
+        Hand,
+        numpy.array([[0, 0, 60, 60], [180, 240, 240, 300]]),
+        DetectionLabel.HAND
+    )
+    persons = create_interactions(
+        Person,
+        numpy.array([[-20, -200, 200, 420], [220, 120, 440, 740]]),
+        DetectionLabel.PERSON
+    )
+
+    for prev_assignments in (None, []):
+        score_matrix = compute_score(
+            intercepted_hands=hands,
+            intercepted_persons=persons,
+            prev_assignments=prev_assignments
+        )
+        numpy.testing.assert_allclose(
+            score_matrix,
+            [[100.0, 500.0], [200.0, 200.0]]
+        )
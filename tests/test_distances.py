@@ -0,0 +1,153 @@
+import logging
+
+from norfair.distances import get_distance_by_name
+import numpy
+import pytest
+
+from assigning.assign import DetectionLabel
+from benchmarks.synthetic import SyntheticDetectionStream
+from tracking.distances import VectorizedIoUDistance
+from tracking.norfair_tracker import NorfairTracker
+
+
+@pytest.fixture(autouse=True)
+def disable_norfair_warnings():
+    # norfair warns about every bbox with zero area
+    logging.disable(logging.WARNING)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def iter_objects_and_detections(n_frames=120, seed=0, labels=None):
+    """
+    Yield the tracked objects of a tracker with norfair's 'iou' distance and
+    the detections of the next frame, on a synthetic stream. labels keeps
+    the predictions of those labels only.
+    """
+    stream = SyntheticDetectionStream(n_persons=3, n_products=12, seed=seed)
+    tracker = NorfairTracker.create_tracker(
+        initialization_delay=3,
+        distance_threshold=2,
+        hit_counter_max=10,
+        vectorized_iou=False
+    )
+    for _, predictions in stream.iter_frames(n_frames=n_frames):
+        if labels is not None:
+            predictions = predictions[numpy.isin(predictions[:, 4], labels)]
+        detections = NorfairTracker.convert_predictions_to_norfair(
+            predictions=predictions
+        )
+        yield tracker.tracked_objects, detections
+        tracker.update(detections=detections)
+
+
+def assert_same_distances(objects, candidates):
+    builtin_matrix = get_distance_by_name('iou').get_distances(
+        objects, candidates
+    )
+    vectorized_matrix = VectorizedIoUDistance().get_distances(
+        objects, candidates
+    )
+
+    assert vectorized_matrix.shape == builtin_matrix.shape
+    builtin_inf = numpy.isinf(builtin_matrix)
+    numpy.testing.assert_array_equal(
+        numpy.isinf(vectorized_matrix),
+        builtin_inf
+    )
+    numpy.testing.assert_allclose(
+        vectorized_matrix[~builtin_inf],
+        builtin_matrix[~builtin_inf],
+        rtol=0,
+        atol=1e-6
+    )
+    return builtin_matrix
+
+
+@pytest.mark.parametrize(
+    'labels',
+    [
+        None,
+        [DetectionLabel.PERSON],
+        [DetectionLabel.PRODUCT_A, DetectionLabel.PRODUCT_B],
+    ],
+    ids=['mixed-labels', 'single-label', 'two-labels']
+)
+def test_vectorized_iou_distance_matches_norfair(labels):
+    n_finite = 0
+    for objects, detections in iter_objects_and_detections(labels=labels):
+        if not objects or not detections:
+            continue
+        # Detections and tracked objects are both candidates in norfair
+        builtin_matrix = assert_same_distances(
+            objects=objects,
+            candidates=detections
+        )
+        assert_same_distances(objects=objects, candidates=objects)
+        n_finite += numpy.isfinite(builtin_matrix).sum()
+
+    assert n_finite > 0
+
+
+def test_vectorized_iou_distance_without_objects_or_candidates():
+    objects, detections = next(
+        (objects, detections)
+        for objects, detections in iter_objects_and_detections()
+        if objects and detections
+    )
+
+    for objects, candidates in (
+        (objects, []),
+        ([], detections),
+        ([], []),
+    ):
+        assert_same_distances(objects=objects, candidates=candidates)
+
+
+def get_tracked_state(tracked_objects):
+    return sorted(
+        (
+            tracked_object.id,
+            tracked_object.label,
+            tuple(tracked_object.estimate.ravel().round(6))
+        )
+        for tracked_object in tracked_objects
+    )
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_vectorized_iou_trackers_give_the_same_tracks(seed):
+    stream = SyntheticDetectionStream(n_persons=4, n_products=32, seed=seed)
+    builtin_tracker, vectorized_tracker = [
+        NorfairTracker.create_tracker(
+            initialization_delay=5,
+            distance_threshold=2,
+            hit_counter_max=10,
+            vectorized_iou=vectorized_iou
+        )
+        for vectorized_iou in (False, True)
+    ]
+    assert isinstance(
+        vectorized_tracker.distance_function,
+        VectorizedIoUDistance
+    )
+
+    n_tracked = 0
+    for frame_number, predictions in stream.iter_frames(
+        n_frames=300,
+        skip_frames=2
+    ):
+        builtin_state, vectorized_state = [
+            get_tracked_state(
+                NorfairTracker.update_tracker(
+                    tracker=tracker,
+                    predictions=predictions,
+                    period=2
+                )
+            )
+            for tracker in (builtin_tracker, vectorized_tracker)
+        ]
+        assert vectorized_state == builtin_state, frame_number
+        n_tracked += len(builtin_state)
+
+    assert n_tracked > 0
@@ -0,0 +1,69 @@
+import logging
+
+import pytest
+
+from assigning.assign import DetectionLabel
+from assigning.hand import Hand
+from assigning.person import Person
+from assigning.product import Product
+from benchmarks.synthetic import SyntheticDetectionStream
+from tracking.norfair_tracker import NorfairTracker
+
+
+@pytest.fixture(autouse=True)
+def disable_norfair_warnings():
+    # norfair warns about every bbox with zero area
+    logging.disable(logging.WARNING)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def get_tracked_objects(n_frames=30, seed=0):
+    stream = SyntheticDetectionStream(n_persons=3, n_products=8, seed=seed)
+    tracker = NorfairTracker()
+    tracked_objects = []
+    for _, predictions in stream.iter_frames(n_frames=n_frames):
+        tracked_objects = tracker.update_from_predictions(
+            predictions=predictions
+        )
+    return tracked_objects
+
+
+def test_separate_interactions_from_norfair_tracked_objs():
+    tracked_objects = get_tracked_objects()
+    assert tracked_objects
+
+    interaction_objs = (
+        NorfairTracker.separate_interactions_from_norfair_tracked_objs(
+            norfair_tracked_objects=tracked_objects
+        )
+    )
+
+    groups_classes = {
+        DetectionLabel.PERSON: Person,
+        DetectionLabel.HAND: Hand,
+        DetectionLabel.PRODUCTS: Product,
+    }
+    assert set(interaction_objs) == set(groups_classes)
+    for group_key, group_objs in interaction_objs.items():
+        assert all(
+            isinstance(group_obj, groups_classes[group_key])
+            for group_obj in group_objs
+        )
+
+    # Same objects as the FrameState path
+    frame_state = NorfairTracker.create_frame_state(
+        norfair_tracked_objects=tracked_objects
+    )
+    for group_key, group_objs in interaction_objs.items():
+        assert [group_obj.track_id for group_obj in group_objs] == [
+            group_obj.track_id
+            for group_obj in frame_state.interaction_objs_by_label[group_key]
+        ]
+
+
+def test_get_label_from_tracked_obj():
+    for tracked_object in get_tracked_objects():
+        assert NorfairTracker.get_label_from_tracked_obj(
+            tracked_object
+        ) == tracked_object.last_detection.label
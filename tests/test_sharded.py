@@ -0,0 +1,57 @@
+import pytest
+
+from pipeline.sharded import VideoShard
+
+
+def get_shards_ranges(n_frames, n_shards, overlap_frames=0):
+    return [
+        (shard.start_frame, shard.end_frame, shard.warmup_start)
+        for shard in VideoShard.plan_shards(
+            n_frames=n_frames,
+            n_shards=n_shards,
+            overlap_frames=overlap_frames
+        )
+    ]
+
+
+def test_plan_shards_splits_the_frames():
+    assert get_shards_ranges(n_frames=12, n_shards=3, overlap_frames=2) == [
+        (0, 4, 0),
+        (4, 8, 2),
+        (8, None, 6),
+    ]
+
+
+@pytest.mark.parametrize(
+    'n_frames, n_shards',
+    [(10, 6), (10, 3), (7, 4), (3, 8), (1, 1), (100, 7)]
+)
+def test_plan_shards_last_shard_is_open_ended(n_frames, n_shards):
+    shards_ranges = get_shards_ranges(n_frames=n_frames, n_shards=n_shards)
+
+    assert 0 < len(shards_ranges) <= n_shards
+    # Consecutive shards, only the last one runs to the end of the video
+    assert shards_ranges[0][0] == 0
+    for (_, end_frame, _), (next_start, _, _) in zip(
+        shards_ranges,
+        shards_ranges[1:]
+    ):
+        assert end_frame == next_start
+    assert shards_ranges[-1][1] is None
+
+
+def test_plan_shards_fewer_shards_than_requested():
+    # ceil(10 / 6) = 2 frames per shard gives 5 shards
+    assert get_shards_ranges(n_frames=10, n_shards=6) == [
+        (0, 2, 0),
+        (2, 4, 2),
+        (4, 6, 4),
+        (6, 8, 6),
+        (8, None, 8),
+    ]
+
+
+def test_plan_shards_without_frame_count():
+    assert get_shards_ranges(n_frames=0, n_shards=4, overlap_frames=5) == [
+        (0, None, 0),
+    ]
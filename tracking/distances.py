@@ -0,0 +1,99 @@
+import norfair
+from norfair.distances import VectorizedDistance
+import numpy
+
+from typing import List, Optional, Sequence, Union
+
+from geometry.boxes import BoxGeometry
+
+
+class VectorizedIoUDistance(VectorizedDistance):
+    """
+    1 - IoU distance between the bboxes of the candidates and the tracked
+    objects, with the same values as norfair's 'iou' distance.
+
+    norfair's VectorizedDistance loops in Python over the labels and stacks
+    the objects of each label again. This one stacks the bboxes of every
+    object and candidate once, computes the IoU of every pair with one
+    BoxGeometry call (numpy releases the GIL) and sets the distance of the
+    pairs with different labels to infinity.
+
+    norfair.Tracker only takes distances by name or scalar functions, use
+    install_in_tracker to replace the distance of a tracker.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(distance_function=self.compute_iou_distances)
+
+    @staticmethod
+    def compute_iou_distances(
+        candidates_bboxes: numpy.ndarray,
+        objects_bboxes: numpy.ndarray
+    ) -> numpy.ndarray:
+        """
+        Returns the (N candidates, K objects) matrix of 1 - IoU.
+        """
+        return 1 - BoxGeometry.pairwise_iou(
+            bboxes1=candidates_bboxes,
+            bboxes2=objects_bboxes,
+            pixels_border=0
+        )
+
+    @staticmethod
+    def stack_points(
+        trackables: Sequence[
+            Union[norfair.Detection, norfair.tracker.TrackedObject]
+        ]
+    ) -> numpy.ndarray:
+        """
+        Stack the points of detections or the estimates of tracked objects
+        as (N, 4) bboxes.
+        """
+        return numpy.stack(
+            [
+                trackable.points
+                if isinstance(trackable, norfair.Detection)
+                else trackable.estimate
+                for trackable in trackables
+            ]
+        ).reshape(len(trackables), 4)
+
+    def get_distances(
+        self,
+        objects: Sequence[norfair.tracker.TrackedObject],
+        candidates: Optional[
+            Union[List[norfair.Detection], List[norfair.tracker.TrackedObject]]
+        ],
+    ) -> numpy.ndarray:
+        if not objects or not candidates:
+            return numpy.full(
+                (len(candidates or []), len(objects)),
+                fill_value=numpy.inf,
+                dtype=numpy.float32
+            )
+
+        distance_matrix = self.compute_iou_distances(
+            candidates_bboxes=self.stack_points(trackables=candidates),
+            objects_bboxes=self.stack_points(trackables=objects)
+        ).astype(numpy.float32)
+
+        objects_labels = [tracked_object.label for tracked_object in objects]
+        candidates_labels = [candidate.label for candidate in candidates]
+        if (
+            len(set(objects_labels)) > 1 or
+            len(set(candidates_labels)) > 1 or
+            objects_labels[0] != candidates_labels[0]
+        ):
+            # Pairs with different labels can not be matched
+            same_label = (
+                numpy.array(candidates_labels, dtype=object)[:, None] ==
+                numpy.array(objects_labels, dtype=object)[None, :]
+            )
+            distance_matrix[~same_label] = numpy.inf
+
+        return distance_matrix
+
+    @classmethod
+    def install_in_tracker(cls, tracker: norfair.Tracker) -> norfair.Tracker:
+        tracker.distance_function = cls()
+        return tracker
@@ -0,0 +1,168 @@
+import norfair
+import numpy
+
+from typing import Dict, List, Optional, Type, Union
+
+from assigning.assign import DetectionLabel
+from assigning.interaction import Interaction
+from assigning.person import Person
+from assigning.hand import Hand
+from assigning.product import Product
+from geometry.boxes import BoxGeometry
+
+
+class TrackedGroup:
+    """
+    Columns of the tracked objects of one group (persons, hands or
+    products) in a frame, one row per object:
+
+    - track_ids: (N,) tracker ids.
+    - labels: (N,) labels of the last detections.
+    - bboxes_tracking: (N, 4) bboxes estimated by the tracker.
+    - bboxes_last_detection: (N, 4) bboxes of the last detections.
+    - centers: (N, 2) int32 centers of the tracking bboxes.
+
+    The interactions property creates the Person, Hand or Product objects
+    of the rows the first time it is used.
+    """
+
+    def __init__(
+            self,
+            interaction_cls: Type[Interaction],
+            track_ids: numpy.ndarray,
+            labels: numpy.ndarray,
+            bboxes_tracking: numpy.ndarray,
+            bboxes_last_detection: numpy.ndarray,
+            centers: numpy.ndarray
+    ) -> None:
+        self.interaction_cls = interaction_cls
+        self.track_ids = track_ids
+        self.labels = labels
+        self.bboxes_tracking = bboxes_tracking
+        self.bboxes_last_detection = bboxes_last_detection
+        self.centers = centers
+
+        self._interactions = None
+
+    def __len__(self) -> int:
+        return len(self.track_ids)
+
+    def set_interactions(
+        self,
+        interactions: List[Union[Person, Hand, Product]]
+    ):
+        """
+        Use existing objects as the views of the rows (InteractionRegistry).
+        """
+        self._interactions = interactions
+
+    @property
+    def interactions(self) -> List[Union[Person, Hand, Product]]:
+        if self._interactions is None:
+            self._interactions = [
+                self.interaction_cls(
+                    self.bboxes_tracking[row],
+                    self.bboxes_last_detection[row],
+                    int(self.labels[row]),
+                    int(self.track_ids[row]),
+                    center_location=self.centers[row]
+                )
+                for row in range(len(self))
+            ]
+        return self._interactions
+
+
+class FrameState:
+    """
+    Columnar state of the tracked objects of one frame, split in groups:
+    DetectionLabel.PERSON, DetectionLabel.HAND and DetectionLabel.PRODUCTS
+    (every product label). Only the groups with objects are present.
+
+    The stages that can work with arrays (containment, products top
+    location) use the columns of the groups, and the stages that need
+    objects use the views of the groups (interaction_objs_by_label).
+    """
+
+    GROUPS_CLASSES = {
+        DetectionLabel.PERSON: Person,
+        DetectionLabel.HAND: Hand,
+        DetectionLabel.PRODUCTS: Product,
+    }
+
+    def __init__(self, groups: Dict[int, TrackedGroup]) -> None:
+        self.groups = groups
+        self._interaction_objs_by_label = None
+
+    @classmethod
+    def create_from_norfair_tracked_objs(
+        cls,
+        norfair_tracked_objects: List[norfair.tracker.TrackedObject],
+        products_labels: List[int]
+    ):
+        n_objects = len(norfair_tracked_objects)
+        track_ids = numpy.empty(n_objects, dtype=numpy.int64)
+        labels = numpy.empty(n_objects, dtype=numpy.int64)
+        estimates = numpy.empty((n_objects, 2, 2), dtype=numpy.float64)
+        last_detections = numpy.empty((n_objects, 2, 2), dtype=numpy.float64)
+
+        for row, tracked_object in enumerate(norfair_tracked_objects):
+            track_ids[row] = tracked_object.id
+            labels[row] = tracked_object.last_detection.label
+            estimates[row] = tracked_object.get_estimate()
+            last_detections[row] = tracked_object.last_detection.points
+
+        # Norfair points [[x1, y1], [x2, y2]] to standard [x1, y1, x2, y2]
+        bboxes_tracking = estimates.reshape(n_objects, 4)
+        bboxes_last_detection = last_detections.reshape(n_objects, 4)
+        centers = BoxGeometry.centers(bboxes=bboxes_tracking)
+
+        groups_masks = {
+            DetectionLabel.PERSON: labels == DetectionLabel.PERSON,
+            DetectionLabel.HAND: labels == DetectionLabel.HAND,
+            DetectionLabel.PRODUCTS: numpy.isin(labels, products_labels),
+        }
+
+        groups = {}
+        for group_key, group_mask in groups_masks.items():
+            if not group_mask.any():
+                continue
+            groups[group_key] = TrackedGroup(
+                interaction_cls=cls.GROUPS_CLASSES[group_key],
+                track_ids=track_ids[group_mask],
+                labels=labels[group_mask],
+                bboxes_tracking=bboxes_tracking[group_mask],
+                bboxes_last_detection=bboxes_last_detection[group_mask],
+                centers=centers[group_mask]
+            )
+
+        return cls(groups=groups)
+
+    def get(self, group_key: int) -> Optional[TrackedGroup]:
+        return self.groups.get(group_key, None)
+
+    @property
+    def persons(self) -> Optional[TrackedGroup]:
+        return self.get(DetectionLabel.PERSON)
+
+    @property
+    def hands(self) -> Optional[TrackedGroup]:
+        return self.get(DetectionLabel.HAND)
+
+    @property
+    def products(self) -> Optional[TrackedGroup]:
+        return self.get(DetectionLabel.PRODUCTS)
+
+    @property
+    def interaction_objs_by_label(
+        self
+    ) -> Dict[int, List[Union[Person, Hand, Product]]]:
+        """
+        The objects of every group, like
+        NorfairTracker.separate_interactions_from_norfair_tracked_objs.
+        """
+        if self._interaction_objs_by_label is None:
+            self._interaction_objs_by_label = {
+                group_key: group.interactions
+                for group_key, group in self.groups.items()
+            }
+        return self._interaction_objs_by_label
@@ -0,0 +1,108 @@
+from typing import Dict, List, Set, Union
+
+from assigning.interaction import Interaction
+from assigning.person import Person
+from assigning.hand import Hand
+from assigning.product import Product
+from tracking.frame_state import FrameState, TrackedGroup
+
+
+class InteractionRegistry:
+    """
+    Keeps one Person, Hand or Product object for each track, keyed by group
+    (DetectionLabel.PERSON, HAND or PRODUCTS) and tracker id.
+
+    On every frame the objects of the tracks that are still alive are
+    updated in place, objects are only created for new tracks (or for a
+    product whose label changed) and the objects of tracks that are gone are
+    evicted. So the state of an object (a Person color, the Costumer that
+    references it) is kept while its track lives.
+    """
+
+    def __init__(self) -> None:
+        self.objects_by_group: Dict[int, Dict[int, Interaction]] = {}
+
+        self.n_created = 0
+        self.n_updated = 0
+        self.n_evicted = 0
+
+    def update_group(
+        self,
+        group_key: int,
+        tracked_group: TrackedGroup
+    ) -> List[Union[Person, Hand, Product]]:
+        """
+        Return the objects of the rows of the tracked group, in the same
+        order, and evict the objects of the group that are not in it.
+        """
+        group_objects = self.objects_by_group.setdefault(group_key, {})
+        interaction_cls = tracked_group.interaction_cls
+
+        track_ids = tracked_group.track_ids.tolist()
+
+        interactions = []
+        for row, track_id in enumerate(track_ids):
+            class_name = int(tracked_group.labels[row])
+            interaction = group_objects.get(track_id)
+
+            if (
+                interaction is not None and
+                interaction.class_name == class_name
+            ):
+                interaction.update_tracking(
+                    tracked_group.bboxes_tracking[row],
+                    tracked_group.bboxes_last_detection[row],
+                    center_location=tracked_group.centers[row]
+                )
+                self.n_updated += 1
+            else:
+                interaction = interaction_cls(
+                    tracked_group.bboxes_tracking[row],
+                    tracked_group.bboxes_last_detection[row],
+                    class_name,
+                    track_id,
+                    center_location=tracked_group.centers[row]
+                )
+                group_objects[track_id] = interaction
+                self.n_created += 1
+
+            interactions.append(interaction)
+
+        self.evict(
+            group_key=group_key,
+            alive_track_ids=set(track_ids)
+        )
+
+        return interactions
+
+    def evict(self, group_key: int, alive_track_ids: Set[int]):
+        group_objects = self.objects_by_group.get(group_key, {})
+        dead_track_ids = set(group_objects).difference(alive_track_ids)
+        for track_id in dead_track_ids:
+            del group_objects[track_id]
+        self.n_evicted += len(dead_track_ids)
+
+    def update_frame_state(self, frame_state: FrameState) -> FrameState:
+        """
+        Bind the objects of the registry to the groups of the frame state,
+        evicting every object of the groups without tracks in the frame.
+        """
+        for group_key in list(self.objects_by_group):
+            if frame_state.get(group_key) is None:
+                self.evict(group_key=group_key, alive_track_ids=set())
+
+        for group_key, tracked_group in frame_state.groups.items():
+            tracked_group.set_interactions(
+                interactions=self.update_group(
+                    group_key=group_key,
+                    tracked_group=tracked_group
+                )
+            )
+
+        return frame_state
+
+    def __len__(self) -> int:
+        return sum(
+            len(group_objects)
+            for group_objects in self.objects_by_group.values()
+        )
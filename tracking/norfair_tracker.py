@@ -10,6 +10,9 @@ from assigning.person import Person
 from assigning.hand import Hand
 from assigning.product import Product
 from assigning.assign import DetectionLabel
+from tracking.distances import VectorizedIoUDistance
+from tracking.frame_state import FrameState
+from tracking.interaction_registry import InteractionRegistry
 
 
 logger = logging.getLogger(__name__)
@@ -29,35 +32,139 @@ logger.addHandler(c_handler)
 class NorfairTracker:
 
     PRODUCTS_LABELS = [label for label in DetectionLabel if label < 4]
+    TRACKED_LABELS = PRODUCTS_LABELS + [
+        DetectionLabel.PERSON,
+        DetectionLabel.HAND
+    ]
 
-    def __init__(self,) -> None:
-        self.tracker = norfair.Tracker(
-            initialization_delay=5,
+    # Parameters of the tracker of each group in the per class mode
+    GROUPS_TRACKER_PARAMS = {
+        DetectionLabel.PERSON: {
+            'initialization_delay': 5,
+            'distance_threshold': 2,
+            'hit_counter_max': 10,
+        },
+        # Hands move fast and in and out of the frame
+        DetectionLabel.HAND: {
+            'initialization_delay': 3,
+            'distance_threshold': 2,
+            'hit_counter_max': 6,
+        },
+        # Products stay on the table, but can be hidden by the hands
+        DetectionLabel.PRODUCTS: {
+            'initialization_delay': 5,
+            'distance_threshold': 0.9,
+            'hit_counter_max': 15,
+        },
+    }
+
+    def __init__(
+            self,
+            min_score: float = 0.0,
+            per_class: bool = False,
+            groups_params: Optional[Dict[int, Dict]] = None
+    ) -> None:
+        """
+        - min_score: Predictions with a lower score are dropped before the
+        tracker update.
+        - per_class: Use one tracker for each group of labels (persons, hands
+        and products) instead of one tracker for every label.
+        - groups_params: Per class mode, tracker parameters of the groups
+        that replace the ones in GROUPS_TRACKER_PARAMS.
+
+        In the per class mode the tracking ids are unique within a group
+        only (a person and a hand can share an id). The trackers of the
+        groups are updated one after the other: norfair's update holds the
+        GIL, so a thread pool made tracking slower.
+        """
+        self.min_score = min_score
+        self.per_class = per_class
+
+        if per_class:
+            self.tracker = None
+            self.groups_trackers = {}
+            for group_key, group_params in self.GROUPS_TRACKER_PARAMS.items():
+                group_params = dict(group_params)
+                if groups_params is not None:
+                    group_params.update(groups_params.get(group_key, {}))
+                self.groups_trackers[group_key] = self.create_tracker(
+                    **group_params
+                )
+        else:
+            self.tracker = self.create_tracker(
+                initialization_delay=5,
+                distance_threshold=2,
+                hit_counter_max=10,
+            )
+            self.groups_trackers = None
+
+        self.registry = InteractionRegistry()
+
+    @staticmethod
+    def create_tracker(
+        initialization_delay: int,
+        distance_threshold: float,
+        hit_counter_max: int,
+        past_detections_length: int = 2,
+        vectorized_iou: bool = True
+    ) -> norfair.Tracker:
+        """
+        Create a norfair tracker with the IoU distance, computed with
+        VectorizedIoUDistance unless vectorized_iou is False (norfair's).
+        """
+        tracker = norfair.Tracker(
+            initialization_delay=initialization_delay,
             distance_function='iou',
-            distance_threshold=2,
-            hit_counter_max=10,
+            distance_threshold=distance_threshold,
+            hit_counter_max=hit_counter_max,
             filter_factory=OptimizedKalmanFilterFactory(),
-            past_detections_length=2,
+            past_detections_length=past_detections_length,
         )
+        if vectorized_iou:
+            VectorizedIoUDistance.install_in_tracker(tracker=tracker)
+        return tracker
+
+    @staticmethod
+    def filter_predictions(
+        predictions: numpy.ndarray,
+        min_score: float = 0.0,
+        tracked_labels=TRACKED_LABELS
+    ) -> numpy.ndarray:
+        """
+        Keep the predictions (N x [x1, y1, x2, y2, class, score]) with a
+        score of at least min_score and a class that is tracked.
+        """
+        keep_mask = numpy.isin(predictions[:, 4], tracked_labels)
+        if min_score > 0:
+            keep_mask &= predictions[:, 5] >= min_score
+        if keep_mask.all():
+            return predictions
+        return predictions[keep_mask]
 
     @staticmethod
     def convert_predictions_to_norfair(
         predictions: numpy.array
     ) -> List[norfair.Detection]:
-        norfair_detections = []
-        for prediction in predictions:
-            bbox_norfair = numpy.array(
-                [
-                    [prediction[0], prediction[1]],
-                    [prediction[2], prediction[3]]
-                ]
-            )
-            detection = norfair.Detection(
-                points=bbox_norfair,
-                scores=numpy.array([prediction[5], prediction[5]]),
-                label=int(prediction[4])
+        """
+        Create one norfair Detection for each prediction. The points and
+        scores of every detection are views of two arrays built with one
+        reshape for all the predictions.
+        """
+        n_predictions = len(predictions)
+        # [x1, y1, x2, y2] rows to [[x1, y1], [x2, y2]] points
+        bboxes_norfair = predictions[:, :4].reshape(n_predictions, 2, 2)
+        # The score of the bbox for each of its two points
+        scores_norfair = numpy.repeat(predictions[:, 5:6], 2, axis=1)
+        labels = predictions[:, 4].astype(numpy.int64).tolist()
+
+        norfair_detections = [
+            norfair.Detection(
+                points=bboxes_norfair[prediction_idx],
+                scores=scores_norfair[prediction_idx],
+                label=labels[prediction_idx]
             )
-            norfair_detections.append(detection)
+            for prediction_idx in range(n_predictions)
+        ]
 
         return norfair_detections
 
@@ -66,21 +173,149 @@ class NorfairTracker:
             predictions: Union[Optional[numpy.array], None] = None,
             period: int = 1
     ):
+        if predictions is not None:
+            predictions = self.filter_predictions(
+                predictions=predictions,
+                min_score=self.min_score
+            )
+
+        if self.per_class:
+            return self.update_groups_from_predictions(
+                predictions=predictions,
+                period=period
+            )
+
+        return self.update_tracker(
+            tracker=self.tracker,
+            predictions=predictions,
+            period=period
+        )
+
+    @classmethod
+    def update_tracker(
+        cls,
+        tracker: norfair.Tracker,
+        predictions: Optional[numpy.ndarray],
+        period: int = 1
+    ) -> List[norfair.tracker.TrackedObject]:
         if predictions is None:
-            tracked_objects = self.tracker.update(
+            tracked_objects = tracker.update(
                 period=period
             )
         else:
-            norfair_detections = self.convert_predictions_to_norfair(
+            norfair_detections = cls.convert_predictions_to_norfair(
                 predictions=predictions
             )
-            tracked_objects = self.tracker.update(
+            tracked_objects = tracker.update(
                 detections=norfair_detections,
                 period=period
             )
 
         return tracked_objects
 
+    @staticmethod
+    def split_predictions_by_group(
+        predictions: numpy.ndarray,
+        products_labels=PRODUCTS_LABELS
+    ) -> Dict[int, numpy.ndarray]:
+        """
+        Split the predictions in the persons, hands and products groups. A
+        group without predictions gets an empty array, so its tracker still
+        counts the frame as a frame without detections.
+        """
+        labels = predictions[:, 4]
+        groups_masks = {
+            DetectionLabel.PERSON: labels == DetectionLabel.PERSON,
+            DetectionLabel.HAND: labels == DetectionLabel.HAND,
+            DetectionLabel.PRODUCTS: numpy.isin(labels, products_labels),
+        }
+        return {
+            group_key: predictions[group_mask]
+            for group_key, group_mask in groups_masks.items()
+        }
+
+    def update_groups_from_predictions(
+            self,
+            predictions: Optional[numpy.ndarray],
+            period: int = 1
+    ) -> List[norfair.tracker.TrackedObject]:
+        """
+        Route the predictions to the tracker of their group and update the
+        trackers. Returns the tracked objects of every group.
+        """
+        if predictions is None:
+            groups_predictions = {
+                group_key: None for group_key in self.groups_trackers
+            }
+        else:
+            groups_predictions = self.split_predictions_by_group(
+                predictions=predictions
+            )
+
+        tracked_objects = []
+        for group_key, group_predictions in groups_predictions.items():
+            tracked_objects.extend(
+                self.update_tracker(
+                    tracker=self.groups_trackers[group_key],
+                    predictions=group_predictions,
+                    period=period
+                )
+            )
+
+        return tracked_objects
+
+    def get_trackers(self) -> List[norfair.Tracker]:
+        if self.per_class:
+            return list(self.groups_trackers.values())
+        return [self.tracker]
+
+    def get_tracks_health(
+            self,
+            frames_since_detection: int = 0,
+            expiry_margin: int = 2
+    ) -> Dict[str, float]:
+        """
+        Summary of how much the tracks need a detection:
+
+        - tracks: tracked objects, initializing ones included.
+        - initializing: objects that need more detections to be confirmed.
+        - expiring: objects whose hit counter is at most expiry_margin, they
+        are dropped after that many frames without a detection.
+        - max_uncertainty_px: largest position uncertainty of a point, the
+        standard deviation of the Kalman filter plus the distance the
+        object moved at its estimated speed since the last detection (the
+        optimized filter does not grow its variance between detections).
+        """
+        n_tracks = 0
+        n_initializing = 0
+        n_expiring = 0
+        max_uncertainty_px = 0.0
+        for tracker in self.get_trackers():
+            for tracked_object in tracker.tracked_objects:
+                n_tracks += 1
+                if tracked_object.is_initializing:
+                    n_initializing += 1
+                elif tracked_object.hit_counter <= expiry_margin:
+                    n_expiring += 1
+
+                position_std = numpy.sqrt(
+                    tracked_object.filter.pos_variance.max()
+                )
+                drift = numpy.abs(
+                    tracked_object.estimate_velocity
+                ).max() * frames_since_detection
+                max_uncertainty_px = max(
+                    max_uncertainty_px,
+                    float(position_std + drift)
+                )
+
+        return {
+            'tracks': n_tracks,
+            'initializing': n_initializing,
+            'expiring': n_expiring,
+            'max_uncertainty_px': max_uncertainty_px,
+        }
+
     @staticmethod
     def draw_norfair_tracked_boxes(image, norfair_tracked_objects):
         image_with_tracked = norfair.draw_boxes(
@@ -96,6 +331,33 @@ class NorfairTracker:
         label = norfair_tracked_object.last_detection.label
         return label
 
+    def update_frame_state(
+        self,
+        norfair_tracked_objects: List[norfair.tracker.TrackedObject]
+    ) -> FrameState:
+        """
+        Create the FrameState of the tracked objects, with the persistent
+        objects of the registry as views.
+        """
+        frame_state = self.create_frame_state(
+            norfair_tracked_objects=norfair_tracked_objects
+        )
+        return self.registry.update_frame_state(frame_state=frame_state)
+
+    @staticmethod
+    def create_frame_state(
+        norfair_tracked_objects: List[norfair.tracker.TrackedObject],
+        products_labels=PRODUCTS_LABELS
+    ) -> FrameState:
+        """
+        Save the tracked objects as a FrameState, with the columns of the
+        persons, hands and products.
+        """
+        return FrameState.create_from_norfair_tracked_objs(
+            norfair_tracked_objects=norfair_tracked_objects,
+            products_labels=products_labels
+        )
+
     @staticmethod
     def separate_interactions_from_norfair_tracked_objs(
         norfair_tracked_objects: List[norfair.tracker.TrackedObject],
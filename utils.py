@@ -26,6 +26,45 @@ logger.addHandler(c_handler)
 class Utils:
     def __init__(self) -> None:
         pass
+
+    @staticmethod
+    def is_detection_frame(frame_number: int, skip_frames: int) -> bool:
+        """
+        Returns True if the detection model runs in this frame, the tracker
+        estimates the objects of the frames in between.
+        """
+        return skip_frames == 0 or frame_number % skip_frames == 0
+
+    @staticmethod
+    def is_render_frame(frame_number: int, render_every: int) -> bool:
+        """
+        Returns True if the annotated frame is drawn, shown and written in
+        this frame. A render_every of 0 turns off the rendering.
+        """
+        return render_every > 0 and frame_number % render_every == 0
+
+    @classmethod
+    def is_image_frame(
+        cls,
+        frame_number: int,
+        initial_frame: int,
+        skip_frames: int,
+        render_every: int
+    ) -> bool:
+        """
+        Returns True if the frame has to be decoded into an image, frames
+        that are not detected nor rendered are only grabbed.
+        """
+        return frame_number >= initial_frame and (
+            cls.is_render_frame(
+                frame_number=frame_number,
+                render_every=render_every
+            ) or
+            cls.is_detection_frame(
+                frame_number=frame_number,
+                skip_frames=skip_frames
+            )
+        )
     
     @staticmethod
     def draw_assignment_frame(